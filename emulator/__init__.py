@@ -0,0 +1,14 @@
+"""
+In-process emulator for neo-boa contracts
+
+Runs Main of a contract such as smartcontract/sunny_dapp.py as plain python,
+with in-memory stand-ins for the boa.blockchain.vm.Neo interop services.
+
+    from emulator import Emulator
+
+    emu = Emulator(overrides={'OWNER': owner})
+    emu.invoke('deploy', [...], witnesses=[owner])
+"""
+from .contract import DEFAULT_CONTRACT, Emulator, ExecutionFault, load_contract
+from .interop import Clock, Interop
+from .vm import APPLICATION, VERIFICATION, ByteArray
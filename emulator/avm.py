@@ -0,0 +1,1018 @@
+"""
+Interpreter for compiled .avm scripts with opcode tracing
+
+Executes the bytecode neo-boa emits for a contract, opcode by opcode, with
+the NEO 2 semantics of the evaluation stack, the alt stack and the stack
+item types. Syscalls are served by an Interop instance, so the storage,
+witnesses and block clock are the same in-memory stand-ins the python
+emulator uses, and both can run against the same state.
+
+Every executed opcode is counted and priced with the NEO 2 price list.
+With the debug map of the compiler the counts are attributed to the lines
+of the contract source and to the stack of called methods, which gives a
+hot spot report and folded stacks for flame graph tools:
+
+    python -m emulator.avm compiled/sunny_dapp.avm --debug compiled/sunny_dapp.debug.json \\
+        --invocations lifecycle.json --folded sunny_dapp.folded --trace sunny_dapp.trace
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import os
+from collections import Counter
+
+from .contract import ExecutionFault
+from .interop import Interop
+from .vm import APPLICATION, Header, bytes_to_int, int_to_bytes
+
+# Opcodes of the NEO 2 virtual machine
+OPCODES = {
+    'PUSH0': 0x00, 'PUSHDATA1': 0x4c, 'PUSHDATA2': 0x4d, 'PUSHDATA4': 0x4e, 'PUSHM1': 0x4f,
+    'NOP': 0x61, 'JMP': 0x62, 'JMPIF': 0x63, 'JMPIFNOT': 0x64, 'CALL': 0x65, 'RET': 0x66,
+    'APPCALL': 0x67, 'SYSCALL': 0x68, 'TAILCALL': 0x69,
+    'DUPFROMALTSTACK': 0x6a, 'TOALTSTACK': 0x6b, 'FROMALTSTACK': 0x6c, 'XDROP': 0x6d, 'XSWAP': 0x72,
+    'XTUCK': 0x73, 'DEPTH': 0x74, 'DROP': 0x75, 'DUP': 0x76, 'NIP': 0x77, 'OVER': 0x78, 'PICK': 0x79,
+    'ROLL': 0x7a, 'ROT': 0x7b, 'SWAP': 0x7c, 'TUCK': 0x7d,
+    'CAT': 0x7e, 'SUBSTR': 0x7f, 'LEFT': 0x80, 'RIGHT': 0x81, 'SIZE': 0x82,
+    'INVERT': 0x83, 'AND': 0x84, 'OR': 0x85, 'XOR': 0x86, 'EQUAL': 0x87,
+    'INC': 0x8b, 'DEC': 0x8c, 'SIGN': 0x8d, 'NEGATE': 0x8f, 'ABS': 0x90, 'NOT': 0x91, 'NZ': 0x92,
+    'ADD': 0x93, 'SUB': 0x94, 'MUL': 0x95, 'DIV': 0x96, 'MOD': 0x97, 'SHL': 0x98, 'SHR': 0x99,
+    'BOOLAND': 0x9a, 'BOOLOR': 0x9b, 'NUMEQUAL': 0x9c, 'NUMNOTEQUAL': 0x9e, 'LT': 0x9f, 'GT': 0xa0,
+    'LTE': 0xa1, 'GTE': 0xa2, 'MIN': 0xa3, 'MAX': 0xa4, 'WITHIN': 0xa5,
+    'SHA1': 0xa7, 'SHA256': 0xa8, 'HASH160': 0xa9, 'HASH256': 0xaa, 'CHECKSIG': 0xac, 'VERIFY': 0xad,
+    'CHECKMULTISIG': 0xae,
+    'ARRAYSIZE': 0xc0, 'PACK': 0xc1, 'UNPACK': 0xc2, 'PICKITEM': 0xc3, 'SETITEM': 0xc4, 'NEWARRAY': 0xc5,
+    'NEWSTRUCT': 0xc6, 'NEWMAP': 0xc7, 'APPEND': 0xc8, 'REVERSE': 0xc9, 'REMOVE': 0xca, 'HASKEY': 0xcb,
+    'KEYS': 0xcc, 'VALUES': 0xcd,
+    'THROW': 0xf0, 'THROWIFNOT': 0xf1,
+}
+
+OPCODES.update(('PUSHBYTES{}'.format(n), n) for n in range(1, 76))
+OPCODES.update(('PUSH{}'.format(n), 0x50 + n) for n in range(1, 17))
+
+OPCODE_NAMES = dict((code, name) for name, code in OPCODES.items())
+
+# Opcodes followed by a signed 16 bit offset, relative to the opcode
+JUMPS = frozenset((OPCODES['JMP'], OPCODES['JMPIF'], OPCODES['JMPIFNOT'], OPCODES['CALL']))
+
+# Prices of NEO 2 in units of 0.001 GAS. Pushes up to PUSH16 and NOP are
+# free, every other opcode costs one unit unless listed here.
+OPCODE_PRICES = {
+    OPCODES['APPCALL']: 10, OPCODES['TAILCALL']: 10,
+    OPCODES['SHA1']: 10, OPCODES['SHA256']: 10, OPCODES['HASH160']: 20, OPCODES['HASH256']: 20,
+    OPCODES['CHECKSIG']: 100,
+}
+
+SYSCALL_PRICES = {
+    'Neo.Runtime.CheckWitness': 200,
+    'Neo.Blockchain.GetHeader': 100,
+    'Neo.Storage.Get': 100,
+    'Neo.Storage.Delete': 100,
+}
+
+GAS_UNIT = 0.001
+
+
+class AvmFault(Exception):
+    """
+    Raised by the interpreter when the script ends in a FAULT
+    """
+
+    def __init__(self, message, ip=None):
+        super(AvmFault, self).__init__(message if ip is None else '{} at {:04x}'.format(message, ip))
+        self.ip = ip
+
+
+class Struct(list):
+    """
+    Array stack item with value semantics
+    """
+
+    def clone(self):
+        return Struct(item.clone() if isinstance(item, Struct) else item for item in self)
+
+
+# Conversions between stack item types
+
+def as_bytes(item):
+    item_type = type(item)
+
+    if item_type is bytes:
+        return item
+    if item_type is bool:
+        return b'\x01' if item else b''
+    if item_type is int:
+        return int_to_bytes(item)
+
+    raise AvmFault('{} is not a byte array'.format(item_type.__name__))
+
+
+def as_int(item):
+    item_type = type(item)
+
+    if item_type is int:
+        return item
+    if item_type is bytes:
+        if len(item) > 32:
+            raise AvmFault('integer of more than 32 bytes')
+        return bytes_to_int(item)
+    if item_type is bool:
+        return int(item)
+
+    raise AvmFault('{} is not an integer'.format(item_type.__name__))
+
+
+def as_bool(item):
+    item_type = type(item)
+
+    if item_type is bool:
+        return item
+    if item_type is int:
+        return item != 0
+    if item_type is bytes:
+        return any(item)
+
+    return True
+
+
+def items_equal(a, b):
+    if a is b:
+        return True
+
+    if isinstance(a, Struct) and isinstance(b, Struct):
+        return len(a) == len(b) and all(items_equal(x, y) for x, y in zip(a, b))
+
+    if isinstance(a, (list, dict)) or isinstance(b, (list, dict)):
+        return False
+
+    if type(a) not in (bytes, int, bool) or type(b) not in (bytes, int, bool):
+        return False
+
+    return as_bytes(a) == as_bytes(b)
+
+
+def map_key(item):
+    if isinstance(item, (list, dict)):
+        raise AvmFault('arrays can not be map keys')
+
+    return as_bytes(item)
+
+
+def to_stack_item(value):
+    """
+    Convert an invocation argument to a stack item: strings are encoded,
+    lists become arrays
+    """
+
+    if isinstance(value, (list, tuple)):
+        return [to_stack_item(item) for item in value]
+    if isinstance(value, str):
+        return value.encode()
+    if isinstance(value, bytes):
+        return bytes(value)
+
+    return value
+
+
+def script_hash(script):
+    return hashlib.new('ripemd160', hashlib.sha256(script).digest()).digest()
+
+
+class DebugInfo(object):
+    """
+    Maps instruction offsets of a script to methods and source lines
+
+    :param methods: (start, end, name) ranges of the methods
+    :type methods: list
+
+    :param lines: (start, end, file, line) ranges of the source lines
+    :type lines: list
+    """
+
+    def __init__(self, methods=(), lines=()):
+        self.methods = sorted(methods)
+        self.lines = sorted(lines)
+        self._method_starts = [start for start, _, _ in self.methods]
+        self._line_starts = [start for start, _, _, _ in self.lines]
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read the .debug.json the compiler writes next to the .avm, with a
+        map of (start, end, method, file, line) entries
+        """
+
+        with open(path) as f:
+            debug = json.load(f)
+
+        files = dict((entry.get('id'), entry.get('url')) for entry in debug.get('files', []))
+        methods = {}
+        lines = []
+
+        for entry in debug.get('map', []):
+            start, end = entry['start'], entry['end']
+            name = entry.get('method')
+            source = entry.get('file_url') or files.get(entry.get('file')) or ''
+            line = entry.get('file_line_no', entry.get('line'))
+
+            if name:
+                first, last = methods.get(name, (start, end))
+                methods[name] = (min(first, start), max(last, end))
+
+            if line is not None:
+                lines.append((start, end, os.path.basename(source), line))
+
+        return cls([(start, end, name) for name, (start, end) in methods.items()], lines)
+
+    @staticmethod
+    def _find(starts, ranges, ip):
+        index = bisect.bisect_right(starts, ip) - 1
+        if index >= 0 and ip <= ranges[index][1]:
+            return ranges[index]
+        return None
+
+    def method(self, ip):
+        found = self._find(self._method_starts, self.methods, ip)
+        return found[2] if found else 'sub_{:04x}'.format(ip)
+
+    def line(self, ip):
+        found = self._find(self._line_starts, self.lines, ip)
+        return '{}:{}'.format(found[2], found[3]) if found else '{:04x}'.format(ip)
+
+
+class Profile(object):
+    """
+    Opcode counts, GAS and hot spots of one or more invocations
+    """
+
+    def __init__(self):
+        self.opcodes = Counter()
+        self.opcode_gas = Counter()
+        self.syscalls = Counter()
+        self.syscall_gas = Counter()
+        self.line_opcodes = Counter()
+        self.line_gas = Counter()
+        self.stacks = Counter()
+        self.stack_opcodes = Counter()
+        self.gas = 0
+
+    def to_dict(self):
+        return {
+            'gas': round(self.gas * GAS_UNIT, 6),
+            'opcodes': dict(self.opcodes),
+            'opcode_gas': dict((name, round(units * GAS_UNIT, 6)) for name, units in self.opcode_gas.items()),
+            'syscalls': dict(self.syscalls),
+            'syscall_gas': dict((name, round(units * GAS_UNIT, 6)) for name, units in self.syscall_gas.items()),
+            'lines': dict((line, {'opcodes': self.line_opcodes[line], 'gas': round(units * GAS_UNIT, 6)})
+                          for line, units in self.line_gas.items()),
+        }
+
+    def folded(self, weight='gas'):
+        """
+        Stacks in the folded format of flamegraph.pl, one line per stack
+        and source line, weighted by GAS units or by opcodes
+        """
+
+        counter = self.stacks if weight == 'gas' else self.stack_opcodes
+        return '\n'.join('{} {}'.format(stack, value) for stack, value in sorted(counter.items()) if value)
+
+
+class Engine(object):
+    """
+    Executes a compiled contract against an Interop instance
+
+    :param script: the .avm bytecode
+    :type script: bytes
+
+    :param interop: chain state the script runs against
+    :type interop: Interop
+
+    :param debug: debug map of the script, for hot spots per source line
+    :type debug: DebugInfo
+
+    :param trace: file to write a line per executed opcode to
+    :type trace: file
+    """
+
+    def __init__(self, script, interop=None, debug=None, trace=None):
+        self.script = bytes(script)
+        self.script_hash = script_hash(self.script)
+        self.interop = interop if interop is not None else Interop()
+        self.debug = debug if debug is not None else DebugInfo()
+        self.trace = trace
+        self.profile = Profile()
+        self.syscalls = {
+            'Neo.Storage.GetContext': self.storage_get_context,
+            'Neo.Storage.Get': self.storage_get,
+            'Neo.Storage.Put': self.storage_put,
+            'Neo.Storage.Delete': self.storage_delete,
+            'Neo.Runtime.CheckWitness': self.runtime_check_witness,
+            'Neo.Runtime.GetTrigger': self.runtime_get_trigger,
+            'Neo.Runtime.GetTime': self.runtime_get_time,
+            'Neo.Runtime.Log': self.runtime_log,
+            'Neo.Runtime.Notify': self.runtime_notify,
+            'Neo.Blockchain.GetHeight': self.blockchain_get_height,
+            'Neo.Blockchain.GetHeader': self.blockchain_get_header,
+            'Neo.Header.GetIndex': self.header_get_index,
+            'Neo.Header.GetTimestamp': self.header_get_timestamp,
+        }
+
+    @property
+    def storage(self):
+        return self.interop.storage
+
+    @property
+    def clock(self):
+        return self.interop.clock
+
+    def invoke(self, operation, args=(), witnesses=(), trigger=APPLICATION):
+        """
+        Run the script as one transaction, with the operation and the
+        arguments pushed like an invocation script does
+
+        :return: the stack item left by the script
+        :raises ExecutionFault: if the script faulted, storage is unchanged
+        """
+
+        interop = self.interop
+        interop.begin(frozenset(bytes(w) for w in witnesses), trigger)
+
+        self.stack = [to_stack_item(list(args)), to_stack_item(operation)]
+        self.alt = []
+
+        try:
+            self.execute()
+        except Exception as e:
+            interop.rollback()
+            raise ExecutionFault(operation, e)
+
+        interop.commit()
+
+        return self.stack[-1] if self.stack else None
+
+    # Execution
+
+    def execute(self):
+        script = self.script
+        stack = self.stack
+        alt = self.alt
+        debug = self.debug
+        profile = self.profile
+        trace = self.trace
+        names = OPCODE_NAMES
+
+        # Return offsets of the invocation stack, and the path of called
+        # methods of every frame for the folded stacks
+        contexts = []
+        frames = [debug.method(0)]
+        ip = 0
+        end = len(script)
+
+        while True:
+            if ip >= end:
+                opcode = 0x66
+            else:
+                opcode = script[ip]
+
+            name = names.get(opcode)
+            if name is None:
+                raise AvmFault('invalid opcode {:02x}'.format(opcode), ip)
+
+            price = 0 if opcode <= 0x61 else OPCODE_PRICES.get(opcode, 1)
+            path = frames[-1]
+            start = ip
+            ip += 1
+
+            # Pushes
+
+            if opcode <= 0x4e:
+                if opcode <= 0x4b:
+                    length = opcode
+                elif opcode == 0x4c:
+                    length = script[ip]
+                    ip += 1
+                elif opcode == 0x4d:
+                    length = int.from_bytes(script[ip:ip + 2], 'little')
+                    ip += 2
+                else:
+                    length = int.from_bytes(script[ip:ip + 4], 'little')
+                    ip += 4
+                stack.append(script[ip:ip + length])
+                ip += length
+
+            elif opcode == 0x4f:
+                stack.append(-1)
+
+            elif opcode <= 0x60:
+                stack.append(opcode - 0x50)
+
+            # Flow control
+
+            elif opcode == 0x61:
+                pass
+
+            elif opcode in JUMPS:
+                target = start + int.from_bytes(script[ip:ip + 2], 'little', signed=True)
+                ip += 2
+
+                if target < 0 or target > end:
+                    raise AvmFault('jump out of the script', start)
+
+                if opcode == 0x62:
+                    ip = target
+                elif opcode == 0x65:
+                    contexts.append(ip)
+                    frames.append(path + ';' + debug.method(target))
+                    ip = target
+                else:
+                    condition = as_bool(stack.pop())
+                    if condition == (opcode == 0x63):
+                        ip = target
+
+            elif opcode == 0x66:
+                if not contexts:
+                    self.account(profile, path, start, name, price, trace)
+                    return
+                ip = contexts.pop()
+                frames.pop()
+
+            elif opcode == 0x67 or opcode == 0x69:
+                target = script[ip:ip + 20]
+                ip += 20
+
+                if not any(target):
+                    target = as_bytes(stack.pop())
+
+                if target != self.script_hash:
+                    raise AvmFault('call to an unknown contract', start)
+
+                if opcode == 0x67:
+                    contexts.append(ip)
+                    frames.append(path + ';' + debug.method(0))
+                else:
+                    caller = path.rpartition(';')[0]
+                    frames[-1] = caller + ';' + debug.method(0) if caller else debug.method(0)
+                ip = 0
+
+            elif opcode == 0x68:
+                length = script[ip]
+                syscall = script[ip + 1:ip + 1 + length].decode()
+                ip += 1 + length
+
+                handler = self.syscalls.get(syscall)
+                if handler is None:
+                    raise AvmFault('unknown syscall ' + syscall, start)
+
+                price = handler(stack)
+                profile.syscalls[syscall] += 1
+                profile.syscall_gas[syscall] += price
+
+            # Stack
+
+            elif opcode <= 0x7d:
+                self.stack_op(opcode, stack, alt, start)
+
+            # Splice, bitwise logic and arithmetic
+
+            elif opcode <= 0xa5:
+                self.value_op(opcode, stack, start)
+
+            # Crypto
+
+            elif opcode <= 0xae:
+                self.crypto_op(opcode, stack, start)
+
+            # Arrays and maps
+
+            elif opcode <= 0xcd:
+                self.array_op(opcode, stack, start)
+
+            elif opcode == 0xf0:
+                raise AvmFault('THROW', start)
+
+            elif opcode == 0xf1:
+                if not as_bool(stack.pop()):
+                    raise AvmFault('THROWIFNOT', start)
+
+            else:
+                raise AvmFault('unsupported opcode ' + name, start)
+
+            self.account(profile, path, start, name, price, trace)
+
+    def account(self, profile, path, ip, name, price, trace):
+        line = self.debug.line(ip)
+        stack = path + ';' + line
+
+        profile.opcodes[name] += 1
+        profile.opcode_gas[name] += price
+        profile.line_opcodes[line] += 1
+        profile.line_gas[line] += price
+        profile.stacks[stack] += price
+        profile.stack_opcodes[stack] += 1
+        profile.gas += price
+
+        if trace is not None:
+            trace.write('{:04x} {:<16} {:>4} {:>6} {} {}\n'.format(ip, name, len(self.stack), price,
+                                                                   path.rpartition(';')[2], line))
+
+    def stack_op(self, opcode, stack, alt, ip):
+        if opcode == 0x6a:
+            stack.append(alt[-1])
+        elif opcode == 0x6b:
+            alt.append(stack.pop())
+        elif opcode == 0x6c:
+            stack.append(alt.pop())
+        elif opcode == 0x6d:
+            n = as_int(stack.pop())
+            del stack[-1 - n]
+        elif opcode == 0x72:
+            n = as_int(stack.pop())
+            if n:
+                stack[-1], stack[-1 - n] = stack[-1 - n], stack[-1]
+        elif opcode == 0x73:
+            n = as_int(stack.pop())
+            if n <= 0:
+                raise AvmFault('XTUCK of {}'.format(n), ip)
+            stack.insert(len(stack) - n, stack[-1])
+        elif opcode == 0x74:
+            stack.append(len(stack))
+        elif opcode == 0x75:
+            stack.pop()
+        elif opcode == 0x76:
+            stack.append(stack[-1])
+        elif opcode == 0x77:
+            del stack[-2]
+        elif opcode == 0x78:
+            stack.append(stack[-2])
+        elif opcode == 0x79:
+            n = as_int(stack.pop())
+            if n < 0:
+                raise AvmFault('PICK of {}'.format(n), ip)
+            stack.append(stack[-1 - n])
+        elif opcode == 0x7a:
+            n = as_int(stack.pop())
+            if n < 0:
+                raise AvmFault('ROLL of {}'.format(n), ip)
+            if n:
+                stack.append(stack.pop(-1 - n))
+        elif opcode == 0x7b:
+            stack.append(stack.pop(-3))
+        elif opcode == 0x7c:
+            stack[-1], stack[-2] = stack[-2], stack[-1]
+        elif opcode == 0x7d:
+            stack.insert(-2, stack[-1])
+        else:
+            raise AvmFault('invalid opcode {:02x}'.format(opcode), ip)
+
+    def value_op(self, opcode, stack, ip):
+        # Splice
+        if opcode == 0x7e:
+            x2 = as_bytes(stack.pop())
+            stack.append(as_bytes(stack.pop()) + x2)
+        elif opcode == 0x7f:
+            count = as_int(stack.pop())
+            index = as_int(stack.pop())
+            if count < 0 or index < 0:
+                raise AvmFault('SUBSTR out of range', ip)
+            stack.append(as_bytes(stack.pop())[index:index + count])
+        elif opcode == 0x80:
+            count = as_int(stack.pop())
+            if count < 0:
+                raise AvmFault('LEFT out of range', ip)
+            stack.append(as_bytes(stack.pop())[:count])
+        elif opcode == 0x81:
+            count = as_int(stack.pop())
+            x = as_bytes(stack.pop())
+            if count < 0 or count > len(x):
+                raise AvmFault('RIGHT out of range', ip)
+            stack.append(x[len(x) - count:])
+        elif opcode == 0x82:
+            stack.append(len(as_bytes(stack.pop())))
+
+        # Bitwise logic
+        elif opcode == 0x83:
+            stack.append(~as_int(stack.pop()))
+        elif opcode == 0x87:
+            x2 = stack.pop()
+            stack.append(items_equal(stack.pop(), x2))
+        elif opcode in (0x84, 0x85, 0x86):
+            x2 = as_int(stack.pop())
+            x1 = as_int(stack.pop())
+            stack.append(x1 & x2 if opcode == 0x84 else x1 | x2 if opcode == 0x85 else x1 ^ x2)
+
+        # Unary arithmetic
+        elif opcode == 0x8b:
+            stack.append(as_int(stack.pop()) + 1)
+        elif opcode == 0x8c:
+            stack.append(as_int(stack.pop()) - 1)
+        elif opcode == 0x8d:
+            x = as_int(stack.pop())
+            stack.append((x > 0) - (x < 0))
+        elif opcode == 0x8f:
+            stack.append(-as_int(stack.pop()))
+        elif opcode == 0x90:
+            stack.append(abs(as_int(stack.pop())))
+        elif opcode == 0x91:
+            stack.append(not as_bool(stack.pop()))
+        elif opcode == 0x92:
+            stack.append(as_int(stack.pop()) != 0)
+
+        # Boolean logic works on booleans, not integers
+        elif opcode == 0x9a:
+            x2 = as_bool(stack.pop())
+            stack.append(as_bool(stack.pop()) and x2)
+        elif opcode == 0x9b:
+            x2 = as_bool(stack.pop())
+            stack.append(as_bool(stack.pop()) or x2)
+
+        elif opcode == 0xa5:
+            b = as_int(stack.pop())
+            a = as_int(stack.pop())
+            x = as_int(stack.pop())
+            stack.append(a <= x < b)
+
+        # Binary arithmetic
+        else:
+            x2 = as_int(stack.pop())
+            x1 = as_int(stack.pop())
+
+            if opcode == 0x93:
+                result = x1 + x2
+            elif opcode == 0x94:
+                result = x1 - x2
+            elif opcode == 0x95:
+                result = x1 * x2
+            elif opcode == 0x96 or opcode == 0x97:
+                if x2 == 0:
+                    raise AvmFault('division by zero', ip)
+                # BigInteger division truncates towards zero
+                quotient = abs(x1) // abs(x2)
+                if (x1 < 0) != (x2 < 0):
+                    quotient = -quotient
+                result = quotient if opcode == 0x96 else x1 - x2 * quotient
+            elif opcode == 0x98:
+                result = x1 << x2 if x2 >= 0 else x1 >> -x2
+            elif opcode == 0x99:
+                result = x1 >> x2 if x2 >= 0 else x1 << -x2
+            elif opcode == 0x9c:
+                result = x1 == x2
+            elif opcode == 0x9e:
+                result = x1 != x2
+            elif opcode == 0x9f:
+                result = x1 < x2
+            elif opcode == 0xa0:
+                result = x1 > x2
+            elif opcode == 0xa1:
+                result = x1 <= x2
+            elif opcode == 0xa2:
+                result = x1 >= x2
+            elif opcode == 0xa3:
+                result = min(x1, x2)
+            elif opcode == 0xa4:
+                result = max(x1, x2)
+            else:
+                raise AvmFault('invalid opcode {:02x}'.format(opcode), ip)
+
+            stack.append(result)
+
+    def crypto_op(self, opcode, stack, ip):
+        if opcode == 0xa7:
+            stack.append(hashlib.sha1(as_bytes(stack.pop())).digest())
+        elif opcode == 0xa8:
+            stack.append(hashlib.sha256(as_bytes(stack.pop())).digest())
+        elif opcode == 0xa9:
+            stack.append(script_hash(as_bytes(stack.pop())))
+        elif opcode == 0xaa:
+            data = as_bytes(stack.pop())
+            stack.append(hashlib.sha256(hashlib.sha256(data).digest()).digest())
+        elif opcode == 0xac:
+            # There is no transaction to verify a signature against
+            stack.pop()
+            stack.pop()
+            stack.append(False)
+        else:
+            raise AvmFault('unsupported opcode ' + OPCODE_NAMES.get(opcode, '{:02x}'.format(opcode)), ip)
+
+    def array_op(self, opcode, stack, ip):
+        if opcode == 0xc0:
+            item = stack.pop()
+            stack.append(len(item) if isinstance(item, (list, dict)) else len(as_bytes(item)))
+        elif opcode == 0xc1:
+            count = as_int(stack.pop())
+            if count < 0 or count > len(stack):
+                raise AvmFault('PACK of {}'.format(count), ip)
+            items = [stack.pop() for _ in range(count)]
+            stack.append(items)
+        elif opcode == 0xc2:
+            items = stack.pop()
+            if not isinstance(items, list):
+                raise AvmFault('UNPACK of a non array', ip)
+            stack.extend(reversed(items))
+            stack.append(len(items))
+        elif opcode == 0xc3:
+            key = stack.pop()
+            items = stack.pop()
+            if isinstance(items, dict):
+                value = items.get(map_key(key))
+                if value is None:
+                    raise AvmFault('PICKITEM of a missing key', ip)
+            elif isinstance(items, list):
+                index = as_int(key)
+                if index < 0 or index >= len(items):
+                    raise AvmFault('PICKITEM index {} out of range'.format(index), ip)
+                value = items[index]
+            else:
+                raise AvmFault('PICKITEM of a non array', ip)
+            stack.append(value)
+        elif opcode == 0xc4:
+            value = stack.pop()
+            if isinstance(value, Struct):
+                value = value.clone()
+            key = stack.pop()
+            items = stack.pop()
+            if isinstance(items, dict):
+                items[map_key(key)] = value
+            elif isinstance(items, list):
+                index = as_int(key)
+                if index < 0 or index >= len(items):
+                    raise AvmFault('SETITEM index {} out of range'.format(index), ip)
+                items[index] = value
+            else:
+                raise AvmFault('SETITEM of a non array', ip)
+        elif opcode == 0xc5 or opcode == 0xc6:
+            item = stack.pop()
+            kind = list if opcode == 0xc5 else Struct
+            if isinstance(item, list):
+                stack.append(kind(item))
+            else:
+                count = as_int(item)
+                if count < 0:
+                    raise AvmFault('array of size {}'.format(count), ip)
+                stack.append(kind([False] * count))
+        elif opcode == 0xc7:
+            stack.append({})
+        elif opcode == 0xc8:
+            item = stack.pop()
+            if isinstance(item, Struct):
+                item = item.clone()
+            items = stack.pop()
+            if not isinstance(items, list):
+                raise AvmFault('APPEND to a non array', ip)
+            items.append(item)
+        elif opcode == 0xc9:
+            items = stack.pop()
+            if not isinstance(items, list):
+                raise AvmFault('REVERSE of a non array', ip)
+            items.reverse()
+        elif opcode == 0xca:
+            key = stack.pop()
+            items = stack.pop()
+            if isinstance(items, dict):
+                items.pop(map_key(key), None)
+            elif isinstance(items, list):
+                index = as_int(key)
+                if index < 0 or index >= len(items):
+                    raise AvmFault('REMOVE index {} out of range'.format(index), ip)
+                del items[index]
+            else:
+                raise AvmFault('REMOVE from a non array', ip)
+        elif opcode == 0xcb:
+            key = stack.pop()
+            items = stack.pop()
+            if isinstance(items, dict):
+                stack.append(map_key(key) in items)
+            elif isinstance(items, list):
+                index = as_int(key)
+                stack.append(0 <= index < len(items))
+            else:
+                raise AvmFault('HASKEY of a non array', ip)
+        elif opcode == 0xcc or opcode == 0xcd:
+            items = stack.pop()
+            if not isinstance(items, dict):
+                raise AvmFault('KEYS or VALUES of a non map', ip)
+            stack.append(list(items.keys() if opcode == 0xcc else items.values()))
+        else:
+            raise AvmFault('invalid opcode {:02x}'.format(opcode), ip)
+
+    # Syscalls, each returns its price
+
+    def storage_get_context(self, stack):
+        stack.append(self.interop.GetContext())
+        return 1
+
+    def storage_get(self, stack):
+        context = stack.pop()
+        key = as_bytes(stack.pop())
+        value = self.interop.Get(context, key)
+        stack.append(as_bytes(value) if not isinstance(value, bytes) else bytes(value))
+        return SYSCALL_PRICES['Neo.Storage.Get']
+
+    def storage_put(self, stack):
+        context = stack.pop()
+        key = as_bytes(stack.pop())
+        value = as_bytes(stack.pop())
+        self.interop.Put(context, key, value)
+        return ((len(key) + len(value) - 1) // 1024 + 1) * 1000
+
+    def storage_delete(self, stack):
+        context = stack.pop()
+        self.interop.Delete(context, as_bytes(stack.pop()))
+        return SYSCALL_PRICES['Neo.Storage.Delete']
+
+    def runtime_check_witness(self, stack):
+        hash_or_pubkey = as_bytes(stack.pop())
+        stack.append(self.interop.CheckWitness(hash_or_pubkey))
+        return SYSCALL_PRICES['Neo.Runtime.CheckWitness']
+
+    def runtime_get_trigger(self, stack):
+        stack.append(self.interop.GetTrigger())
+        return 1
+
+    def runtime_get_time(self, stack):
+        stack.append(self.clock.time)
+        return 1
+
+    def runtime_log(self, stack):
+        self.interop.Log(as_bytes(stack.pop()).decode('utf-8', 'replace'))
+        return 1
+
+    def runtime_notify(self, stack):
+        state = stack.pop()
+        interop = self.interop
+
+        # RegisterAction compiles to a notification of [name, args...]
+        if isinstance(state, list) and state and type(state[0]) is bytes:
+            if interop.capture:
+                interop.events.append((state[0].decode('utf-8', 'replace'), tuple(state[1:])))
+        else:
+            interop.Notify(state)
+
+        return 1
+
+    def blockchain_get_height(self, stack):
+        stack.append(self.interop.GetHeight())
+        return 1
+
+    def blockchain_get_header(self, stack):
+        stack.append(self.interop.GetHeader(as_int(stack.pop())))
+        return SYSCALL_PRICES['Neo.Blockchain.GetHeader']
+
+    def header_get_index(self, stack):
+        stack.append(self._header(stack).Index)
+        return 1
+
+    def header_get_timestamp(self, stack):
+        stack.append(self._header(stack).Timestamp)
+        return 1
+
+    def _header(self, stack):
+        header = stack.pop()
+        if not isinstance(header, Header):
+            raise AvmFault('not a header')
+        return header
+
+
+def disassemble(script):
+    """
+    Decode a script into (offset, opcode name, operand) tuples
+
+    :rtype: list
+    """
+
+    instructions = []
+    ip = 0
+
+    while ip < len(script):
+        opcode = script[ip]
+        name = OPCODE_NAMES.get(opcode, '{:02x}'.format(opcode))
+        start = ip
+        ip += 1
+        operand = b''
+
+        if 0x01 <= opcode <= 0x4b:
+            operand = script[ip:ip + opcode]
+            ip += opcode
+        elif 0x4c <= opcode <= 0x4e:
+            size = {0x4c: 1, 0x4d: 2, 0x4e: 4}[opcode]
+            length = int.from_bytes(script[ip:ip + size], 'little')
+            operand = script[ip + size:ip + size + length]
+            ip += size + length
+        elif opcode in JUMPS:
+            operand = script[ip:ip + 2]
+            ip += 2
+        elif opcode == 0x67 or opcode == 0x69:
+            operand = script[ip:ip + 20]
+            ip += 20
+        elif opcode == 0x68:
+            operand = script[ip + 1:ip + 1 + script[ip]]
+            ip += 1 + script[ip]
+
+        instructions.append((start, name, operand))
+
+    return instructions
+
+
+def parse_value(value):
+    """
+    Invocation arguments from JSON: strings starting with 0x are byte
+    arrays, other strings are text
+    """
+
+    if isinstance(value, list):
+        return [parse_value(item) for item in value]
+    if isinstance(value, str) and value.startswith('0x'):
+        return bytes.fromhex(value[2:])
+
+    return value
+
+
+def format_profile(profile, top=20):
+    total = max(profile.gas, 1)
+    lines = ['{:<18} {:>10} {:>12} {:>7}'.format('opcode', 'count', 'gas', 'share')]
+
+    for name, units in profile.opcode_gas.most_common(top):
+        lines.append('{:<18} {:>10} {:>12.3f} {:>6.1f}%'.format(name, profile.opcodes[name], units * GAS_UNIT,
+                                                              100.0 * units / total))
+
+    lines.append('')
+    lines.append('{:<32} {:>10} {:>12}'.format('syscall', 'count', 'gas'))
+    for name, units in profile.syscall_gas.most_common():
+        lines.append('{:<32} {:>10} {:>12.3f}'.format(name, profile.syscalls[name], units * GAS_UNIT))
+
+    lines.append('')
+    lines.append('{:<32} {:>10} {:>12} {:>7}'.format('line', 'opcodes', 'gas', 'share'))
+    for line, units in profile.line_gas.most_common(top):
+        lines.append('{:<32} {:>10} {:>12.3f} {:>6.1f}%'.format(line, profile.line_opcodes[line], units * GAS_UNIT,
+                                                              100.0 * units / total))
+
+    lines.append('')
+    lines.append('{} opcodes, {:.3f} GAS'.format(sum(profile.opcodes.values()), profile.gas * GAS_UNIT))
+
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a compiled contract and report where its GAS goes')
+    parser.add_argument('avm', help='compiled contract')
+    parser.add_argument('--debug', help='debug map of the compiler, <name>.debug.json next to the .avm by default')
+    parser.add_argument('--invocations', help='JSON file with a list of {"operation", "args", "witnesses", '
+                                              '"advance"} invocations to run in order')
+    parser.add_argument('--operation', help='single operation to run')
+    parser.add_argument('--args', default='[]', help='JSON arguments of the single operation')
+    parser.add_argument('--witness', action='append', default=[], help='0x script hash that signed, repeatable')
+    parser.add_argument('--trace', help='write every executed opcode to this file')
+    parser.add_argument('--folded', help='write folded stacks for flamegraph.pl to this file')
+    parser.add_argument('--weight', choices=('gas', 'opcodes'), default='gas', help='weight of the folded stacks')
+    parser.add_argument('--output', help='write the profile as JSON to this file')
+    parser.add_argument('--top', type=int, default=20, help='rows per table')
+    args = parser.parse_args(argv)
+
+    with open(args.avm, 'rb') as f:
+        script = f.read()
+
+    debug_path = args.debug or os.path.splitext(args.avm)[0] + '.debug.json'
+    debug = DebugInfo.load(debug_path) if os.path.exists(debug_path) else None
+
+    if args.invocations:
+        with open(args.invocations) as f:
+            invocations = json.load(f)
+    elif args.operation:
+        invocations = [{'operation': args.operation, 'args': json.loads(args.args), 'witnesses': args.witness}]
+    else:
+        parser.error('either --invocations or --operation is required')
+
+    trace = open(args.trace, 'w') if args.trace else None
+    engine = Engine(script, debug=debug, trace=trace)
+    faults = 0
+
+    try:
+        for invocation in invocations:
+            engine.clock.advance(invocation.get('advance', 0))
+            try:
+                result = engine.invoke(invocation['operation'], parse_value(invocation.get('args', [])),
+                                       parse_value(invocation.get('witnesses', [])))
+                print('{}: {!r}'.format(invocation['operation'], result))
+            except ExecutionFault as e:
+                faults += 1
+                print(e)
+    finally:
+        if trace is not None:
+            trace.close()
+
+    print('')
+    print(format_profile(engine.profile, args.top))
+
+    if args.folded:
+        with open(args.folded, 'w') as f:
+            f.write(engine.profile.folded(args.weight) + '\n')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(engine.profile.to_dict(), f, indent=2, sort_keys=True)
+
+    return 1 if faults else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
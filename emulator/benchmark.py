@@ -0,0 +1,422 @@
+"""
+Throughput benchmark of the agreement lifecycle
+
+Synthesizes a workload of agreements between a number of customers over a
+number of locations and event days, and drives it through the whole
+lifecycle in the emulator: deploy, agreement, resultNotice, claim or
+refundAll and deleteAgreement. The weather of every location and day is
+drawn around THRESHOLD with the requested share of sunny days, and the
+oracle fails for the requested share of locations and days, whose
+agreements are refunded instead of claimed.
+
+Every phase reports its operations per second, the interop calls per
+operation and its simulated GAS, next to the storage bytes a live
+agreement occupies. Agreements the contract rejects, for instance because
+their day is too far ahead, are counted apart and left out of the later
+phases and of the costs. The report is JSON, so the reports of two contract
+revisions can be compared:
+
+    python -m emulator.benchmark --agreements 10000 --output new.json
+    python -m emulator.benchmark --contract old_dapp.py --output old.json
+    python -m emulator.benchmark --baseline old.json --output new.json
+"""
+import argparse
+import json
+import platform
+import random
+import time
+
+from .contract import DEFAULT_CONTRACT, Emulator, ExecutionFault
+from .interop import Clock
+from .profiler import ProfilingInterop
+from .vm import storage_size, to_bytes
+
+SECONDS_PER_DAY = 86400
+
+DISTRIBUTIONS = ('uniform', 'front', 'peak')
+
+PHASES = ('deploy', 'agreement', 'resultNotice', 'claim', 'refundAll', 'deleteAgreement')
+
+INTEROP_CALLS = ('get', 'put', 'delete', 'check_witness', 'get_header', 'get_height', 'events', 'logs',
+                 'notifications')
+
+# Metrics that do not depend on the machine, compared exactly up to tolerance
+COST_METRICS = ('interop_per_op', 'gas_per_op')
+
+
+class Workload(object):
+    """
+    Synthetic agreements of customers over locations and event days
+
+    :param agreements: number of agreements
+    :type agreements: int
+
+    :param customers: number of distinct customers
+    :type customers: int
+
+    :param locations: number of distinct locations, popular ones first
+    :type locations: int
+
+    :param days: number of distinct event days
+    :type days: int
+
+    :param distribution: spread of the event days, uniform, front (most
+        events in the first days) or peak (most events halfway)
+    :type distribution: str
+
+    :param sunny: share of the locations and days that are sunny
+    :type sunny: float
+
+    :param failures: share of the locations and days the oracle misses
+    :type failures: float
+
+    :param seed: seed of the random generator
+    :type seed: int
+    """
+
+    def __init__(self, agreements=1000, customers=100, locations=10, days=14, distribution='uniform', sunny=0.5,
+                 failures=0.1, seed=0):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError('distribution must be one of ' + ', '.join(DISTRIBUTIONS))
+
+        self.agreements = agreements
+        self.customers = customers
+        self.locations = locations
+        self.days = days
+        self.distribution = distribution
+        self.sunny = sunny
+        self.failures = failures
+        self.seed = seed
+
+    def to_dict(self):
+        return dict((name, getattr(self, name)) for name in ('agreements', 'customers', 'locations', 'days',
+                                                            'distribution', 'sunny', 'failures', 'seed'))
+
+    def day(self, rng):
+        if self.distribution == 'front':
+            return min(int(rng.expovariate(3.0 / self.days)), self.days - 1)
+
+        if self.distribution == 'peak':
+            return min(max(int(round(rng.gauss((self.days - 1) / 2.0, self.days / 6.0))), 0), self.days - 1)
+
+        return rng.randrange(self.days)
+
+    def generate(self, threshold):
+        """
+        Draw the agreements and the weather
+
+        :param threshold: weather parameter from which a day is sunny
+        :type threshold: int
+
+        :return: (agreements, weather), agreements as (key, customer,
+            location, day, amount, premium) tuples and weather as
+            {(location, day): percent or None if the oracle misses it}
+        :rtype: tuple
+        """
+
+        rng = random.Random(self.seed)
+
+        customers = [b'\x0c' + i.to_bytes(19, 'big') for i in range(self.customers)]
+        locations = ['location-{}'.format(i) for i in range(self.locations)]
+
+        # A few popular locations take most agreements
+        weights = [1.0 / (i + 1) for i in range(self.locations)]
+
+        agreements = []
+        for i in range(self.agreements):
+            amount = rng.randrange(100, 10000)
+            agreements.append(('agreement-{}'.format(i), rng.choice(customers),
+                               rng.choices(locations, weights)[0], self.day(rng), amount, amount // 10))
+
+        weather = {}
+        for location in locations:
+            for day in range(self.days):
+                if rng.random() < self.failures:
+                    weather[(location, day)] = None
+                elif rng.random() < self.sunny:
+                    weather[(location, day)] = rng.randint(threshold, 100)
+                else:
+                    weather[(location, day)] = rng.randint(0, threshold - 1)
+
+        return agreements, weather
+
+
+class Phase(object):
+    """
+    Wall time and interop counts of all invocations of one operation
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.faults = 0
+        self.rejected = 0
+        self.seconds = 0.0
+        self.gas = 0.0
+        self.calls = dict((name, 0) for name in INTEROP_CALLS)
+
+    def add(self, cost, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.gas += cost.gas
+
+        calls = self.calls
+        for name in INTEROP_CALLS:
+            calls[name] += getattr(cost, name)
+
+    def to_dict(self):
+        count = max(self.count, 1)
+        interop = sum(self.calls.values())
+
+        return {
+            'count': self.count,
+            'faults': self.faults,
+            'rejected': self.rejected,
+            'seconds': round(self.seconds, 6),
+            'ops_per_second': round(self.count / self.seconds, 1) if self.seconds else 0,
+            'interop_calls': self.calls,
+            'interop_per_op': round(interop / float(count), 3),
+            'gas': round(self.gas, 6),
+            'gas_per_op': round(self.gas / count, 6),
+        }
+
+
+def storage_bytes(storage):
+    return sum(len(to_bytes(key)) + storage_size(value) for key, value in storage.items())
+
+
+class Benchmark(object):
+    """
+    Runs a workload through the lifecycle of the contract
+
+    :param workload: the agreements to run
+    :type workload: Workload
+
+    :param path: path of the contract source
+    :type path: str
+    """
+
+    def __init__(self, workload, path=DEFAULT_CONTRACT):
+        self.workload = workload
+        self.path = path
+        self.owner = b'\x01' * 20
+        self.oracle = b'\x0a' * 20
+        self.insurer = b'\x0b' * 20
+        self.emulator = Emulator(path, ProfilingInterop(clock=Clock(), capture=False), {'OWNER': self.owner})
+        self.phases = dict((phase, Phase()) for phase in PHASES)
+
+    def invoke(self, phase, operation, args, witnesses, rejectable=False):
+        """
+        :param rejectable: whether the operation returns False when it is
+            rejected, such an invocation is then counted as rejected and not
+            as an operation of the phase
+        :type rejectable: bool
+        """
+
+        emu = self.emulator
+        start = time.perf_counter()
+
+        try:
+            result = emu.invoke(operation, args, witnesses)
+        except ExecutionFault:
+            self.phases[phase].faults += 1
+            return False
+
+        if rejectable and not result:
+            self.phases[phase].rejected += 1
+            return result
+
+        self.phases[phase].add(emu.interop.cost, time.perf_counter() - start)
+
+        return result
+
+    def run(self):
+        """
+        :return: the report
+        :rtype: dict
+        """
+
+        emu = self.emulator
+        owner = self.owner
+        agreements, weather = self.workload.generate(emu.contract.THRESHOLD)
+
+        self.invoke('deploy', 'deploy', ['dapp_name', self.oracle, 3600, SECONDS_PER_DAY, 2592000, 0], [owner])
+        emu.storage[emu.balance_key(owner)] = 10 ** 15
+        baseline_bytes = storage_bytes(emu.storage)
+
+        # Events start on the second day, the earliest the contract accepts
+        first_day = emu.clock.time // SECONDS_PER_DAY + 2
+
+        made = []
+
+        for agreement in agreements:
+            key, customer, location, day, amount, premium = agreement
+            timestamp = (first_day + day) * SECONDS_PER_DAY
+            if self.invoke('agreement', 'agreement', [key, customer, self.insurer, location, timestamp, 0, amount,
+                                                      premium, 'dapp_name', premium // 10], [owner], True):
+                made.append(agreement)
+
+        agreements = made
+        live = len(agreements)
+        live_bytes = storage_bytes(emu.storage) - baseline_bytes
+
+        emu.clock.set_time((first_day + self.workload.days) * SECONDS_PER_DAY)
+
+        for key, customer, location, day, amount, premium in agreements:
+            weather_param = weather[(location, day)]
+            if weather_param is not None:
+                self.invoke('resultNotice', 'resultNotice', [key, weather_param, 1], [self.oracle], True)
+
+        for key, customer, location, day, amount, premium in agreements:
+            if weather[(location, day)] is None:
+                self.invoke('refundAll', 'refundAll', [key], [owner], True)
+            else:
+                self.invoke('claim', 'claim', [key], [owner])
+
+        for key, customer, location, day, amount, premium in agreements:
+            self.invoke('deleteAgreement', 'deleteAgreement', [key], [owner])
+
+        phases = dict((name, phase.to_dict()) for name, phase in self.phases.items())
+        count = sum(phase.count for phase in self.phases.values())
+        seconds = sum(phase.seconds for phase in self.phases.values())
+
+        return {
+            'contract': self.path,
+            'python': platform.python_version(),
+            'workload': self.workload.to_dict(),
+            'phases': phases,
+            'total': {
+                'count': count,
+                'faults': sum(phase.faults for phase in self.phases.values()),
+                'rejected': sum(phase.rejected for phase in self.phases.values()),
+                'seconds': round(seconds, 6),
+                'ops_per_second': round(count / seconds, 1) if seconds else 0,
+                'interop_per_op': round(sum(sum(phase.calls.values()) for phase in self.phases.values())
+                                        / float(max(count, 1)), 3),
+                'gas': round(sum(phase.gas for phase in self.phases.values()), 6),
+                'gas_per_op': round(sum(phase.gas for phase in self.phases.values()) / max(count, 1), 6),
+            },
+            'storage': {
+                'live_agreements': live,
+                'bytes_per_agreement': round(live_bytes / float(live), 3) if live else 0,
+                'bytes_after_delete': storage_bytes(emu.storage) - baseline_bytes,
+            },
+        }
+
+
+def compare(baseline, candidate, tolerance=0.05, throughput_tolerance=None):
+    """
+    Find metrics of a report that got worse than in the baseline report
+
+    :param baseline: report of the old contract
+    :type baseline: dict
+
+    :param candidate: report of the new contract
+    :type candidate: dict
+
+    :param tolerance: relative growth of costs reported as regression
+    :type tolerance: float
+
+    :param throughput_tolerance: relative drop of operations per second
+        reported as regression, throughput is not compared if None
+    :type throughput_tolerance: float
+
+    :return: (phase, metric, old, new) regressions
+    :rtype: list
+    """
+
+    regressions = []
+    old_phases = dict(baseline['phases'], total=baseline['total'])
+    new_phases = dict(candidate['phases'], total=candidate['total'])
+
+    for phase in sorted(set(old_phases) & set(new_phases)):
+        old, new = old_phases[phase], new_phases[phase]
+
+        for metric in COST_METRICS:
+            if new[metric] > old[metric] * (1 + tolerance) and new[metric] - old[metric] > 1e-9:
+                regressions.append((phase, metric, old[metric], new[metric]))
+
+        if new['faults'] > old['faults']:
+            regressions.append((phase, 'faults', old['faults'], new['faults']))
+
+        if new.get('rejected', 0) > old.get('rejected', 0):
+            regressions.append((phase, 'rejected', old.get('rejected', 0), new.get('rejected', 0)))
+
+        if throughput_tolerance is not None and new['ops_per_second'] < old['ops_per_second'] * (
+                1 - throughput_tolerance):
+            regressions.append((phase, 'ops_per_second', old['ops_per_second'], new['ops_per_second']))
+
+    old_bytes = baseline['storage']['bytes_per_agreement']
+    new_bytes = candidate['storage']['bytes_per_agreement']
+    if new_bytes > old_bytes * (1 + tolerance):
+        regressions.append(('storage', 'bytes_per_agreement', old_bytes, new_bytes))
+
+    return regressions
+
+
+def format_report(report):
+    lines = ['{:<16} {:>8} {:>7} {:>8} {:>10} {:>10} {:>12} {:>12}'.format(
+        'phase', 'count', 'faults', 'rejected', 'ops/s', 'interop/op', 'gas/op', 'gas')]
+
+    for name in PHASES + ('total',):
+        phase = report['total'] if name == 'total' else report['phases'][name]
+        lines.append('{:<16} {:>8} {:>7} {:>8} {:>10} {:>10} {:>12.4f} {:>12.3f}'.format(
+            name, phase['count'], phase['faults'], phase.get('rejected', 0), phase['ops_per_second'],
+            phase['interop_per_op'], phase['gas_per_op'], phase['gas']))
+
+    storage = report['storage']
+    lines.append('')
+    lines.append('{} live agreements, {} storage bytes each, {} bytes left after delete'.format(
+        storage['live_agreements'], storage['bytes_per_agreement'], storage['bytes_after_delete']))
+
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the agreement lifecycle of the contract')
+    parser.add_argument('--contract', default=DEFAULT_CONTRACT, help='contract to benchmark')
+    parser.add_argument('--agreements', type=int, default=1000, help='number of agreements')
+    parser.add_argument('--customers', type=int, default=100, help='number of customers')
+    parser.add_argument('--locations', type=int, default=10, help='number of locations')
+    parser.add_argument('--days', type=int, default=14, help='number of event days')
+    parser.add_argument('--distribution', choices=DISTRIBUTIONS, default='uniform', help='spread of the event days')
+    parser.add_argument('--sunny', type=float, default=0.5, help='share of sunny locations and days')
+    parser.add_argument('--failures', type=float, default=0.1, help='share of locations and days to refund')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the workload')
+    parser.add_argument('--output', help='write the report as JSON to this file')
+    parser.add_argument('--baseline', help='report of an older revision to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.05, help='relative cost growth reported as regression')
+    parser.add_argument('--throughput-tolerance', type=float,
+                        help='relative drop of operations per second reported as regression')
+    args = parser.parse_args(argv)
+
+    workload = Workload(args.agreements, args.customers, args.locations, args.days, args.distribution, args.sunny,
+                        args.failures, args.seed)
+    report = Benchmark(workload, args.contract).run()
+    print(format_report(report))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        if baseline['workload'] != report['workload']:
+            print('')
+            print('WARNING the baseline ran a different workload')
+
+        regressions = compare(baseline, report, args.tolerance, args.throughput_tolerance)
+        print('')
+        if not regressions:
+            print('No regressions against ' + args.baseline)
+        for phase, metric, old, new in regressions:
+            print('REGRESSION {} {}: {} -> {}'.format(phase, metric, old, new))
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,178 @@
+"""
+Run a neo-boa contract as plain python against an Interop instance
+"""
+import os
+import sys
+import threading
+import types
+
+from .interop import Interop, interop_modules
+from .vm import APPLICATION, ByteArray, to_bytes
+
+DEFAULT_CONTRACT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'smartcontract', 'sunny_dapp.py')
+
+_code_cache = {}
+_import_lock = threading.Lock()
+
+
+class ExecutionFault(Exception):
+    """
+    Raised when an invocation ends in a FAULT, after its changes are undone
+    """
+
+    def __init__(self, operation, error):
+        super(ExecutionFault, self).__init__('{} faulted: {!r}'.format(operation, error))
+        self.operation = operation
+        self.error = error
+
+
+def compile_contract(path):
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _code_cache.get(path)
+
+    if cached is None or cached[0] != mtime:
+        with open(path) as f:
+            cached = (mtime, compile(f.read(), path, 'exec'))
+        _code_cache[path] = cached
+
+    return cached[1]
+
+
+def load_contract(path, interop, overrides=None):
+    """
+    Execute a contract module with its boa imports bound to interop
+
+    :param path: path of the contract source
+    :type path: str
+
+    :param interop: chain state the contract runs against
+    :type interop: Interop
+
+    :param overrides: module globals to replace, such as OWNER or THRESHOLD
+    :type overrides: dict
+
+    :return: the contract module
+    :rtype: module
+    """
+
+    code = compile_contract(path)
+    module = types.ModuleType(os.path.splitext(os.path.basename(path))[0])
+    module.__file__ = path
+
+    stand_ins = {}
+    for name, attributes in interop_modules(interop).items():
+        stand_in = types.ModuleType(name)
+        stand_in.__dict__.update(attributes)
+        stand_ins[name] = stand_in
+
+    # Parent packages, so that the import statements resolve
+    for name in list(stand_ins):
+        parts = name.split('.')
+        for i in range(1, len(parts)):
+            parent = '.'.join(parts[:i])
+            if parent not in stand_ins:
+                stand_ins[parent] = types.ModuleType(parent)
+                stand_ins[parent].__path__ = []
+
+    with _import_lock:
+        saved = dict((name, sys.modules.get(name)) for name in stand_ins)
+        sys.modules.update(stand_ins)
+        try:
+            exec(code, module.__dict__)
+        finally:
+            for name, previous in saved.items():
+                if previous is None:
+                    del sys.modules[name]
+                else:
+                    sys.modules[name] = previous
+
+    if overrides:
+        module.__dict__.update(overrides)
+
+    return module
+
+
+class Emulator(object):
+    """
+    In-process execution harness for a contract
+
+    :param path: path of the contract source, sunny_dapp.py by default
+    :type path: str
+
+    :param interop: chain state to run against, a new empty one by default
+    :type interop: Interop
+
+    :param overrides: module globals to replace, such as OWNER or THRESHOLD
+    :type overrides: dict
+    """
+
+    def __init__(self, path=DEFAULT_CONTRACT, interop=None, overrides=None):
+        self.path = path
+        self.interop = interop if interop is not None else Interop()
+        self.contract = load_contract(path, self.interop, overrides)
+        self.main = self.contract.Main
+
+    @property
+    def owner(self):
+        return self.contract.OWNER
+
+    @property
+    def storage(self):
+        return self.interop.storage
+
+    @property
+    def clock(self):
+        return self.interop.clock
+
+    def balance_key(self, address):
+        """
+        Storage key of the token balance of an address. Revisions of the
+        contract before the namespaced storage keys have no BalanceKey and
+        store a balance under the address itself.
+
+        :rtype: bytes
+        """
+
+        balance_key = getattr(self.contract, 'BalanceKey', None)
+
+        if balance_key is None:
+            return bytes(to_bytes(address))
+
+        return bytes(to_bytes(balance_key(address)))
+
+    def invoke(self, operation, args=(), witnesses=(), trigger=APPLICATION):
+        """
+        Invoke Main of the contract as one transaction
+
+        :param operation: the operation to be performed, a name or an opcode
+        :type operation: str or bytes
+
+        :param args: arguments of the operation
+        :type args: list
+
+        :param witnesses: script hashes that signed the transaction
+        :type witnesses: iterable
+
+        :return: the return value of Main
+        :raises ExecutionFault: if the contract raised, storage is unchanged
+        """
+
+        # On chain the opcode of the binary ABI is a byte array, which
+        # compares as the integer it encodes
+        if type(operation) is bytes:
+            operation = ByteArray(operation)
+
+        interop = self.interop
+        interop.begin(frozenset(witnesses), trigger)
+
+        try:
+            result = self.main(operation, list(args))
+        except Exception as e:
+            interop.rollback()
+            raise ExecutionFault(operation, e)
+
+        interop.commit()
+
+        return result
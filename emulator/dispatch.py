@@ -0,0 +1,231 @@
+"""
+Side by side dispatch cost of the string ABI and the binary ABI
+
+Runs every operation that has an opcode through Main twice, once by name
+with positional arguments and once by opcode with packed arguments. The
+handler of the operation is replaced by a stub, so that only the work done
+before the handler is reached is counted: comparisons on the operation,
+length checks, argument loads and the slicing of packed fields. The counts
+are converted to AVM opcodes with the instruction sequences neo-boa emits
+for them.
+
+    python -m emulator.dispatch
+"""
+import argparse
+
+from offchain.abi import OPCODES, encode
+
+from .contract import DEFAULT_CONTRACT, Emulator
+from .vm import ByteArray
+
+# AVM opcodes neo-boa emits for every counted step. A local is loaded with
+# DUPFROMALTSTACK, PUSH and PICKITEM and stored with DUPFROMALTSTACK, PUSH,
+# PUSH2, ROLL and SETITEM.
+OPCODES_PER_STEP = {
+    # load, PUSHBYTES or PUSH, EQUAL or NUMEQUAL or LT, JMPIFNOT
+    'compare': 6,
+    # load, SIZE or ARRAYSIZE, PUSH, NUMEQUAL, JMPIFNOT
+    'length': 7,
+    # load args, PUSH, PICKITEM, store
+    'arg': 10,
+    # load, PUSH start, PUSH length, SUBSTR, store
+    'field': 11,
+}
+
+HANDLERS = {
+    'agreement': 'Agreement',
+    'resultNotice': 'ResultNotice',
+    'claim': 'Claim',
+    'refundAll': 'RefundAll',
+    'deleteAgreement': 'DeleteAgreement',
+    'transfer': 'DoTransfer',
+    'balance': 'CacheGet',
+}
+
+CUSTOMER = b'\x0c' * 20
+INSURER = b'\x0b' * 20
+
+SAMPLE_ARGS = {
+    'agreement': ['agreement-0', CUSTOMER, INSURER, 'Amsterdam', 1500172800, 1, 1000, 100, 'dapp_name', 10],
+    'resultNotice': ['agreement-0', 50, 5],
+    'claim': ['agreement-0'],
+    'refundAll': ['agreement-0'],
+    'deleteAgreement': ['agreement-0'],
+    'transfer': [CUSTOMER, INSURER, 1000],
+    'balance': [INSURER],
+}
+
+
+class _Reached(Exception):
+    pass
+
+
+def _counting_types(counts):
+
+    def count(step):
+        counts[step] += 1
+
+    class CountingName(str):
+
+        def __eq__(self, other):
+            count('compare')
+            return str.__eq__(self, other)
+
+        def __ne__(self, other):
+            count('compare')
+            return str.__ne__(self, other)
+
+        __hash__ = str.__hash__
+
+        def __len__(self):
+            count('length')
+            return str.__len__(self)
+
+    class CountingOpcode(ByteArray):
+
+        __slots__ = ()
+
+        def __eq__(self, other):
+            count('compare')
+            return ByteArray.__eq__(self, other)
+
+        __hash__ = ByteArray.__hash__
+
+        def __lt__(self, other):
+            count('compare')
+            return ByteArray.__lt__(self, other)
+
+        def __le__(self, other):
+            count('compare')
+            return ByteArray.__le__(self, other)
+
+        def __gt__(self, other):
+            count('compare')
+            return ByteArray.__gt__(self, other)
+
+        def __ge__(self, other):
+            count('compare')
+            return ByteArray.__ge__(self, other)
+
+        def __len__(self):
+            count('length')
+            return ByteArray.__len__(self)
+
+    class CountingArgs(list):
+
+        def __getitem__(self, index):
+            count('arg')
+            return list.__getitem__(self, index)
+
+        def __len__(self):
+            count('length')
+            return list.__len__(self)
+
+    return CountingName, CountingOpcode, CountingArgs
+
+
+def measure(emulator, operation, args):
+    """
+    Count the dispatch steps of one invocation until its handler is reached
+
+    :param operation: the name or the opcode of the operation
+    :type operation: str or bytes
+
+    :return: the number of steps of every kind
+    :rtype: dict
+    """
+
+    counts = dict((step, 0) for step in OPCODES_PER_STEP)
+    CountingName, CountingOpcode, CountingArgs = _counting_types(counts)
+
+    if isinstance(operation, str):
+        name = operation
+        operation = CountingName(operation)
+    else:
+        name = [n for n, opcode in OPCODES.items() if bytes([opcode]) == operation][0]
+        operation = CountingOpcode(operation)
+
+    contract = emulator.contract
+    handler_name = HANDLERS[name]
+    handler = getattr(contract, handler_name)
+    substr = contract.substr
+
+    def reached(*args):
+        raise _Reached()
+
+    def counting_substr(source, start, length):
+        counts['field'] += 1
+        return substr(source, start, length)
+
+    contract.__dict__[handler_name] = reached
+    contract.__dict__['substr'] = counting_substr
+
+    # Main does not go through invoke, which only accepts plain lists
+    interop = emulator.interop
+    interop.begin(frozenset(), interop.trigger)
+
+    try:
+        emulator.main(operation, CountingArgs(args))
+        raise RuntimeError('{} did not reach {}'.format(name, handler_name))
+    except _Reached:
+        pass
+    finally:
+        interop.rollback()
+        contract.__dict__[handler_name] = handler
+        contract.__dict__['substr'] = substr
+
+    counts['opcodes'] = sum(counts[step] * OPCODES_PER_STEP[step] for step in OPCODES_PER_STEP)
+
+    return counts
+
+
+def compare(path=DEFAULT_CONTRACT):
+    """
+    Dispatch cost of every operation with an opcode, through both ABIs
+
+    :return: {operation: {'string': counts, 'binary': counts}}
+    :rtype: dict
+    """
+
+    emulator = Emulator(path)
+    result = {}
+
+    for name in sorted(OPCODES, key=OPCODES.get):
+        args = SAMPLE_ARGS[name]
+        opcode, packed_args = encode(name, args)
+        result[name] = {
+            'string': measure(emulator, name, args),
+            'binary': measure(emulator, opcode, packed_args),
+        }
+
+    return result
+
+
+def format_comparison(result):
+    row = '{:<16} {:>9} {:>6} {:>6} {:>8}   {:>9} {:>6} {:>6} {:>8}'
+    lines = [row.format('', 'string', '', '', '', 'binary', '', '', ''),
+             row.format('operation', 'compares', 'loads', 'length', 'opcodes',
+                        'compares', 'loads', 'length', 'opcodes')]
+
+    for name in sorted(result, key=OPCODES.get):
+        cells = []
+        for abi in ('string', 'binary'):
+            counts = result[name][abi]
+            cells += [counts['compare'], counts['arg'] + counts['field'], counts['length'], counts['opcodes']]
+        lines.append(row.format(name, *cells))
+
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the dispatch cost of the string and binary ABI')
+    parser.add_argument('--contract', default=DEFAULT_CONTRACT, help='contract to measure')
+    args = parser.parse_args(argv)
+
+    print(format_comparison(compare(args.contract)))
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,266 @@
+"""
+In-memory stand-ins for the boa.blockchain.vm.Neo interop services
+
+An Interop instance holds everything a contract can observe or change on
+chain: the storage of the contract, the witnesses of the current
+transaction, the trigger, the block clock and the emitted logs,
+notifications and events. Its methods have the signatures of the boa
+interop functions, so they can be bound directly into a contract.
+"""
+import hashlib
+
+from .vm import APPLICATION, VERIFICATION, EMPTY, ByteArray, Header, to_bytes
+
+_MISSING = object()
+
+
+class StorageContext(object):
+    """
+    Token returned by GetContext, only used to tell contexts apart
+    """
+
+    __slots__ = ()
+
+
+class Clock(object):
+    """
+    Block clock with a fixed block time
+
+    :param genesis_time: timestamp of block 0
+    :type genesis_time: int
+
+    :param block_time: seconds between two blocks
+    :type block_time: int
+    """
+
+    def __init__(self, genesis_time=1500000000, block_time=15, height=0):
+        self.genesis_time = genesis_time
+        self.block_time = block_time
+        self.height = height
+
+    @property
+    def time(self):
+        return self.genesis_time + self.height * self.block_time
+
+    def header(self, height):
+        return Header(height, self.genesis_time + height * self.block_time)
+
+    def advance(self, seconds):
+        """
+        Move the chain forward by at least the given number of seconds
+        """
+
+        blocks = -(-seconds // self.block_time)
+        self.height += max(blocks, 0)
+
+    def set_time(self, timestamp):
+        """
+        Move the chain to the first block at or after timestamp
+        """
+
+        self.height = max(-(-(timestamp - self.genesis_time) // self.block_time), 0)
+
+
+class Interop(object):
+    """
+    State of the chain as seen by one contract
+
+    :param storage: initial storage of the contract, keyed by bytes
+    :type storage: dict
+
+    :param clock: block clock used by GetHeight and GetHeader
+    :type clock: Clock
+
+    :param capture: whether to record logs, notifications and events
+    :type capture: bool
+    """
+
+    def __init__(self, storage=None, clock=None, capture=True):
+        self.storage = storage if storage is not None else {}
+        self.clock = clock if clock is not None else Clock()
+        self.capture = capture
+        self.context = StorageContext()
+        self.witnesses = frozenset()
+        self.trigger = APPLICATION
+        self.logs = []
+        self.notifications = []
+        self.events = []
+        self._undo = {}
+
+    # Storage
+
+    def GetContext(self):
+        return self.context
+
+    def Get(self, context, key):
+        if type(key) is not bytes:
+            key = to_bytes(key)
+
+        value = self.storage.get(key, EMPTY)
+
+        # Values are deserialized on every read, so a read never aliases
+        # the stored list
+        if type(value) is list:
+            return value[:]
+
+        return value
+
+    def Put(self, context, key, value):
+        if type(key) is not bytes:
+            key = to_bytes(key)
+
+        if key not in self._undo:
+            self._undo[key] = self.storage.get(key, _MISSING)
+
+        if type(value) is list:
+            value = value[:]
+
+        self.storage[key] = value
+
+    def Delete(self, context, key):
+        if type(key) is not bytes:
+            key = to_bytes(key)
+
+        if key not in self._undo:
+            self._undo[key] = self.storage.get(key, _MISSING)
+
+        self.storage.pop(key, None)
+
+    # Runtime
+
+    def CheckWitness(self, hash_or_pubkey):
+        return hash_or_pubkey in self.witnesses
+
+    def GetTrigger(self):
+        return self.trigger
+
+    def Log(self, message):
+        if self.capture:
+            self.logs.append(message)
+
+    def Notify(self, arg):
+        if self.capture:
+            self.notifications.append(arg)
+
+    # Blockchain
+
+    def GetHeight(self):
+        return self.clock.height
+
+    def GetHeader(self, height):
+        return self.clock.header(height)
+
+    # Action
+
+    def RegisterAction(self, event_name, *param_names):
+        events = self.events
+
+        def dispatch(*args):
+            if self.capture:
+                events.append((event_name, args))
+
+        dispatch.event_name = event_name
+        dispatch.param_names = param_names
+
+        return dispatch
+
+    # Transactions
+
+    def begin(self, witnesses, trigger):
+        self.witnesses = witnesses
+        self.trigger = trigger
+        self._undo = {}
+        self._marks = (len(self.logs), len(self.notifications), len(self.events))
+
+    def commit(self):
+        self._undo = {}
+
+    def rollback(self):
+        """
+        Undo the storage changes and output of the current invocation, as a
+        FAULT does on chain
+        """
+
+        for key, value in self._undo.items():
+            if value is _MISSING:
+                self.storage.pop(key, None)
+            else:
+                self.storage[key] = value
+
+        self._undo = {}
+
+        logs, notifications, events = self._marks
+        del self.logs[logs:]
+        del self.notifications[notifications:]
+        del self.events[events:]
+
+    def clear_output(self):
+        del self.logs[:]
+        del self.notifications[:]
+        del self.events[:]
+
+
+def builtin_list(length=0):
+    return [0] * length
+
+
+def builtin_concat(source1, source2):
+    return ByteArray(b''.join((to_bytes(source1), to_bytes(source2))))
+
+
+def builtin_take(source, count):
+    return ByteArray(to_bytes(source)[:count])
+
+
+def builtin_substr(source, start, length):
+    return ByteArray(to_bytes(source)[start:start + length])
+
+
+def builtin_sha1(data):
+    return ByteArray(hashlib.sha1(to_bytes(data)).digest())
+
+
+def builtin_sha256(data):
+    return ByteArray(hashlib.sha256(to_bytes(data)).digest())
+
+
+def interop_modules(interop):
+    """
+    Attributes of the boa modules a contract can import, bound to interop
+
+    :rtype: dict
+    """
+
+    return {
+        'boa.blockchain.vm.Neo.Runtime': {
+            'Log': interop.Log,
+            'Notify': interop.Notify,
+            'GetTrigger': interop.GetTrigger,
+            'CheckWitness': interop.CheckWitness,
+        },
+        'boa.blockchain.vm.Neo.Blockchain': {
+            'GetHeight': interop.GetHeight,
+            'GetHeader': interop.GetHeader,
+        },
+        'boa.blockchain.vm.Neo.Action': {
+            'RegisterAction': interop.RegisterAction,
+        },
+        'boa.blockchain.vm.Neo.TriggerType': {
+            'Application': lambda: APPLICATION,
+            'Verification': lambda: VERIFICATION,
+        },
+        'boa.blockchain.vm.Neo.Storage': {
+            'GetContext': interop.GetContext,
+            'Get': interop.Get,
+            'Put': interop.Put,
+            'Delete': interop.Delete,
+        },
+        'boa.code.builtins': {
+            'list': builtin_list,
+            'concat': builtin_concat,
+            'take': builtin_take,
+            'substr': builtin_substr,
+            'sha1': builtin_sha1,
+            'sha256': builtin_sha256,
+        },
+    }
@@ -0,0 +1,305 @@
+"""
+Per-operation cost profiler
+
+Counts the interop calls every invocation makes and estimates its GAS cost
+from the NEO 2 price list. Opcodes other than interop calls are not
+executed by the emulator, so the estimate is a lower bound that covers the
+storage, witness and notification costs which dominate this contract.
+
+    python -m emulator.profiler --count 1000
+    python -m emulator.profiler --baseline old_dapp.py --count 1000
+"""
+import argparse
+import json
+import math
+
+from .contract import DEFAULT_CONTRACT, Emulator, ExecutionFault
+from .interop import Interop
+from .vm import storage_size, to_bytes
+
+# GAS prices of interop services, in GAS
+PRICES = {
+    'get': 0.1,
+    'put_per_kb': 1.0,
+    'delete': 0.1,
+    'check_witness': 0.2,
+    'get_header': 0.1,
+    'get_height': 0.001,
+    'log': 0.001,
+    'notify': 0.001,
+}
+
+METRICS = ('get', 'put', 'delete', 'bytes_written', 'check_witness', 'events', 'logs', 'gas')
+
+OPERATIONS = ('deploy', 'agreement', 'resultNotice', 'claim', 'refundAll', 'transfer', 'deleteAgreement')
+
+
+class Cost(object):
+    """
+    Interop counts of one invocation
+    """
+
+    __slots__ = ('get', 'put', 'delete', 'bytes_written', 'check_witness', 'get_header',
+                 'get_height', 'events', 'logs', 'notifications', 'gas')
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def to_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+
+class ProfilingInterop(Interop):
+    """
+    Interop that records a Cost for every invocation
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(ProfilingInterop, self).__init__(*args, **kwargs)
+        self.cost = Cost()
+
+    def begin(self, witnesses, trigger):
+        super(ProfilingInterop, self).begin(witnesses, trigger)
+        self.cost = Cost()
+
+    def Get(self, context, key):
+        cost = self.cost
+        cost.get += 1
+        cost.gas += PRICES['get']
+        return super(ProfilingInterop, self).Get(context, key)
+
+    def Put(self, context, key, value):
+        size = len(to_bytes(key)) + storage_size(value)
+        cost = self.cost
+        cost.put += 1
+        cost.bytes_written += size
+        cost.gas += PRICES['put_per_kb'] * max(math.ceil(size / 1024.0), 1)
+        super(ProfilingInterop, self).Put(context, key, value)
+
+    def Delete(self, context, key):
+        cost = self.cost
+        cost.delete += 1
+        cost.gas += PRICES['delete']
+        super(ProfilingInterop, self).Delete(context, key)
+
+    def CheckWitness(self, hash_or_pubkey):
+        cost = self.cost
+        cost.check_witness += 1
+        cost.gas += PRICES['check_witness']
+        return super(ProfilingInterop, self).CheckWitness(hash_or_pubkey)
+
+    def Log(self, message):
+        cost = self.cost
+        cost.logs += 1
+        cost.gas += PRICES['log']
+        super(ProfilingInterop, self).Log(message)
+
+    def Notify(self, arg):
+        cost = self.cost
+        cost.notifications += 1
+        cost.gas += PRICES['notify']
+        super(ProfilingInterop, self).Notify(arg)
+
+    def GetHeight(self):
+        cost = self.cost
+        cost.get_height += 1
+        cost.gas += PRICES['get_height']
+        return super(ProfilingInterop, self).GetHeight()
+
+    def GetHeader(self, height):
+        cost = self.cost
+        cost.get_header += 1
+        cost.gas += PRICES['get_header']
+        return super(ProfilingInterop, self).GetHeader(height)
+
+    def RegisterAction(self, event_name, *param_names):
+        dispatch = super(ProfilingInterop, self).RegisterAction(event_name, *param_names)
+
+        def profiled_dispatch(*args):
+            cost = self.cost
+            cost.events += 1
+            cost.gas += PRICES['notify']
+            dispatch(*args)
+
+        return profiled_dispatch
+
+
+def percentile(values, p):
+    """
+    Nearest rank percentile of a list of numbers
+    """
+
+    if not values:
+        return 0
+
+    ordered = sorted(values)
+    rank = max(int(math.ceil(p / 100.0 * len(ordered))), 1)
+
+    return ordered[rank - 1]
+
+
+class Profiler(object):
+    """
+    Runs invocations through an emulator and keeps their costs per operation
+
+    :param emulator: emulator whose interop is a ProfilingInterop
+    :type emulator: Emulator
+    """
+
+    def __init__(self, emulator=None, path=DEFAULT_CONTRACT, overrides=None):
+        if emulator is None:
+            emulator = Emulator(path, ProfilingInterop(capture=False), overrides)
+        self.emulator = emulator
+        self.samples = {}
+        self.faults = {}
+
+    def invoke(self, operation, args=(), witnesses=()):
+        try:
+            result = self.emulator.invoke(operation, args, witnesses)
+        except ExecutionFault:
+            self.faults[operation] = self.faults.get(operation, 0) + 1
+            raise
+        self.samples.setdefault(operation, []).append(self.emulator.interop.cost)
+        return result
+
+    def summary(self):
+        """
+        p50 and p99 of every metric per operation
+
+        :return: {operation: {'count': n, metric: {'p50': x, 'p99': y}}}
+        :rtype: dict
+        """
+
+        summary = {}
+
+        for operation, costs in self.samples.items():
+            entry = {'count': len(costs), 'faults': self.faults.get(operation, 0)}
+            for metric in METRICS:
+                values = [getattr(cost, metric) for cost in costs]
+                entry[metric] = {'p50': percentile(values, 50), 'p99': percentile(values, 99)}
+            summary[operation] = entry
+
+        return summary
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2, sort_keys=True)
+
+
+def format_summary(summary):
+    lines = ['{:<16} {:>7} {:>11} {:>11} {:>11} {:>11} {:>11} {:>11} {:>15}'.format(
+        'operation', 'count', 'get', 'put', 'delete', 'bytes', 'witness', 'events', 'gas p50/p99')]
+
+    for operation in sorted(summary):
+        entry = summary[operation]
+        cells = ['{}/{}'.format(entry[m]['p50'], entry[m]['p99'])
+                 for m in ('get', 'put', 'delete', 'bytes_written', 'check_witness', 'events')]
+        gas = '{:.3f}/{:.3f}'.format(entry['gas']['p50'], entry['gas']['p99'])
+        lines.append('{:<16} {:>7} {:>11} {:>11} {:>11} {:>11} {:>11} {:>11} {:>15}'.format(
+            operation, entry['count'], *(cells + [gas])))
+
+    return '\n'.join(lines)
+
+
+def compare(baseline, candidate, tolerance=0.05):
+    """
+    Find operations whose p50 or p99 cost grew by more than tolerance
+
+    :param baseline: summary of the old contract
+    :type baseline: dict
+
+    :param candidate: summary of the new contract
+    :type candidate: dict
+
+    :return: (operation, metric, percentile, old, new) regressions
+    :rtype: list
+    """
+
+    regressions = []
+
+    for operation in sorted(set(baseline) & set(candidate)):
+        for metric in METRICS:
+            for p in ('p50', 'p99'):
+                old = baseline[operation][metric][p]
+                new = candidate[operation][metric][p]
+                if new > old * (1 + tolerance) and new - old > 1e-9:
+                    regressions.append((operation, metric, p, old, new))
+
+    return regressions
+
+
+def run_lifecycles(profiler, count):
+    """
+    Drive every operation of sunny_dapp through count agreements, settling
+    half of them with a claim and refunding the other half
+    """
+
+    emu = profiler.emulator
+    owner = emu.owner
+    oracle = b'\x0a' * 20
+    insurer = b'\x0b' * 20
+    customer = b'\x0c' * 20
+
+    profiler.invoke('deploy', ['dapp_name', oracle, 3600, 86400, 2592000, 0], [owner])
+    emu.storage[emu.balance_key(owner)] = 10 ** 15
+    profiler.invoke('transfer', [owner, insurer, 1000], [owner])
+
+    event_time = emu.clock.time + 2 * 86400
+    keys = ['agreement-{}'.format(i) for i in range(count)]
+
+    for key in keys:
+        profiler.invoke('agreement', [key, customer, insurer, 'Amsterdam', event_time, 1, 1000, 100, 'dapp_name', 10],
+                        [owner])
+
+    emu.clock.advance(3 * 86400)
+
+    for i, key in enumerate(keys):
+        if i % 2:
+            profiler.invoke('refundAll', [key], [owner])
+        else:
+            profiler.invoke('resultNotice', [key, (i * 7) % 100, 5], [oracle])
+            profiler.invoke('claim', [key], [owner])
+        profiler.invoke('deleteAgreement', [key], [owner])
+
+
+def profile(path, count, overrides):
+    profiler = Profiler(path=path, overrides=overrides)
+    run_lifecycles(profiler, count)
+    return profiler.summary()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Profile the cost of every operation of the contract')
+    parser.add_argument('--contract', default=DEFAULT_CONTRACT, help='contract to profile')
+    parser.add_argument('--baseline', help='older version of the contract to compare against')
+    parser.add_argument('--count', type=int, default=1000, help='number of agreements to run through')
+    parser.add_argument('--tolerance', type=float, default=0.05, help='relative growth reported as regression')
+    parser.add_argument('--output', help='write the summary as JSON to this file')
+    args = parser.parse_args(argv)
+
+    overrides = {'OWNER': b'\x01' * 20}
+
+    summary = profile(args.contract, args.count, overrides)
+    print(format_summary(summary))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        baseline = profile(args.baseline, args.count, overrides)
+        regressions = compare(baseline, summary, args.tolerance)
+        print('')
+        if not regressions:
+            print('No regressions against ' + args.baseline)
+        for operation, metric, p, old, new in regressions:
+            print('REGRESSION {} {} {}: {} -> {}'.format(operation, metric, p, old, new))
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
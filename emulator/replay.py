@@ -0,0 +1,771 @@
+"""
+Parallel deterministic replay of a recorded invocation history
+
+A history is a file of JSON lines, one invocation per line with its block,
+block timestamp, witnesses and arguments as contract parameters:
+
+    {"block": 12, "time": 1500000180, "operation": "claim", "args": [...], "witnesses": ["0a0a..."]}
+
+Lines of type seed set a storage key outside any invocation, such as a
+genesis balance. Replaying a history through another revision of the
+contract shows how its storage and events would differ.
+
+Invocations of a single agreement, such as resultNotice, claim, refundAll
+and deleteAgreement, are sharded by agreement key over a pool of worker
+processes. All other invocations run in a serial lane, among them
+agreement, which allocates the shared index and list slots. The history
+is replayed in chunks. The parent executes the serial lane of a chunk
+first and sends its writes to the workers along with the state as of the
+start of the chunk, so they see the agreements made in the chunk. Every
+worker then executes its share of the chunk speculatively, recording the
+keys each invocation read and wrote. The results are then validated in
+the order of the history: an invocation whose reads still match the
+merged state is applied as is, any other one is executed again against
+the merged state. The outcome is the same as a serial replay, whatever
+the number of workers.
+
+Balances are only ever changed by adding or subtracting an amount, so a
+balance that another shard changed does not invalidate an invocation: its
+change is applied as a delta, as long as the balance stays positive both
+ways. The counter of a location index is applied as a delta too, as long
+as the slots an invocation allocated are still free and the index is
+emptied, and its counter deleted, by the same invocation both ways.
+
+    python -m emulator.replay record --agreements 10000 history.jsonl
+    python -m emulator.replay run history.jsonl --workers 8 --output replay.json
+    python -m emulator.replay run history.jsonl --baseline /path/to/old/sunny_dapp.py
+"""
+import argparse
+import binascii
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import time
+import zlib
+
+from offchain.indexer import decode_parameter, encode_parameter
+
+from .benchmark import SECONDS_PER_DAY, Workload
+from .contract import DEFAULT_CONTRACT, Emulator, ExecutionFault
+from .interop import Clock, Interop
+from .snapshot import MappedStorage
+from .vm import EMPTY, ByteArray, Header, to_bytes
+
+# Operations on the single agreement given as their first argument
+AGREEMENT_OPERATIONS = frozenset(('resultNotice', 'claim', 'refundAll', 'deleteAgreement', 'claimWithProof'))
+
+BALANCE_PREFIX = b'b/'
+
+# Counters of the location indexes: the prefix, a sha1 and a day
+INDEX_PREFIX = b'i/'
+INDEX_COUNTER_LENGTH = 25
+INDEX_SLOTS = 4294967296
+
+OWNER = b'\x01' * 20
+
+DELETED = None
+
+MISSING = object()
+
+
+def canonical(value):
+    """
+    Stack value as plain bytes, or a tuple for arrays, so that values are
+    compared and hashed the way the AVM sees them
+    """
+
+    if isinstance(value, (list, tuple)):
+        return tuple(canonical(item) for item in value)
+    if value is None:
+        return EMPTY
+
+    return bytes(to_bytes(value))
+
+
+def digest_update(digest, value):
+    if isinstance(value, tuple):
+        digest.update(b'\x01' + len(value).to_bytes(4, 'little'))
+        for item in value:
+            digest_update(digest, item)
+    else:
+        digest.update(b'\x00' + len(value).to_bytes(4, 'little') + value)
+
+
+def state_hash(storage):
+    """
+    :return: hex sha256 over the sorted keys and values of a storage
+    :rtype: str
+    """
+
+    digest = hashlib.sha256()
+
+    # Keys may be byte arrays, which sort as integers
+    for key in sorted(storage, key=bytes):
+        digest_update(digest, bytes(key))
+        digest_update(digest, canonical(storage[key]))
+
+    return digest.hexdigest()
+
+
+def argument(value):
+    if isinstance(value, list):
+        return [argument(item) for item in value]
+    if isinstance(value, bytes):
+        return ByteArray(value)
+
+    return value
+
+
+def is_index_counter(key):
+    return len(key) == INDEX_COUNTER_LENGTH and key.startswith(INDEX_PREFIX)
+
+
+def index_counter(read, written, current):
+    """
+    Value of a location index counter when an invocation that changed it
+    from read to written is applied on top of current instead. The counter
+    holds the next free slot plus INDEX_SLOTS for every agreement in the
+    index, and is deleted with the last agreement.
+
+    :return: the value, DELETED, or MISSING if the invocation would have
+        done something else on current
+    """
+
+    read = int(ByteArray(read))
+    current = int(ByteArray(current))
+
+    if written is DELETED:
+        change = -(read // INDEX_SLOTS) * INDEX_SLOTS
+    else:
+        written = int(ByteArray(canonical(written)))
+        change = written - read
+
+        # Slots were allocated from the next free slot that was read
+        if not written % INDEX_SLOTS == read % INDEX_SLOTS and not current % INDEX_SLOTS == read % INDEX_SLOTS:
+            return MISSING
+
+    value = current + change
+
+    if value < 0 or (written is DELETED) != (value < INDEX_SLOTS):
+        return MISSING
+
+    return DELETED if written is DELETED else value
+
+
+def shard_of(key, shards):
+    return zlib.crc32(bytes(to_bytes(key))) % shards
+
+
+class ReplayClock(Clock):
+    """
+    Clock at the recorded block and timestamp of an invocation
+    """
+
+    def __init__(self):
+        super(ReplayClock, self).__init__()
+        self.timestamp = self.genesis_time
+
+    @property
+    def time(self):
+        return self.timestamp
+
+    def set_block(self, height, timestamp):
+        self.height = height
+        self.timestamp = timestamp
+
+    def header(self, height):
+        if height == self.height:
+            return Header(height, self.timestamp)
+        return super(ReplayClock, self).header(height)
+
+
+class TracingInterop(Interop):
+    """
+    Interop that records the value of every key an invocation read first
+    and the last value it wrote
+
+    When journal is a dict, it keeps the value every key written since had
+    before, across invocations, so a worker can undo a whole chunk.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TracingInterop, self).__init__(*args, **kwargs)
+        self.reads = {}
+        self.writes = {}
+        self.journal = None
+
+    def begin(self, witnesses, trigger):
+        super(TracingInterop, self).begin(witnesses, trigger)
+        self.reads = {}
+        self.writes = {}
+
+    def rollback(self):
+        super(TracingInterop, self).rollback()
+        self.writes = {}
+
+    def Get(self, context, key):
+        value = super(TracingInterop, self).Get(context, key)
+        key = bytes(to_bytes(key))
+
+        if key not in self.reads and key not in self.writes:
+            self.reads[key] = canonical(value)
+
+        return value
+
+    def Put(self, context, key, value):
+        key = bytes(to_bytes(key))
+        self.keep(key)
+        super(TracingInterop, self).Put(context, key, value)
+        self.writes[key] = self.storage[key]
+
+    def Delete(self, context, key):
+        key = bytes(to_bytes(key))
+        self.keep(key)
+        super(TracingInterop, self).Delete(context, key)
+        self.writes[key] = DELETED
+
+    def keep(self, key):
+        if self.journal is not None and key not in self.journal:
+            self.journal[key] = self.storage.get(key, MISSING)
+
+    def undo(self):
+        """
+        Restore the keys in the journal to the values they had before
+        """
+
+        storage = self.storage
+
+        for key, value in self.journal.items():
+            if value is MISSING:
+                storage.pop(key, None)
+            else:
+                storage[key] = value
+
+        self.journal.clear()
+
+
+class Outcome(object):
+    """
+    What one invocation read, wrote and returned
+    """
+
+    __slots__ = ('index', 'result', 'events', 'reads', 'writes')
+
+    def __init__(self, index, result, events, reads, writes):
+        self.index = index
+        self.result = result
+        self.events = events
+        self.reads = reads
+        self.writes = writes
+
+    def digest(self):
+        digest = hashlib.sha1()
+        digest_update(digest, self.result)
+        digest_update(digest, self.events)
+        return digest.digest()
+
+
+class Executor(object):
+    """
+    An emulator whose invocations are traced, over a given storage
+    """
+
+    def __init__(self, path, storage, overrides=None):
+        self.clock = ReplayClock()
+        self.interop = TracingInterop(storage, self.clock)
+        self.emulator = Emulator(path, self.interop, overrides)
+
+    def execute(self, index, invocation):
+        interop = self.interop
+        self.clock.set_block(invocation['block'], invocation['time'])
+
+        try:
+            result = canonical(self.emulator.invoke(invocation['operation'], invocation['args'],
+                                                    invocation['witnesses']))
+        except ExecutionFault:
+            result = (b'FAULT',)
+
+        events = tuple((name.encode(), canonical(args)) for name, args in interop.events)
+        events += tuple((b'notify', canonical(arg)) for arg in interop.notifications)
+        events += tuple((b'log', canonical(message)) for message in interop.logs)
+        interop.clear_output()
+
+        return Outcome(index, result, events, interop.reads, interop.writes)
+
+
+def read_history(path):
+    """
+    :return: invocations and seeds, in the order of the file
+    :rtype: list
+    """
+
+    entries = []
+
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+
+            entry = json.loads(line)
+
+            if entry.get('type') == 'seed':
+                entries.append({'type': 'seed', 'key': binascii.unhexlify(entry['key']),
+                                'value': argument(decode_parameter(entry['value']))})
+                continue
+
+            entries.append({
+                'type': 'invoke',
+                'block': entry['block'],
+                'time': entry['time'],
+                'operation': entry['operation'],
+                'args': [argument(decode_parameter(arg)) for arg in entry.get('args', [])],
+                'witnesses': [binascii.unhexlify(witness) for witness in entry.get('witnesses', [])],
+            })
+
+    return entries
+
+
+def lane(entry, shards):
+    """
+    Shard of an invocation, None for the serial lane
+    """
+
+    if entry['type'] == 'invoke' and entry['operation'] in AGREEMENT_OPERATIONS and entry['args']:
+        return shard_of(entry['args'][0], shards)
+
+    return None
+
+
+def worker(path, overrides, snapshot, connection):
+    """
+    Speculative executor of one shard, holding the state as of the start of
+    the current chunk
+    """
+
+    storage = MappedStorage(snapshot) if snapshot else {}
+    executor = Executor(path, storage, overrides)
+    interop = executor.interop
+    interop.journal = {}
+
+    while True:
+        message = connection.recv()
+
+        if message is None:
+            return
+
+        invocations, delta, ahead = message
+
+        # Undo the speculative writes of the last chunk, then catch up with
+        # what the parent applied
+        interop.undo()
+
+        for key, value in delta.items():
+            if value is DELETED:
+                storage.pop(key, None)
+            else:
+                storage[key] = value
+
+        # The serial lane the parent executed ahead of the chunk is
+        # speculative too, so it is undone with the chunk
+        for key, value in ahead.items():
+            interop.keep(key)
+            if value is DELETED:
+                storage.pop(key, None)
+            else:
+                storage[key] = value
+
+        connection.send([executor.execute(index, invocation) for index, invocation in invocations])
+
+
+class Replay(object):
+    """
+    Replays a history through a contract
+
+    :param path: path of the contract source
+    :type path: str
+
+    :param workers: number of worker processes, 0 to replay serially
+    :type workers: int
+
+    :param chunk_size: invocations speculated on at a time
+    :type chunk_size: int
+
+    :param overrides: module globals to replace, OWNER by default
+    :type overrides: dict
+
+    :param snapshot: snapshot of the storage to start from, empty storage
+        by default
+    :type snapshot: str
+    """
+
+    def __init__(self, path=DEFAULT_CONTRACT, workers=0, chunk_size=1000, overrides=None, snapshot=None):
+        self.path = path
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.overrides = overrides if overrides is not None else {'OWNER': OWNER}
+        self.snapshot = snapshot
+        self.storage = MappedStorage(snapshot) if snapshot else {}
+        self.digests = []
+        self.operations = []
+        self.speculated = 0
+        self.executed = 0
+
+    def run(self, entries):
+        """
+        :return: the summary of the replay
+        :rtype: dict
+        """
+
+        start = time.perf_counter()
+        executor = Executor(self.path, self.storage, self.overrides)
+
+        if self.workers <= 0:
+            for entry in entries:
+                self.apply_serial(executor, entry)
+        else:
+            self.run_parallel(executor, entries)
+
+        return self.summary(time.perf_counter() - start)
+
+    def apply_serial(self, executor, entry):
+        if entry['type'] == 'seed':
+            self.storage[entry['key']] = entry['value']
+            return {entry['key']: entry['value']}
+
+        outcome = executor.execute(len(self.digests), entry)
+        self.record(entry, outcome)
+        self.executed += 1
+
+        return outcome.writes
+
+    def record(self, entry, outcome):
+        self.digests.append(outcome.digest())
+        self.operations.append(entry['operation'])
+
+    def run_parallel(self, executor, entries):
+        context = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+        pipes = []
+        processes = []
+
+        for _ in range(self.workers):
+            parent, child = context.Pipe()
+            process = context.Process(target=worker, args=(self.path, self.overrides, self.snapshot, child))
+            process.daemon = True
+            process.start()
+            pipes.append(parent)
+            processes.append(process)
+
+        delta = {}
+
+        try:
+            for chunk_start in range(0, len(entries), self.chunk_size):
+                chunk = entries[chunk_start:chunk_start + self.chunk_size]
+                shards = [[] for _ in range(self.workers)]
+                serial = []
+
+                for offset, entry in enumerate(chunk):
+                    shard = lane(entry, self.workers)
+                    if shard is None:
+                        serial.append((chunk_start + offset, entry))
+                    else:
+                        shards[shard].append((chunk_start + offset, entry))
+
+                speculative, ahead = self.run_ahead(executor, serial)
+
+                for pipe, invocations in zip(pipes, shards):
+                    pipe.send((invocations, delta, ahead))
+
+                for pipe in pipes:
+                    for outcome in pipe.recv():
+                        speculative[outcome.index] = outcome
+
+                delta = {}
+                for offset, entry in enumerate(chunk):
+                    outcome = speculative.get(chunk_start + offset)
+
+                    if outcome is not None and self.validate(outcome):
+                        delta.update(self.apply(entry, outcome))
+                    else:
+                        delta.update(self.apply_serial(executor, entry))
+        finally:
+            for pipe in pipes:
+                pipe.send(None)
+            for process in processes:
+                process.join()
+
+    def run_ahead(self, executor, serial):
+        """
+        Execute the serial lane of a chunk ahead of the rest of it, in the
+        order of the history, so the workers see the agreements made and
+        the settings deployed in the chunk. The writes are undone again and
+        the outcomes validated like those of the workers.
+
+        :param serial: indexes and entries of the serial lane
+        :type serial: list
+
+        :return: the outcomes by index and the writes of all of them
+        :rtype: tuple
+        """
+
+        interop = executor.interop
+        interop.journal = {}
+        outcomes = {}
+        ahead = {}
+
+        try:
+            for index, entry in serial:
+                if entry['type'] == 'seed':
+                    interop.keep(entry['key'])
+                    self.storage[entry['key']] = entry['value']
+                    ahead[entry['key']] = entry['value']
+                else:
+                    outcome = executor.execute(index, entry)
+                    outcomes[index] = outcome
+                    ahead.update(outcome.writes)
+        finally:
+            interop.undo()
+            interop.journal = None
+
+        return outcomes, ahead
+
+    def validate(self, outcome):
+        storage = self.storage
+
+        for key, value in outcome.reads.items():
+            current = canonical(storage.get(key, EMPTY))
+
+            if current == value:
+                continue
+
+            written = outcome.writes.get(key, MISSING)
+
+            if written is MISSING:
+                return False
+
+            if is_index_counter(key):
+                if index_counter(value, written, current) is MISSING:
+                    return False
+                continue
+
+            # A balance that moved is fine while the invocation only added
+            # to it or subtracted from it, and it stays positive
+            if not key.startswith(BALANCE_PREFIX) or written is DELETED:
+                return False
+
+            change = int(ByteArray(canonical(written))) - int(ByteArray(value))
+            if int(ByteArray(current)) + change <= 0:
+                return False
+
+        return True
+
+    def apply(self, entry, outcome):
+        storage = self.storage
+        writes = {}
+
+        for key, value in outcome.writes.items():
+            if is_index_counter(key) and key in outcome.reads:
+                value = index_counter(outcome.reads[key], value, canonical(storage.get(key, EMPTY)))
+
+            if value is DELETED:
+                storage.pop(key, None)
+            elif key.startswith(BALANCE_PREFIX) and key in outcome.reads:
+                change = int(ByteArray(canonical(value))) - int(ByteArray(outcome.reads[key]))
+                value = int(ByteArray(canonical(storage.get(key, EMPTY)))) + change
+                storage[key] = value
+            else:
+                storage[key] = value
+            writes[key] = value
+
+        self.record(entry, outcome)
+        self.speculated += 1
+
+        return writes
+
+    def summary(self, seconds):
+        events = hashlib.sha256()
+        for digest in self.digests:
+            events.update(digest)
+
+        return {
+            'contract': self.path,
+            'invocations': len(self.digests),
+            'workers': self.workers,
+            'speculated': self.speculated,
+            'executed': self.executed,
+            'seconds': round(seconds, 3),
+            'invocations_per_second': round(len(self.digests) / seconds, 1) if seconds else 0,
+            'state_hash': state_hash(self.storage),
+            'events_hash': events.hexdigest(),
+            'keys': len(self.storage),
+        }
+
+
+def diff(baseline, candidate, limit=20):
+    """
+    Differences between two replays of the same history
+
+    :param baseline: replay of the old contract
+    :type baseline: Replay
+
+    :param candidate: replay of the new contract
+    :type candidate: Replay
+
+    :return: keys added, removed and changed, and the invocations whose
+        result or events differ, at most limit of each
+    :rtype: dict
+    """
+
+    old, new = baseline.storage, candidate.storage
+    changed = [key for key in set(old) & set(new) if canonical(old[key]) != canonical(new[key])]
+    invocations = [index for index, (a, b) in enumerate(zip(baseline.digests, candidate.digests)) if a != b]
+
+    def hexlify(keys):
+        return [binascii.hexlify(key).decode() for key in sorted(keys, key=bytes)[:limit]]
+
+    return {
+        'added': len(set(new) - set(old)),
+        'removed': len(set(old) - set(new)),
+        'changed': len(changed),
+        'added_keys': hexlify(set(new) - set(old)),
+        'removed_keys': hexlify(set(old) - set(new)),
+        'changed_keys': hexlify(changed),
+        'invocations': len(invocations),
+        'first_invocations': [{'index': index, 'operation': candidate.operations[index]}
+                              for index in invocations[:limit]],
+    }
+
+
+class Recorder(object):
+    """
+    Writes the invocations of an emulator to a history file
+
+    :param emulator: emulator whose invocations are recorded
+    :type emulator: Emulator
+
+    :param f: file to write the JSON lines to
+    :type f: file
+    """
+
+    def __init__(self, emulator, f):
+        self.emulator = emulator
+        self.file = f
+
+    def seed(self, key, value):
+        self.emulator.storage[key] = value
+        self.file.write(json.dumps({'type': 'seed', 'key': binascii.hexlify(key).decode(),
+                                    'value': encode_parameter(value)}) + '\n')
+
+    def invoke(self, operation, args=(), witnesses=()):
+        clock = self.emulator.clock
+        self.file.write(json.dumps({
+            'block': clock.height,
+            'time': clock.time,
+            'operation': operation,
+            'args': [encode_parameter(arg) for arg in args],
+            'witnesses': [binascii.hexlify(bytes(witness)).decode() for witness in witnesses],
+        }) + '\n')
+
+        try:
+            return self.emulator.invoke(operation, args, witnesses)
+        except ExecutionFault:
+            return None
+
+
+def synthesize(workload, recorder):
+    """
+    Record a history of interleaved agreement lifecycles: agreements are
+    made up to ten days before their day and noticed, settled and deleted
+    on the days after
+    """
+
+    emu = recorder.emulator
+    oracle = b'\x0a' * 20
+    insurer = b'\x0b' * 20
+    rng = random.Random(workload.seed)
+    agreements, weather = workload.generate(emu.contract.THRESHOLD)
+
+    recorder.invoke('deploy', ['dapp_name', oracle, 3600, SECONDS_PER_DAY, 2592000, 0], [OWNER])
+    recorder.seed(emu.balance_key(OWNER), 10 ** 15)
+
+    first_day = emu.clock.time // SECONDS_PER_DAY + 11
+    steps = []
+
+    for n, (key, customer, location, day, amount, premium) in enumerate(agreements):
+        event_time = (first_day + day) * SECONDS_PER_DAY
+        made = event_time - rng.randint(2, 10) * SECONDS_PER_DAY + rng.randrange(SECONDS_PER_DAY)
+        noticed = event_time + SECONDS_PER_DAY + rng.randrange(3600, 7200)
+        weather_param = weather[(location, day)]
+
+        steps.append((made, n, 'agreement', [key, customer, insurer, location, event_time, 0, amount, premium,
+                                              'dapp_name', premium // 10], [OWNER]))
+
+        if weather_param is None:
+            steps.append((noticed + 3 * SECONDS_PER_DAY, n, 'refundAll', [key], [OWNER]))
+        else:
+            steps.append((noticed, n, 'resultNotice', [key, weather_param, 1], [oracle]))
+            steps.append((noticed + rng.randrange(60, 7200), n, 'claim', [key], [customer]))
+
+        steps.append((noticed + 7 * SECONDS_PER_DAY, n, 'deleteAgreement', [key], [OWNER]))
+
+    for timestamp, _, operation, args, witnesses in sorted(steps, key=lambda step: step[:2]):
+        emu.clock.set_time(timestamp)
+        recorder.invoke(operation, args, witnesses)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a recorded history of invocations through the contract')
+    commands = parser.add_subparsers(dest='command')
+
+    record = commands.add_parser('record', help='record a synthetic history')
+    record.add_argument('history', help='file to write the history to')
+    record.add_argument('--agreements', type=int, default=1000, help='number of agreements')
+    record.add_argument('--customers', type=int, default=100, help='number of customers')
+    record.add_argument('--locations', type=int, default=10, help='number of locations')
+    record.add_argument('--days', type=int, default=30, help='number of event days')
+    record.add_argument('--seed', type=int, default=0, help='seed of the workload')
+
+    run = commands.add_parser('run', help='replay a history')
+    run.add_argument('history', help='file with the history')
+    run.add_argument('--contract', default=DEFAULT_CONTRACT, help='contract to replay through')
+    run.add_argument('--baseline', help='older contract to replay too and diff against')
+    run.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes, 0 for serial')
+    run.add_argument('--chunk-size', type=int, default=1000, help='invocations speculated on at a time')
+    run.add_argument('--snapshot', help='snapshot of the storage to start from, see emulator.snapshot')
+    run.add_argument('--output', help='write the summary as JSON to this file')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        workload = Workload(args.agreements, args.customers, args.locations, args.days, seed=args.seed)
+        with open(args.history, 'w') as f:
+            synthesize(workload, Recorder(Emulator(overrides={'OWNER': OWNER}), f))
+        return 0
+
+    if args.command != 'run':
+        parser.print_help()
+        return 1
+
+    entries = read_history(args.history)
+
+    replay = Replay(args.contract, args.workers, args.chunk_size, snapshot=args.snapshot)
+    summary = replay.run(entries)
+    print(json.dumps(summary, indent=2, sort_keys=True))
+
+    if args.baseline:
+        baseline = Replay(args.baseline, args.workers, args.chunk_size, snapshot=args.snapshot)
+        baseline.run(entries)
+        summary['diff'] = diff(baseline, replay)
+        print(json.dumps(summary['diff'], indent=2, sort_keys=True))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+
+    return 1 if args.baseline and (summary['diff']['changed'] or summary['diff']['added'] or
+                                   summary['diff']['removed'] or summary['diff']['invocations']) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,435 @@
+"""
+Snapshots of the storage and block clock of an emulated contract
+
+A snapshot is a single file that holds the storage of a contract, balances
+included, and the state of its block clock. It is laid out as a hash table,
+so it is not read when restored: the file is memory mapped and every key is
+looked up in the mapping when the contract reads it. Restoring a snapshot
+of a million agreements takes milliseconds, and processes that restore the
+same snapshot share its pages through the page cache instead of each
+holding a copy.
+
+The mapping is read only. Writes and deletes go to an overlay in the memory
+of the process, so restored storage is copy-on-write per key and the file
+never changes:
+
+    python -m emulator.snapshot build --agreements 1000000 baseline.snapshot
+
+    from emulator.snapshot import restore
+
+    emu = restore('baseline.snapshot', overrides={'OWNER': owner})
+
+File layout, all integers little endian:
+
+    header   magic, version, genesis time, block time, height, entries,
+             buckets
+    buckets  offset of the entry in each bucket, 0 if empty, buckets is a
+             power of two at least twice the number of entries
+    entries  key length, key, value
+    value    type, length, data; an array holds its items as values
+"""
+import argparse
+import mmap
+import os
+import struct
+import time
+import zlib
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+from .benchmark import SECONDS_PER_DAY, Workload
+from .contract import DEFAULT_CONTRACT, Emulator, ExecutionFault
+from .interop import Clock, Interop
+from .vm import ByteArray, bytes_to_int, int_to_bytes
+
+MAGIC = b'SUNNYSNP'
+VERSION = 1
+
+HEADER = struct.Struct('<8sIqqqQQ')
+BUCKET = struct.Struct('<Q')
+KEY = struct.Struct('<I')
+VALUE = struct.Struct('<BI')
+
+# Types of the values, so a value is restored as the python type the
+# contract stored
+BYTES = 0
+BYTE_ARRAY = 1
+INTEGER = 2
+STRING = 3
+BOOLEAN = 4
+ARRAY = 5
+
+_MISSING = object()
+
+
+class SnapshotError(Exception):
+    """
+    Raised for a file that is not a snapshot of a supported version
+    """
+
+
+def encode_value(value):
+    """
+    :rtype: bytes
+    """
+
+    value_type = type(value)
+
+    if value_type is ByteArray:
+        kind, data = BYTE_ARRAY, bytes(value)
+    elif value_type is bool:
+        kind, data = BOOLEAN, b'\x01' if value else b''
+    elif value_type is int:
+        kind, data = INTEGER, int_to_bytes(value)
+    elif value_type is str:
+        kind, data = STRING, value.encode()
+    elif isinstance(value, (list, tuple)):
+        kind, data = ARRAY, struct.pack('<I', len(value)) + b''.join(encode_value(item) for item in value)
+    elif isinstance(value, bytes):
+        kind, data = BYTES, bytes(value)
+    else:
+        raise TypeError('Cannot snapshot a value of type {}'.format(value_type.__name__))
+
+    return VALUE.pack(kind, len(data)) + data
+
+
+def decode_value(buffer, offset):
+    """
+    :return: the value at offset and the offset after it
+    :rtype: tuple
+    """
+
+    kind, length = VALUE.unpack_from(buffer, offset)
+    offset += VALUE.size
+    end = offset + length
+
+    if kind == ARRAY:
+        count, = struct.unpack_from('<I', buffer, offset)
+        items = []
+        offset += 4
+        for _ in range(count):
+            item, offset = decode_value(buffer, offset)
+            items.append(item)
+        return items, end
+
+    data = bytes(buffer[offset:end])
+
+    if kind == BYTE_ARRAY:
+        return ByteArray(data), end
+    if kind == INTEGER:
+        return bytes_to_int(data), end
+    if kind == STRING:
+        return data.decode(), end
+    if kind == BOOLEAN:
+        return data == b'\x01', end
+
+    return data, end
+
+
+def save(path, storage, clock=None):
+    """
+    Write a snapshot of a storage and a block clock
+
+    :param path: file to write
+    :type path: str
+
+    :param storage: storage of the contract, keyed by bytes
+    :type storage: dict
+
+    :param clock: block clock, a new one by default
+    :type clock: Clock
+
+    :return: the size of the file in bytes
+    :rtype: int
+    """
+
+    clock = clock if clock is not None else Clock()
+    keys = sorted(bytes(key) for key in storage)
+
+    buckets = 1
+    while buckets < 2 * max(len(keys), 1):
+        buckets *= 2
+
+    table = [0] * buckets
+    entries = []
+    offset = HEADER.size + buckets * BUCKET.size
+
+    # Entries are written in key order, so the same state always gives the
+    # same file
+    for key in keys:
+        entry = KEY.pack(len(key)) + key + encode_value(storage[key])
+
+        bucket = zlib.crc32(key) & (buckets - 1)
+        while table[bucket]:
+            bucket = (bucket + 1) & (buckets - 1)
+        table[bucket] = offset
+
+        entries.append(entry)
+        offset += len(entry)
+
+    temporary = path + '.tmp'
+
+    with open(temporary, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, clock.genesis_time, clock.block_time, clock.height, len(keys), buckets))
+        f.write(struct.pack('<{}Q'.format(buckets), *table))
+        for entry in entries:
+            f.write(entry)
+
+    # A snapshot that is mapped by other processes is replaced, not
+    # overwritten
+    os.replace(temporary, path)
+
+    return offset
+
+
+class MappedStorage(MutableMapping):
+    """
+    Storage of a contract restored from a snapshot, read from a memory
+    mapping of the file and changed in an overlay
+
+    :param path: snapshot file
+    :type path: str
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.map) < HEADER.size:
+            raise SnapshotError('{} is not a snapshot'.format(path))
+
+        magic, version, genesis_time, block_time, height, entries, buckets = HEADER.unpack_from(self.map, 0)
+
+        if magic != MAGIC:
+            raise SnapshotError('{} is not a snapshot'.format(path))
+        if version != VERSION:
+            raise SnapshotError('{} is a snapshot of version {}, not {}'.format(path, version, VERSION))
+
+        self.genesis_time = genesis_time
+        self.block_time = block_time
+        self.height = height
+        self.entries = entries
+        self.buckets = buckets
+        self.overlay = {}
+        self.deleted = set()
+        self.added = 0
+
+    def clock(self):
+        """
+        :return: a new clock at the block of the snapshot
+        :rtype: Clock
+        """
+
+        return Clock(self.genesis_time, self.block_time, self.height)
+
+    def close(self):
+        self.map.close()
+
+    def find(self, key):
+        """
+        :return: offset of the value of key in the snapshot, None if the
+            snapshot does not hold key
+        """
+
+        buffer = self.map
+        mask = self.buckets - 1
+        bucket = zlib.crc32(key) & mask
+
+        while True:
+            offset, = BUCKET.unpack_from(buffer, HEADER.size + bucket * BUCKET.size)
+
+            if not offset:
+                return None
+
+            length, = KEY.unpack_from(buffer, offset)
+            start = offset + KEY.size
+
+            if length == len(key) and buffer[start:start + length] == key:
+                return start + length
+
+            bucket = (bucket + 1) & mask
+
+    def get(self, key, default=None):
+        value = self.overlay.get(key, _MISSING)
+
+        if value is not _MISSING:
+            return value
+
+        if key in self.deleted:
+            return default
+
+        offset = self.find(bytes(key))
+
+        if offset is None:
+            return default
+
+        return decode_value(self.map, offset)[0]
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+
+        if value is _MISSING:
+            raise KeyError(key)
+
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __setitem__(self, key, value):
+        key = bytes(key)
+
+        if key not in self.overlay:
+            if key in self.deleted:
+                self.deleted.discard(key)
+            elif self.find(key) is None:
+                self.added += 1
+
+        self.overlay[key] = value
+
+    def __delitem__(self, key):
+        key = bytes(key)
+
+        if key in self.overlay:
+            del self.overlay[key]
+            if self.find(key) is None:
+                self.added -= 1
+            else:
+                self.deleted.add(key)
+        elif key not in self.deleted and self.find(key) is not None:
+            self.deleted.add(key)
+        else:
+            raise KeyError(key)
+
+    def snapshot_keys(self):
+        """
+        Keys held by the file, in order, whatever the overlay holds
+        """
+
+        buffer = self.map
+        offset = HEADER.size + self.buckets * BUCKET.size
+
+        for _ in range(self.entries):
+            length, = KEY.unpack_from(buffer, offset)
+            start = offset + KEY.size
+            key = bytes(buffer[start:start + length])
+            yield key
+            offset = decode_value(buffer, start + length)[1]
+
+    def __iter__(self):
+        overlay, deleted = self.overlay, self.deleted
+
+        for key in self.snapshot_keys():
+            if key not in overlay and key not in deleted:
+                yield key
+
+        for key in list(overlay):
+            yield key
+
+    def __len__(self):
+        return self.entries - len(self.deleted) + self.added
+
+
+def restore(path, contract=DEFAULT_CONTRACT, overrides=None, interop_class=Interop, **kwargs):
+    """
+    Restore an emulator from a snapshot
+
+    :param path: snapshot file
+    :type path: str
+
+    :param contract: path of the contract source
+    :type contract: str
+
+    :param overrides: module globals to replace, such as OWNER
+    :type overrides: dict
+
+    :param interop_class: interop to run against, given the remaining
+        keyword arguments
+    :type interop_class: type
+
+    :rtype: Emulator
+    """
+
+    storage = MappedStorage(path)
+
+    return Emulator(contract, interop_class(storage, storage.clock(), **kwargs), overrides)
+
+
+def build(workload, path=DEFAULT_CONTRACT, owner=b'\x01' * 20):
+    """
+    Deploy the contract and make the agreements of a workload, as the
+    benchmark does before its first result notice
+
+    :rtype: Emulator
+    """
+
+    oracle = b'\x0a' * 20
+    insurer = b'\x0b' * 20
+    emu = Emulator(path, Interop(clock=Clock(), capture=False), {'OWNER': owner})
+    agreements, _ = workload.generate(emu.contract.THRESHOLD)
+
+    emu.invoke('deploy', ['dapp_name', oracle, 3600, SECONDS_PER_DAY, 2592000, 0], [owner])
+    emu.storage[emu.balance_key(owner)] = 10 ** 15
+
+    first_day = emu.clock.time // SECONDS_PER_DAY + 2
+
+    for key, customer, location, day, amount, premium in agreements:
+        try:
+            emu.invoke('agreement', [key, customer, insurer, location, (first_day + day) * SECONDS_PER_DAY, 0,
+                                     amount, premium, 'dapp_name', premium // 10], [owner])
+        except ExecutionFault:
+            pass
+
+    return emu
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Snapshot and restore the storage of the contract')
+    commands = parser.add_subparsers(dest='command')
+
+    command = commands.add_parser('build', help='make the agreements of a workload and snapshot the storage')
+    command.add_argument('snapshot', help='file to write the snapshot to')
+    command.add_argument('--contract', default=DEFAULT_CONTRACT, help='contract to run')
+    command.add_argument('--agreements', type=int, default=1000, help='number of agreements')
+    command.add_argument('--customers', type=int, default=100, help='number of customers')
+    command.add_argument('--locations', type=int, default=10, help='number of locations')
+    command.add_argument('--days', type=int, default=14, help='number of event days')
+    command.add_argument('--seed', type=int, default=0, help='seed of the workload')
+
+    command = commands.add_parser('info', help='restore a snapshot and describe it')
+    command.add_argument('snapshot', help='snapshot file')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        emu = build(Workload(args.agreements, args.customers, args.locations, args.days, seed=args.seed),
+                    args.contract)
+        built = time.perf_counter() - start
+
+        start = time.perf_counter()
+        size = save(args.snapshot, emu.storage, emu.clock)
+        print('Built {} keys in {:.3f}s, wrote {} bytes in {:.3f}s'.format(
+            len(emu.storage), built, size, time.perf_counter() - start))
+        return 0
+
+    if args.command == 'info':
+        start = time.perf_counter()
+        storage = MappedStorage(args.snapshot)
+        restored = time.perf_counter() - start
+
+        print('{} keys, {} bytes, block {} at {}, restored in {:.6f}s'.format(
+            len(storage), len(storage.map), storage.height, storage.clock().time, restored))
+        return 0
+
+    parser.print_help()
+    return 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
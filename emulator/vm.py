@@ -0,0 +1,205 @@
+"""
+Value semantics of the NEO virtual machine
+
+On the AVM an integer and a byte array are the same stack item seen two
+ways: integers are stored as little endian two's complement byte arrays, and
+arithmetic or comparisons on a byte array interpret it as an integer. The
+helpers in this module give python values the same behaviour, so that a
+contract executed as plain python sees what it would see on chain.
+"""
+from collections import namedtuple
+
+# Values of boa.blockchain.vm.Neo.TriggerType
+VERIFICATION = 0x00
+APPLICATION = 0x10
+
+
+def int_to_bytes(value):
+    """
+    Encode an integer like the AVM does: minimal little endian two's
+    complement, with 0 encoded as an empty byte array
+
+    :rtype: bytes
+    """
+
+    if value == 0:
+        return b''
+
+    if value > 0:
+        length = (value.bit_length() + 8) // 8
+    else:
+        length = ((-value - 1).bit_length() + 8) // 8
+
+    return value.to_bytes(length, 'little', signed=True)
+
+
+def bytes_to_int(data):
+    """
+    Decode a byte array into an integer like the AVM does
+
+    :rtype: int
+    """
+
+    if not data:
+        return 0
+
+    return int.from_bytes(data, 'little', signed=True)
+
+
+def to_int(value):
+    """
+    Interpret any stack value as an integer
+    """
+
+    if type(value) is int:
+        return value
+
+    if isinstance(value, bool):
+        return int(value)
+
+    if isinstance(value, str):
+        value = value.encode()
+
+    return bytes_to_int(value)
+
+
+def to_bytes(value):
+    """
+    Interpret any stack value as a byte array
+    """
+
+    value_type = type(value)
+
+    if value_type is bytes or value_type is ByteArray:
+        return value
+
+    if value_type is int:
+        return int_to_bytes(value)
+
+    if value_type is str:
+        return value.encode()
+
+    if value_type is bool:
+        return b'\x01' if value else b''
+
+    if isinstance(value, bytes):
+        return bytes(value)
+
+    return int_to_bytes(value)
+
+
+class ByteArray(bytes):
+    """
+    A byte array that compares and computes as the integer it encodes, like
+    an AVM byte array stack item. Equality compares the bytes, as the EQUAL
+    opcode does.
+    """
+
+    __slots__ = ()
+
+    def __int__(self):
+        return bytes_to_int(self)
+
+    __index__ = __int__
+
+    def __bool__(self):
+        return any(self)
+
+    def __eq__(self, other):
+        return bytes(self) == to_bytes(other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = bytes.__hash__
+
+    def __lt__(self, other):
+        return bytes_to_int(self) < to_int(other)
+
+    def __le__(self, other):
+        return bytes_to_int(self) <= to_int(other)
+
+    def __gt__(self, other):
+        return bytes_to_int(self) > to_int(other)
+
+    def __ge__(self, other):
+        return bytes_to_int(self) >= to_int(other)
+
+    def __add__(self, other):
+        return bytes_to_int(self) + to_int(other)
+
+    def __radd__(self, other):
+        return to_int(other) + bytes_to_int(self)
+
+    def __sub__(self, other):
+        return bytes_to_int(self) - to_int(other)
+
+    def __rsub__(self, other):
+        return to_int(other) - bytes_to_int(self)
+
+    def __mul__(self, other):
+        return bytes_to_int(self) * to_int(other)
+
+    def __rmul__(self, other):
+        return to_int(other) * bytes_to_int(self)
+
+    def __floordiv__(self, other):
+        return bytes_to_int(self) // to_int(other)
+
+    def __rfloordiv__(self, other):
+        return to_int(other) // bytes_to_int(self)
+
+    def __mod__(self, other):
+        return bytes_to_int(self) % to_int(other)
+
+    def __rmod__(self, other):
+        return to_int(other) % bytes_to_int(self)
+
+    def __neg__(self):
+        return -bytes_to_int(self)
+
+
+EMPTY = ByteArray(b'')
+
+Header = namedtuple('Header', ['Index', 'Timestamp'])
+
+
+def _var_size(length):
+    if length < 0xfd:
+        return 1
+    if length <= 0xffff:
+        return 3
+    if length <= 0xffffffff:
+        return 5
+    return 9
+
+
+def serialized_size(value):
+    """
+    Number of bytes value takes in storage, using the layout of the
+    Runtime.Serialize format for arrays: a type byte followed by a var-int
+    count or length and the items or bytes
+
+    :rtype: int
+    """
+
+    if isinstance(value, (list, tuple)):
+        return 1 + _var_size(len(value)) + sum(serialized_size(item) for item in value)
+
+    length = len(to_bytes(value))
+
+    return 1 + _var_size(length) + length
+
+
+def storage_size(value):
+    """
+    Number of bytes a stored value occupies: arrays are serialized, byte
+    arrays and integers are stored as is
+
+    :rtype: int
+    """
+
+    if isinstance(value, (list, tuple)):
+        return serialized_size(value)
+
+    return len(to_bytes(value))
@@ -0,0 +1,130 @@
+"""
+Content addressed build cache for compiled contracts
+
+A manifest next to the .avm files records, for each contract, the sha256 of
+its source, the compiler version that built it and the sha256 of the .avm
+that was written. A contract is up to date when all three still match, so
+unchanged contracts can be skipped without invoking the compiler.
+"""
+import hashlib
+import json
+import os
+
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+
+
+def compiler_version():
+    """
+    Version of the installed neo-boa compiler
+
+    :return: the version string, or 'unknown' if it cannot be determined
+    :rtype: str
+    """
+
+    try:
+        import pkg_resources
+        return pkg_resources.get_distribution('neo-boa').version
+    except Exception:
+        pass
+
+    try:
+        import boa
+        return getattr(boa, '__version__', 'unknown')
+    except ImportError:
+        return 'unknown'
+
+
+def file_hash(path):
+    """
+    :return: hex sha256 of the file at path
+    :rtype: str
+    """
+
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class BuildCache(object):
+    """
+    Manifest of the contracts compiled into an output directory
+
+    :param output_dir: directory with the .avm files and the manifest
+    :type output_dir: str
+
+    :param version: compiler version the entries must have been built with
+    :type version: str
+    """
+
+    def __init__(self, output_dir, version):
+        self.output_dir = output_dir
+        self.version = version
+        self.path = os.path.join(output_dir, MANIFEST_FILE)
+        self.contracts = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                manifest = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+
+        if manifest.get('manifest_version') != MANIFEST_VERSION:
+            return
+
+        self.contracts = manifest.get('contracts', {})
+
+    def save(self):
+        manifest = {
+            'manifest_version': MANIFEST_VERSION,
+            'contracts': self.contracts,
+        }
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def is_current(self, file, source_hash, output_file_path):
+        """
+        Check whether the .avm of a contract was built from this source by
+        this compiler version and has not been modified since
+
+        :rtype: bool
+        """
+
+        entry = self.contracts.get(file)
+
+        if entry is None:
+            return False
+
+        if entry.get('source_sha256') != source_hash or entry.get('compiler_version') != self.version:
+            return False
+
+        if not os.path.isfile(output_file_path):
+            return False
+
+        return file_hash(output_file_path) == entry.get('avm_sha256')
+
+    def record(self, file, source_hash, output_file_path):
+        self.contracts[file] = {
+            'source_sha256': source_hash,
+            'compiler_version': self.version,
+            'avm': os.path.basename(output_file_path),
+            'avm_sha256': file_hash(output_file_path),
+        }
+
+    def prune(self, files):
+        """
+        Drop entries of contracts that are no longer in the input directory
+        """
+
+        for file in list(self.contracts):
+            if file not in files:
+                del self.contracts[file]
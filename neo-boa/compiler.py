@@ -1,15 +1,291 @@
-
+import argparse
+import inspect
+import json
 import os
+import shutil
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 from boa.compiler import Compiler
 
+from build_cache import BuildCache, compiler_version, file_hash
+import optimizer
+import profiles
+import watcher
+
 input_file_dir = '/python-contracts'
 output_file_dir = '/compiled-contracts'
 
-for file in os.listdir(input_file_dir):
-    if file.endswith('.py'):
-        file_name = file.replace('.py','')
-        input_file_path = os.path.join(input_file_dir, file)
-        output_file = file_name + '.avm'
-        output_file_path = os.path.join(output_file_dir, output_file)
-        Compiler.load_and_save(path=input_file_path, output_path=output_file_path)
-        print('Compiled ' + file)
\ No newline at end of file
+# Versions of neo-boa that can write a .debug.json map of the script offsets
+# to the source lines, which emulator.avm uses for its hot spot report
+DEBUG_MAP = 'generate_debug_json' in inspect.signature(Compiler.load_and_save).parameters
+
+
+def find_contracts(input_dir, output_dir):
+    """
+    List the contracts in a directory together with their output paths
+
+    :param input_dir: directory with the .py contracts
+    :type input_dir: str
+
+    :param output_dir: directory to write the .avm files to
+    :type output_dir: str
+
+    :return: (file, input path, output path) tuples sorted by file name
+    :rtype: list
+    """
+
+    contracts = []
+
+    for file in sorted(os.listdir(input_dir)):
+        if file.endswith('.py'):
+            file_name = file.replace('.py', '')
+            input_file_path = os.path.join(input_dir, file)
+            output_file = file_name + '.avm'
+            output_file_path = os.path.join(output_dir, output_file)
+            contracts.append((file, input_file_path, output_file_path))
+
+    return contracts
+
+
+def compile_contract(file, input_file_path, output_file_path, profile=profiles.DEBUG):
+    """
+    Compile a single contract, catching any failure so that it does not
+    abort the other contracts in the same run
+
+    :param profile: build profile, release replaces the Log and Notify
+        messages with codes and writes their table next to the .avm
+    :type profile: str
+
+    :return: (file, seconds spent, error message or None)
+    :rtype: tuple
+    """
+
+    start = time.perf_counter()
+    build_dir = None
+
+    try:
+        if profile == profiles.RELEASE:
+            with open(input_file_path) as f:
+                source, codes = profiles.release_source(f.read())
+
+            # Same file name, so the names in the output and debug map match
+            build_dir = tempfile.mkdtemp()
+            input_file_path = os.path.join(build_dir, file)
+            with open(input_file_path, 'w') as f:
+                f.write(source)
+
+            profiles.write_error_table(os.path.splitext(output_file_path)[0] + '.errors.json', file, codes)
+
+        if DEBUG_MAP:
+            Compiler.load_and_save(path=input_file_path, output_path=output_file_path, generate_debug_json=True)
+        else:
+            Compiler.load_and_save(path=input_file_path, output_path=output_file_path)
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        if build_dir is not None:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+    return file, time.perf_counter() - start, error
+
+
+def compile_all(contracts, workers, profile=profiles.DEBUG):
+    """
+    Compile contracts, using a process pool when more than one worker is set
+
+    :param contracts: tuples as returned by find_contracts
+    :type contracts: list
+
+    :param workers: number of worker processes
+    :type workers: int
+
+    :param profile: build profile
+    :type profile: str
+
+    :return: results of compile_contract in completion order
+    :rtype: list
+    """
+
+    results = []
+
+    if workers <= 1 or len(contracts) <= 1:
+        for contract in contracts:
+            result = compile_contract(*contract, profile=profile)
+            report(result)
+            results.append(result)
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(compile_contract, *contract, profile=profile) for contract in contracts]
+        for future in as_completed(futures):
+            result = future.result()
+            report(result)
+            results.append(result)
+
+    return results
+
+
+def optimize_contract(file, output_file_path):
+    """
+    Rewrite a compiled contract with the peephole optimizer, together with
+    its debug map when there is one
+
+    :return: the size and opcode report
+    :rtype: str
+    """
+
+    debug_path = os.path.splitext(output_file_path)[0] + '.debug.json'
+    debug = None
+
+    if os.path.exists(debug_path):
+        with open(debug_path) as f:
+            debug = json.load(f)
+
+    with open(output_file_path, 'rb') as f:
+        script = f.read()
+
+    try:
+        optimized, moved = optimizer.optimize(script)
+    except optimizer.OptimizerError as e:
+        return 'Not optimizing {}: {}'.format(file, e)
+
+    with open(output_file_path, 'wb') as f:
+        f.write(optimized)
+
+    if debug is not None:
+        with open(debug_path, 'w') as f:
+            json.dump(optimizer.remap_debug_map(debug, moved), f, indent=2)
+
+    return optimizer.report(file, script, optimized, moved, debug)
+
+
+def report(result):
+    file, elapsed, error = result
+
+    if error is None:
+        print('Compiled ' + file + ' in {:.2f}s'.format(elapsed))
+    else:
+        print('Failed to compile ' + file + ' after {:.2f}s'.format(elapsed))
+        print(error)
+
+
+def print_summary(results, wall_time, workers, skipped=0):
+    failed = [r for r in results if r[2] is not None]
+
+    print('')
+    print('{:<40} {:>10} {:>8}'.format('contract', 'seconds', 'status'))
+    for file, elapsed, error in sorted(results, key=lambda r: r[1], reverse=True):
+        status = 'ok' if error is None else 'FAILED'
+        print('{:<40} {:>10.2f} {:>8}'.format(file, elapsed, status))
+
+    cpu_time = sum(r[1] for r in results)
+    print('')
+    print('{} contracts compiled, {} failed, {} up to date, {} workers'.format(
+        len(results), len(failed), skipped, workers))
+    print('wall time {:.2f}s, summed compile time {:.2f}s'.format(wall_time, cpu_time))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Compile all python contracts in a directory to .avm files')
+    parser.add_argument('--input-dir', default=input_file_dir, help='directory with the .py contracts')
+    parser.add_argument('--output-dir', default=output_file_dir, help='directory to write the .avm files to')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='number of contracts to compile concurrently (default: number of cores)')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='recompile all contracts, even those whose .avm is up to date')
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help='keep running and recompile contracts when they change')
+    parser.add_argument('--debounce', type=float, default=0.2,
+                        help='seconds to wait for more changes before recompiling in watch mode')
+    parser.add_argument('--poll', action='store_true',
+                        help='poll for changes in watch mode instead of using inotify')
+    parser.add_argument('--profile', choices=profiles.PROFILES, default=profiles.DEBUG,
+                        help='debug keeps the Log and Notify messages, release replaces them with error codes')
+    parser.add_argument('-O', '--optimize', action='store_true',
+                        help='run the peephole optimizer on the compiled contracts and report their sizes')
+    return parser.parse_args(argv)
+
+
+def build(contracts, cache, workers, force=False, optimize=False, profile=profiles.DEBUG):
+    """
+    Compile the contracts that are not up to date and update the manifest
+
+    :return: results of compile_contract and the number of skipped contracts
+    :rtype: tuple
+    """
+
+    by_file = dict((contract[0], contract) for contract in contracts)
+    source_hashes = dict((file, file_hash(contract[1])) for file, contract in by_file.items())
+
+    if force:
+        stale = contracts
+    else:
+        stale = [c for c in contracts if not cache.is_current(c[0], source_hashes[c[0]], c[2])]
+
+    skipped = len(contracts) - len(stale)
+    if skipped:
+        print('{} contracts up to date'.format(skipped))
+
+    results = compile_all(stale, workers, profile)
+
+    for file, elapsed, error in results:
+        if error is None:
+            if optimize:
+                print(optimize_contract(file, by_file[file][2]))
+            cache.record(file, source_hashes[file], by_file[file][2])
+
+    cache.save()
+
+    return results, skipped
+
+
+def watch(args, cache):
+    """
+    Recompile changed contracts in this process, where the compiler is
+    already loaded, until interrupted
+    """
+
+    def on_change(files):
+        contracts = [c for c in find_contracts(args.input_dir, args.output_dir) if c[0] in files]
+        build(contracts, cache, 1, optimize=args.optimize, profile=args.profile)
+
+    print('Watching ' + args.input_dir + ' for changes')
+    watcher.watch(args.input_dir, on_change, debounce=args.debounce, polling=args.poll)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    start = time.perf_counter()
+
+    contracts = find_contracts(args.input_dir, args.output_dir)
+
+    # Builds of the same source with other options differ
+    version = compiler_version() + ('+optimized' if args.optimize else '')
+    if args.profile != profiles.DEBUG:
+        version += '+' + args.profile
+    cache = BuildCache(args.output_dir, version)
+    cache.prune(set(contract[0] for contract in contracts))
+
+    results, skipped = build(contracts, cache, args.workers, args.force, args.optimize, args.profile)
+
+    wall_time = time.perf_counter() - start
+
+    print_summary(results, wall_time, args.workers, skipped)
+
+    if args.watch:
+        watch(args, cache)
+        return 0
+
+    if any(r[2] is not None for r in results):
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
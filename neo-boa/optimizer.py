@@ -0,0 +1,586 @@
+"""
+Peephole optimizer for compiled .avm scripts
+
+The script is decoded into instructions whose jumps refer to instructions
+instead of byte offsets, rewritten by a few passes that keep its behaviour
+and laid out again with new jump offsets:
+
+- unreachable instructions are dropped
+- jumps to jumps go to the final target and jumps to the next instruction
+  are dropped, as are NOPs
+- a push followed by DROP is dropped
+- integer arithmetic on pushed constants is folded into one push, of a
+  byte array the VM reads as the same integer
+- identical instruction sequences that end the flow of control, such as the
+  many Log and return False failure paths, are kept once and the other
+  copies jump to it
+
+Instructions that are jump targets are never folded away from under a
+jump, and the result is verified: every jump must land on an instruction.
+The NEO 2 virtual machine has no constant pool, every string is pushed
+inline, so identical strings are shared through the tail merging above.
+"""
+from collections import Counter, OrderedDict
+
+PUSH0 = 0x00
+PUSHDATA1 = 0x4c
+PUSHDATA2 = 0x4d
+PUSHDATA4 = 0x4e
+PUSHM1 = 0x4f
+PUSH1 = 0x51
+PUSH16 = 0x60
+NOP = 0x61
+JMP = 0x62
+JMPIF = 0x63
+JMPIFNOT = 0x64
+CALL = 0x65
+RET = 0x66
+APPCALL = 0x67
+SYSCALL = 0x68
+TAILCALL = 0x69
+DROP = 0x75
+NEGATE = 0x8f
+ADD = 0x93
+SUB = 0x94
+MUL = 0x95
+THROW = 0xf0
+
+JUMPS = frozenset((JMP, JMPIF, JMPIFNOT, CALL))
+
+# Instructions after which execution does not fall through
+TERMINATORS = frozenset((JMP, RET, TAILCALL, THROW))
+
+FOLDABLE = {
+    ADD: lambda a, b: a + b,
+    SUB: lambda a, b: a - b,
+    MUL: lambda a, b: a * b,
+}
+
+NAMES = {
+    0x61: 'NOP', 0x62: 'JMP', 0x63: 'JMPIF', 0x64: 'JMPIFNOT', 0x65: 'CALL', 0x66: 'RET', 0x67: 'APPCALL',
+    0x68: 'SYSCALL', 0x69: 'TAILCALL', 0x6a: 'DUPFROMALTSTACK', 0x6b: 'TOALTSTACK', 0x6c: 'FROMALTSTACK',
+    0x6d: 'XDROP', 0x72: 'XSWAP', 0x73: 'XTUCK', 0x74: 'DEPTH', 0x75: 'DROP', 0x76: 'DUP', 0x77: 'NIP',
+    0x78: 'OVER', 0x79: 'PICK', 0x7a: 'ROLL', 0x7b: 'ROT', 0x7c: 'SWAP', 0x7d: 'TUCK', 0x7e: 'CAT',
+    0x7f: 'SUBSTR', 0x80: 'LEFT', 0x81: 'RIGHT', 0x82: 'SIZE', 0x83: 'INVERT', 0x84: 'AND', 0x85: 'OR',
+    0x86: 'XOR', 0x87: 'EQUAL', 0x8b: 'INC', 0x8c: 'DEC', 0x8d: 'SIGN', 0x8f: 'NEGATE', 0x90: 'ABS', 0x91: 'NOT',
+    0x92: 'NZ', 0x93: 'ADD', 0x94: 'SUB', 0x95: 'MUL', 0x96: 'DIV', 0x97: 'MOD', 0x98: 'SHL', 0x99: 'SHR',
+    0x9a: 'BOOLAND', 0x9b: 'BOOLOR', 0x9c: 'NUMEQUAL', 0x9e: 'NUMNOTEQUAL', 0x9f: 'LT', 0xa0: 'GT', 0xa1: 'LTE',
+    0xa2: 'GTE', 0xa3: 'MIN', 0xa4: 'MAX', 0xa5: 'WITHIN', 0xa7: 'SHA1', 0xa8: 'SHA256', 0xa9: 'HASH160',
+    0xaa: 'HASH256', 0xac: 'CHECKSIG', 0xad: 'VERIFY', 0xae: 'CHECKMULTISIG', 0xc0: 'ARRAYSIZE', 0xc1: 'PACK',
+    0xc2: 'UNPACK', 0xc3: 'PICKITEM', 0xc4: 'SETITEM', 0xc5: 'NEWARRAY', 0xc6: 'NEWSTRUCT', 0xc7: 'NEWMAP',
+    0xc8: 'APPEND', 0xc9: 'REVERSE', 0xca: 'REMOVE', 0xcb: 'HASKEY', 0xcc: 'KEYS', 0xcd: 'VALUES', 0xf0: 'THROW',
+    0xf1: 'THROWIFNOT',
+}
+
+
+class OptimizerError(Exception):
+    pass
+
+
+class Instruction(object):
+    """
+    One decoded instruction
+
+    :param opcode: the opcode
+    :type opcode: int
+
+    :param operand: bytes after the opcode, without the offset of a jump
+    :type operand: bytes
+
+    :param offset: offset in the original script, None for new ones
+    :type offset: int
+    """
+
+    __slots__ = ('opcode', 'operand', 'target', 'offset')
+
+    def __init__(self, opcode, operand=b'', target=None, offset=None):
+        self.opcode = opcode
+        self.operand = operand
+        self.target = target
+        self.offset = offset
+
+    @property
+    def size(self):
+        if self.opcode in JUMPS:
+            return 3
+        return 1 + len(self.operand)
+
+    @property
+    def name(self):
+        if PUSH0 < self.opcode < PUSHDATA1:
+            return 'PUSHBYTES{}'.format(self.opcode)
+        if PUSH1 <= self.opcode <= PUSH16:
+            return 'PUSH{}'.format(self.opcode - PUSH1 + 1)
+        return {PUSH0: 'PUSH0', PUSHDATA1: 'PUSHDATA1', PUSHDATA2: 'PUSHDATA2', PUSHDATA4: 'PUSHDATA4',
+                PUSHM1: 'PUSHM1'}.get(self.opcode) or NAMES.get(self.opcode, '{:02x}'.format(self.opcode))
+
+    def key(self, index):
+        """
+        Identity of the instruction for tail merging, jumps compare by the
+        index of their target
+        """
+
+        return self.opcode, self.operand, index.get(id(self.target)) if self.target is not None else None
+
+
+def is_push(instruction):
+    return instruction.opcode <= PUSH16 and instruction.opcode != 0x50
+
+
+def push_value(instruction):
+    """
+    Integer pushed by an instruction, or None if it is not a small integer
+    push the optimizer can fold
+    """
+
+    opcode = instruction.opcode
+
+    if opcode == PUSHM1:
+        return -1
+    if PUSH1 <= opcode <= PUSH16:
+        return opcode - PUSH1 + 1
+    if opcode == PUSH0:
+        return 0
+    if PUSH0 < opcode <= 4:
+        return int.from_bytes(instruction.operand, 'little', signed=True)
+
+    return None
+
+
+def int_to_bytes(value):
+    if value == 0:
+        return b''
+
+    if value > 0:
+        length = (value.bit_length() + 8) // 8
+    else:
+        length = ((-value - 1).bit_length() + 8) // 8
+
+    return value.to_bytes(length, 'little', signed=True)
+
+
+def push_instruction(value):
+    if value == 0:
+        return Instruction(PUSH0)
+    if value == -1:
+        return Instruction(PUSHM1)
+    if 1 <= value <= 16:
+        return Instruction(PUSH1 + value - 1)
+
+    data = int_to_bytes(value)
+    return Instruction(len(data), data)
+
+
+def decode(script):
+    """
+    :return: the instructions of a script, jumps resolved to instructions
+    :rtype: list
+    """
+
+    instructions = []
+    by_offset = {}
+    offsets = {}
+    ip = 0
+
+    while ip < len(script):
+        opcode = script[ip]
+        start = ip
+        ip += 1
+
+        if PUSH0 < opcode < PUSHDATA1:
+            length = opcode
+        elif PUSHDATA1 <= opcode <= PUSHDATA4:
+            size = {PUSHDATA1: 1, PUSHDATA2: 2, PUSHDATA4: 4}[opcode]
+            length = size + int.from_bytes(script[ip:ip + size], 'little')
+        elif opcode in JUMPS:
+            length = 0
+            offsets[start] = int.from_bytes(script[ip:ip + 2], 'little', signed=True)
+            ip += 2
+        elif opcode == APPCALL or opcode == TAILCALL:
+            length = 20
+        elif opcode == SYSCALL:
+            length = 1 + script[ip] if ip < len(script) else 1
+        else:
+            length = 0
+
+        operand = script[ip:ip + length]
+        ip += length
+        if ip > len(script):
+            raise OptimizerError('truncated instruction at {:04x}'.format(start))
+
+        instruction = Instruction(opcode, operand, offset=start)
+        instructions.append(instruction)
+        by_offset[start] = instruction
+
+    # Jumping to the end of the script returns, as a RET there would
+    if any(offset + relative == len(script) for offset, relative in offsets.items()):
+        by_offset[len(script)] = Instruction(RET, offset=len(script))
+        instructions.append(by_offset[len(script)])
+
+    for instruction in instructions:
+        if instruction.opcode in JUMPS:
+            target = instruction.offset + offsets[instruction.offset]
+            if target not in by_offset:
+                raise OptimizerError('jump at {:04x} to {:04x} is not an instruction'.format(instruction.offset, target))
+            instruction.target = by_offset[target]
+
+    return instructions
+
+
+def layout(instructions):
+    """
+    Assign offsets and encode the instructions
+
+    :return: the script and {id(instruction): offset}
+    :rtype: tuple
+    """
+
+    offsets = {}
+    ip = 0
+
+    for instruction in instructions:
+        offsets[id(instruction)] = ip
+        ip += instruction.size
+
+    chunks = []
+
+    for instruction in instructions:
+        chunks.append(bytes([instruction.opcode]))
+
+        if instruction.opcode in JUMPS:
+            target = offsets.get(id(instruction.target))
+            if target is None:
+                raise OptimizerError('jump to a removed instruction')
+            relative = target - offsets[id(instruction)]
+            if not -32768 <= relative <= 32767:
+                raise OptimizerError('jump offset {} does not fit'.format(relative))
+            chunks.append(relative.to_bytes(2, 'little', signed=True))
+        else:
+            chunks.append(instruction.operand)
+
+    return b''.join(chunks), offsets
+
+
+def verify(script):
+    """
+    Check that every jump of a script lands on an instruction
+
+    :raises OptimizerError: if one does not
+    """
+
+    decode(script)
+
+
+def targets(instructions):
+    return set(id(instruction.target) for instruction in instructions if instruction.target is not None)
+
+
+def retarget(instructions, old, new):
+    for instruction in instructions:
+        if instruction.target is old:
+            instruction.target = new
+
+
+# Passes, each returns whether it changed something
+
+def remove_unreachable(instructions):
+    index = dict((id(instruction), i) for i, instruction in enumerate(instructions))
+    reachable = set()
+    pending = [0] if instructions else []
+
+    while pending:
+        i = pending.pop()
+        while i < len(instructions) and i not in reachable:
+            reachable.add(i)
+            instruction = instructions[i]
+            if instruction.target is not None:
+                pending.append(index[id(instruction.target)])
+            if instruction.opcode in TERMINATORS:
+                break
+            i += 1
+
+    if len(reachable) == len(instructions):
+        return False
+
+    instructions[:] = [instruction for i, instruction in enumerate(instructions) if i in reachable]
+    return True
+
+
+def thread_jumps(instructions):
+    changed = False
+
+    for instruction in instructions:
+        seen = set()
+        while instruction.opcode in (JMP, JMPIF, JMPIFNOT) and instruction.target.opcode == JMP \
+                and id(instruction.target) not in seen:
+            seen.add(id(instruction.target))
+            instruction.target = instruction.target.target
+            changed = True
+
+    return changed
+
+
+def remove_noops(instructions):
+    """
+    Drop NOPs and jumps to the next instruction, and move jumps that land
+    on them to the instruction after
+    """
+
+    changed = False
+    i = 0
+
+    while i < len(instructions) - 1:
+        instruction = instructions[i]
+        following = instructions[i + 1]
+
+        if instruction.opcode == NOP or (instruction.opcode == JMP and instruction.target is following):
+            retarget(instructions, instruction, following)
+            del instructions[i]
+            changed = True
+        else:
+            i += 1
+
+    return changed
+
+
+def remove_push_drop(instructions):
+    changed = False
+    landing = targets(instructions)
+    i = 0
+
+    while i < len(instructions) - 2:
+        push, drop = instructions[i], instructions[i + 1]
+
+        if is_push(push) and drop.opcode == DROP and id(drop) not in landing:
+            retarget(instructions, push, instructions[i + 2])
+            del instructions[i:i + 2]
+            landing = targets(instructions)
+            changed = True
+        else:
+            i += 1
+
+    return changed
+
+
+def fold_constants(instructions):
+    changed = False
+    landing = targets(instructions)
+    i = 0
+
+    while i < len(instructions) - 1:
+        first = instructions[i]
+        value = push_value(first)
+
+        if value is None:
+            i += 1
+            continue
+
+        second = instructions[i + 1]
+
+        if second.opcode == NEGATE and id(second) not in landing:
+            folded = push_instruction(-value)
+            del instructions[i + 1]
+        elif i < len(instructions) - 2 and push_value(second) is not None \
+                and instructions[i + 2].opcode in FOLDABLE \
+                and id(second) not in landing and id(instructions[i + 2]) not in landing:
+            folded = push_instruction(FOLDABLE[instructions[i + 2].opcode](value, push_value(second)))
+            del instructions[i + 1:i + 3]
+        else:
+            i += 1
+            continue
+
+        folded.offset = first.offset
+        retarget(instructions, first, folded)
+        instructions[i] = folded
+        landing = targets(instructions)
+        changed = True
+
+    return changed
+
+
+def merge_tails(instructions):
+    """
+    Keep one copy of identical instruction sequences that end in a
+    terminator, the other copies jump to it
+    """
+
+    index = dict((id(instruction), i) for i, instruction in enumerate(instructions))
+    landing = targets(instructions)
+    keys = [instruction.key(index) for instruction in instructions]
+
+    by_key = {}
+    for i, instruction in enumerate(instructions):
+        if instruction.opcode in TERMINATORS:
+            by_key.setdefault(keys[i], []).append(i)
+
+    replacements = {}
+    used = set()
+
+    for ends in by_key.values():
+        for n, end in enumerate(ends[1:], 1):
+            best = None
+
+            for kept_end in ends[:n]:
+                length = 0
+                size = 0
+
+                # Walk back while both copies match and do not overlap, the
+                # duplicate must only be entered at its first instruction
+                while length <= kept_end:
+                    a, b = end - length, kept_end - length
+                    if a <= kept_end or keys[a] != keys[b] or a in used or b in used:
+                        break
+                    if length and (instructions[a].opcode in TERMINATORS or instructions[b].opcode in TERMINATORS):
+                        break
+                    if length and id(instructions[a + 1]) in landing:
+                        break
+                    size += instructions[a].size
+                    length += 1
+
+                if size > 3 and (best is None or size > best[2]):
+                    best = (kept_end - length + 1, length, size)
+
+            if best is not None:
+                kept_start, length, _ = best
+                start = end - length + 1
+                replacements[start] = (length, instructions[kept_start])
+                used.update(range(start, end + 1))
+                used.update(range(kept_start, kept_start + length))
+
+    if not replacements:
+        return False
+
+    result = []
+    i = 0
+
+    while i < len(instructions):
+        if i in replacements:
+            length, kept = replacements[i]
+            jump = Instruction(JMP, target=kept, offset=instructions[i].offset)
+            retarget(instructions, instructions[i], jump)
+            result.append(jump)
+            i += length
+        else:
+            result.append(instructions[i])
+            i += 1
+
+    instructions[:] = result
+    return True
+
+
+PASSES = (remove_unreachable, thread_jumps, remove_noops, remove_push_drop, fold_constants, merge_tails)
+
+
+def optimize(script, max_rounds=10):
+    """
+    :param script: the compiled script
+    :type script: bytes
+
+    :return: the optimized script and {old offset: new offset} for the
+        instructions that were kept
+    :rtype: tuple
+    :raises OptimizerError: if the script cannot be decoded or the result
+        does not verify
+    """
+
+    instructions = decode(script)
+
+    for _ in range(max_rounds):
+        changed = False
+        for optimization in PASSES:
+            changed = optimization(instructions) or changed
+        if not changed:
+            break
+
+    optimized, offsets = layout(instructions)
+    verify(optimized)
+
+    moved = dict((instruction.offset, offsets[id(instruction)]) for instruction in instructions
+                 if instruction.offset is not None)
+
+    return optimized, moved
+
+
+def remap_debug_map(debug, moved):
+    """
+    Move the offsets of a neo-boa .debug.json map to the optimized script,
+    dropping the entries whose instructions were all removed
+    """
+
+    kept = sorted(moved)
+    entries = []
+
+    for entry in debug.get('map', []):
+        offsets = [moved[offset] for offset in kept if entry['start'] <= offset <= entry['end']]
+        if offsets:
+            entry = dict(entry, start=min(offsets), end=max(offsets))
+            entries.append(entry)
+
+    return dict(debug, map=entries)
+
+
+def functions(script):
+    """
+    Split a script into functions at the targets of CALL
+
+    :return: {start offset: [instructions]} in offset order
+    :rtype: OrderedDict
+    """
+
+    instructions = decode(script)
+    starts = set([0]) | set(instruction.target.offset for instruction in instructions if instruction.opcode == CALL)
+    result = OrderedDict()
+    current = None
+
+    for instruction in instructions:
+        if instruction.offset in starts:
+            current = result.setdefault(instruction.offset, [])
+        current.append(instruction)
+
+    return result
+
+
+def report(name, before, after, moved, debug=None):
+    """
+    Size and per function opcode report of an optimized script
+
+    :param moved: {old offset: new offset} as returned by optimize
+    :type moved: dict
+
+    :param debug: the .debug.json map of the original script, for method
+        names
+    :type debug: dict
+
+    :rtype: str
+    """
+
+    names = {}
+    for entry in (debug or {}).get('map', []):
+        if entry.get('method') and entry['start'] not in names:
+            names[entry['start']] = entry['method']
+
+    def method_name(offset):
+        starts = [start for start in names if start <= offset]
+        return names[max(starts)] if starts else 'sub_{:04x}'.format(offset)
+
+    new_functions = functions(after)
+
+    lines = ['{}: {} -> {} bytes ({:+.1f}%)'.format(name, len(before), len(after),
+                                                   100.0 * (len(after) - len(before)) / max(len(before), 1)),
+             '{:<32} {:>8} {:>8} {:>8} {:>8}'.format('function', 'ops', 'ops new', 'bytes', 'bytes new')]
+
+    for start, instructions in functions(before).items():
+        optimized = new_functions.get(moved.get(start), [])
+        lines.append('{:<32} {:>8} {:>8} {:>8} {:>8}'.format(
+            method_name(start), len(instructions), len(optimized), sum(i.size for i in instructions),
+            sum(i.size for i in optimized)))
+
+    old_counts = Counter(instruction.name for instruction in decode(before))
+    new_counts = Counter(instruction.name for instruction in decode(after))
+    changes = sorted((new_counts[op] - old_counts[op], op) for op in set(old_counts) | set(new_counts)
+                     if new_counts[op] != old_counts[op])
+
+    if changes:
+        lines.append('opcodes: ' + ', '.join('{} {:+d}'.format(op, delta) for delta, op in changes))
+
+    return '\n'.join(lines)
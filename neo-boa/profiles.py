@@ -0,0 +1,114 @@
+"""
+Build profiles of the contracts
+
+The debug profile compiles a contract as it is written. The release
+profile first replaces the message of every Log and Notify call with a
+short numeric code in a string literal, so the script carries no English
+sentences and failure paths push a few bytes instead of a sentence. The
+codes and their messages are written to <name>.errors.json next to the
+.avm, where offchain.errors reads them to render the codes as messages
+again.
+
+Only the string literals are replaced, token by token, so the lines of the
+release source match the lines of the original and the debug map still
+points at the right source lines.
+"""
+import ast
+import io
+import json
+import tokenize
+from collections import OrderedDict
+
+DEBUG = 'debug'
+RELEASE = 'release'
+PROFILES = (DEBUG, RELEASE)
+
+# Calls whose string literal message is replaced by a code
+MESSAGE_CALLS = ('Log', 'Notify')
+
+
+def find_messages(source):
+    """
+    Find the string literal argument of every Log and Notify call
+
+    :param source: python source of a contract
+    :type source: str
+
+    :return: (start, end, message) tuples, start and end as (row, col)
+    :rtype: list
+    """
+
+    tokens = list(tokenize.generate_tokens(io.StringIO(source).readline))
+    tokens = [token for token in tokens if token[0] not in (tokenize.NL, tokenize.COMMENT)]
+    found = []
+
+    for i in range(len(tokens) - 3):
+        name, parenthesis, literal, closing = tokens[i:i + 4]
+
+        if name[0] == tokenize.NAME and name[1] in MESSAGE_CALLS and parenthesis[1] == '(' \
+                and literal[0] == tokenize.STRING and closing[1] == ')':
+            # Calls of a method named Log on something else are left alone
+            if i and tokens[i - 1][1] == '.':
+                continue
+            message = ast.literal_eval(literal[1])
+            if isinstance(message, str):
+                found.append((literal[2], literal[3], message))
+
+    return found
+
+
+def error_codes(messages):
+    """
+    Number the distinct messages in order of appearance, from 1
+
+    :return: {message: code}
+    :rtype: OrderedDict
+    """
+
+    codes = OrderedDict()
+
+    for _, _, message in messages:
+        if message not in codes:
+            codes[message] = len(codes) + 1
+
+    return codes
+
+
+def release_source(source):
+    """
+    Replace the messages of a contract with their codes
+
+    :return: the release source and {message: code}
+    :rtype: tuple
+    """
+
+    messages = find_messages(source)
+    codes = error_codes(messages)
+    lines = source.splitlines(True)
+
+    # Replace from the end, so earlier positions stay valid
+    for (start_row, start_col), (end_row, end_col), message in reversed(messages):
+        literal = '"{}"'.format(codes[message])
+        first = lines[start_row - 1]
+        last = lines[end_row - 1]
+        replaced = first[:start_col] + literal + last[end_col:]
+
+        # A literal spanning lines keeps its line count
+        lines[start_row - 1:end_row] = [replaced] + ['\n'] * (end_row - start_row)
+
+    return ''.join(lines), codes
+
+
+def write_error_table(path, contract, codes):
+    """
+    Write the code to message table of a release build
+    """
+
+    table = {
+        'contract': contract,
+        'profile': RELEASE,
+        'codes': OrderedDict((str(code), message) for message, code in codes.items()),
+    }
+
+    with open(path, 'w') as f:
+        json.dump(table, f, indent=2)
@@ -0,0 +1,144 @@
+"""
+Watch a directory of contracts for changes
+
+inotify is used when the optional inotify_simple package is installed,
+otherwise the directory is polled for modification times. Bursts of events,
+such as an editor writing a file in several steps, are debounced into one
+set of changed files.
+"""
+import os
+import time
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+
+class PollingWatcher(object):
+    """
+    Detect changed .py files by comparing modification times
+
+    :param directory: directory to watch
+    :type directory: str
+
+    :param interval: seconds between two scans
+    :type interval: float
+    """
+
+    def __init__(self, directory, interval=0.25):
+        self.directory = directory
+        self.interval = interval
+        self.mtimes = self.scan()
+
+    def scan(self):
+        mtimes = {}
+
+        for file in os.listdir(self.directory):
+            if file.endswith('.py'):
+                try:
+                    mtimes[file] = os.stat(os.path.join(self.directory, file)).st_mtime_ns
+                except OSError:
+                    pass
+
+        return mtimes
+
+    def read(self, timeout=None):
+        """
+        Wait until a file changes or the timeout in seconds expires
+
+        :return: names of the files that were added or modified
+        :rtype: set
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            mtimes = self.scan()
+            changed = set(file for file, mtime in mtimes.items() if self.mtimes.get(file) != mtime)
+            self.mtimes = mtimes
+
+            if changed:
+                return changed
+
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+
+            time.sleep(self.interval)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """
+    Detect changed .py files with inotify
+
+    :param directory: directory to watch
+    :type directory: str
+    """
+
+    def __init__(self, directory):
+        self.inotify = INotify()
+        self.inotify.add_watch(directory, flags.CLOSE_WRITE | flags.MOVED_TO)
+
+    def read(self, timeout=None):
+        """
+        Wait until a file changes or the timeout in seconds expires
+
+        :return: names of the files that were added or modified
+        :rtype: set
+        """
+
+        timeout_ms = None if timeout is None else int(timeout * 1000)
+        events = self.inotify.read(timeout=timeout_ms)
+
+        return set(event.name for event in events if event.name.endswith('.py'))
+
+    def close(self):
+        self.inotify.close()
+
+
+def create_watcher(directory, poll_interval=0.25, polling=False):
+    if INotify is None or polling:
+        return PollingWatcher(directory, poll_interval)
+
+    return InotifyWatcher(directory)
+
+
+def watch(directory, on_change, debounce=0.2, poll_interval=0.25, polling=False):
+    """
+    Call on_change with the set of changed files every time the contracts in
+    directory change, until interrupted
+
+    :param directory: directory to watch
+    :type directory: str
+
+    :param on_change: callback that receives a set of file names
+    :type on_change: callable
+
+    :param debounce: seconds without events after which a burst is complete
+    :type debounce: float
+    """
+
+    watcher = create_watcher(directory, poll_interval, polling)
+
+    try:
+        while True:
+            changed = watcher.read()
+
+            while True:
+                more = watcher.read(timeout=debounce)
+                if not more:
+                    break
+                changed |= more
+
+            changed = set(file for file in changed if os.path.isfile(os.path.join(directory, file)))
+            if changed:
+                on_change(changed)
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        watcher.close()
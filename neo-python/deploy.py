@@ -0,0 +1,287 @@
+"""
+Deploy compiled contracts to the private network without the prompt
+
+Syncs the chain and the wallet with the consensus nodes of the image, then
+deploys every .avm given as an argument with the metadata of its contract,
+waits until the deployments are in a block and writes the contract hashes
+to standard output as JSON. Everything else neo-python prints goes to
+standard error. A contract that is already on the chain is not deployed
+again.
+
+    python3.6 deploy.py /smartcontract/sunny_dapp.avm
+    python3.6 deploy.py --wallet /wallets/owner.wallet --wif <wif> --metadata metadata.json /smartcontract/*.avm
+    python3.6 deploy.py --sync-only
+
+The metadata file maps the name of an .avm file without its extension to
+the fields of the import contract form; missing fields take the values of
+the command line options:
+
+    {"sunny_dapp": {"name": "Sunny Dapp", "author": "...", "params": "0710", "return_type": "05", "storage": true}}
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+import urllib.request
+
+from twisted.internet import reactor, task
+
+from neo.Core.Blockchain import Blockchain
+from neo.Implementations.Blockchains.LevelDB.LevelDBBlockchain import LevelDBBlockchain
+from neo.Implementations.Wallets.peewee.UserWallet import UserWallet
+from neo.Network.NodeLeader import NodeLeader
+from neo.Prompt.Commands.Invoke import InvokeContract, test_invoke
+from neo.Prompt.Commands.LoadSmartContract import LoadContract, generate_deploy_script
+from neo.Settings import settings
+from neo.Wallets.utils import to_aes_key
+from neocore.KeyPair import KeyPair
+
+# The wallet of the private network, which holds its NEO and GAS
+PRIVNET_WALLET = '/wallets/neo-privnet.wallet'
+PRIVNET_PASSWORD = 'coz'
+
+METADATA_FIELDS = ('name', 'version', 'author', 'email', 'description', 'params', 'return_type', 'storage',
+                   'dynamic_invoke', 'payable')
+
+
+class DeployError(Exception):
+    """
+    Raised when a contract cannot be deployed
+    """
+
+
+def node_height():
+    """
+    :return: the height of the first consensus node, read over RPC
+    :rtype: int
+    """
+
+    request = urllib.request.Request(settings.RPC_LIST[0], json.dumps({
+        'jsonrpc': '2.0', 'id': 1, 'method': 'getblockcount', 'params': []}).encode(),
+        {'Content-Type': 'application/json'})
+
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read().decode())['result'] - 1
+
+
+def wait_until(condition, timeout, what):
+    deadline = time.time() + timeout
+
+    while not condition():
+        if time.time() > deadline:
+            raise DeployError('Timed out after {}s waiting for {}'.format(timeout, what))
+        time.sleep(0.5)
+
+
+def sync(wallet, timeout):
+    """
+    Wait until the chain and the wallet reached the height of the nodes
+
+    :return: the height
+    :rtype: int
+    """
+
+    target = node_height()
+    blockchain = Blockchain.Default()
+
+    wait_until(lambda: blockchain.Height >= target, timeout, 'the chain to reach block {}'.format(target))
+
+    if wallet is not None:
+        wait_until(lambda: wallet.WalletHeight > target, timeout, 'the wallet to reach block {}'.format(target))
+
+    return blockchain.Height
+
+
+def open_wallet(path, password, wif=None):
+    """
+    Open a wallet, creating it if it does not exist, and import a key
+    """
+
+    if os.path.exists(path):
+        wallet = UserWallet.Open(path, to_aes_key(password))
+    else:
+        wallet = UserWallet.Create(path, to_aes_key(password), generate_default_key=wif is None)
+
+    if wif:
+        private_key = KeyPair.PrivateKeyFromWIF(wif)
+        if not wallet.ContainsKey(KeyPair(priv_key=private_key).PublicKey):
+            wallet.CreateKey(private_key)
+
+    return wallet
+
+
+def contract_metadata(path, metadata, defaults):
+    """
+    :return: the metadata of the contract of an .avm file
+    :rtype: dict
+    """
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    fields = dict(defaults)
+    fields['name'] = fields['name'] or name
+    fields.update(metadata.get(name, {}))
+
+    unknown = set(fields) - set(METADATA_FIELDS)
+    if unknown:
+        raise DeployError('Unknown metadata of {}: {}'.format(name, ', '.join(sorted(unknown))))
+
+    return fields
+
+
+def deploy(wallet, path, fields):
+    """
+    Test the deployment of a contract and relay it
+
+    :return: the contract hash, the hash of the transaction or None if the
+        contract is already deployed, and the GAS of the deployment
+    :rtype: tuple
+    """
+
+    function_code = LoadContract(path, fields['storage'], fields['dynamic_invoke'], fields['payable'],
+                                 fields['params'], fields['return_type'])
+    contract_hash = function_code.ScriptHash()
+
+    if Blockchain.Default().GetContract(contract_hash.ToBytes()) is not None:
+        return contract_hash.To0xString(), None, 0
+
+    script = generate_deploy_script(function_code.Script, fields['name'], fields['version'], fields['author'],
+                                    fields['email'], fields['description'], function_code.ContractProperties,
+                                    function_code.ReturnTypeBigInteger, function_code.ParameterList)
+
+    tx, fee, results, num_ops, success = test_invoke(script, wallet, [])
+
+    if tx is None or not success:
+        raise DeployError('Test deployment of {} failed'.format(path))
+
+    relayed = InvokeContract(wallet, tx, fee)
+
+    if not relayed:
+        raise DeployError('Could not relay the deployment of {}'.format(path))
+
+    return contract_hash.To0xString(), relayed.Hash.ToString(), float((tx.Gas + fee).ToString())
+
+
+def confirmed(transaction):
+    _, height = Blockchain.Default().GetTransaction(transaction)
+    return height > -1
+
+
+def read_metadata(path):
+    if not path:
+        return {}
+
+    with open(path) as f:
+        return json.load(f)
+
+
+def run(args, wallet, output, outcome):
+    """
+    Sync, deploy and report, in a thread next to the reactor
+
+    :param outcome: receives the exit status as 'status'
+    :type outcome: dict
+    """
+
+    try:
+        metadata = read_metadata(args.metadata)
+
+        defaults = dict((field, getattr(args, field)) for field in METADATA_FIELDS)
+        report = {'network': 'privnet', 'height': sync(wallet, args.timeout), 'contracts': []}
+
+        for path in args.contracts:
+            fields = contract_metadata(path, metadata, defaults)
+            contract_hash, transaction, gas = deploy(wallet, path, fields)
+            report['contracts'].append({
+                'file': path,
+                'name': fields['name'],
+                'hash': contract_hash,
+                'transaction': transaction,
+                'gas': gas,
+                'deployed': transaction is not None,
+            })
+
+        for contract in report['contracts']:
+            if contract['transaction']:
+                wait_until(lambda: confirmed(contract['transaction']), args.timeout,
+                           'the deployment of {} to be confirmed'.format(contract['file']))
+
+        report['height'] = Blockchain.Default().Height
+        output.write(json.dumps(report, indent=2) + '\n')
+        output.flush()
+        outcome['status'] = 0
+    except Exception as e:
+        if not isinstance(e, DeployError):
+            traceback.print_exc()
+        output.write(json.dumps({'error': str(e)}) + '\n')
+        output.flush()
+    finally:
+        reactor.callFromThread(reactor.stop)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Deploy compiled contracts to the private network')
+    parser.add_argument('contracts', nargs='*', help='.avm files to deploy')
+    parser.add_argument('--wallet', default=PRIVNET_WALLET, help='wallet to pay for the deployments, created if '
+                                                                  'it does not exist')
+    parser.add_argument('--password', default=os.environ.get('NEO_WALLET_PASSWORD', PRIVNET_PASSWORD),
+                        help='password of the wallet, $NEO_WALLET_PASSWORD by default')
+    parser.add_argument('--wif', default=os.environ.get('NEO_WIF'), help='private key to import into the wallet, '
+                                                                          '$NEO_WIF by default')
+    parser.add_argument('--metadata', help='JSON file with the metadata of the contracts')
+    parser.add_argument('--name', default='', help='contract name, the .avm file name by default')
+    parser.add_argument('--version', default='1.0', help='contract version')
+    parser.add_argument('--author', default='', help='contract author')
+    parser.add_argument('--email', default='', help='contract email')
+    parser.add_argument('--description', default='', help='contract description')
+    parser.add_argument('--params', default='0710', help='parameter types of Main, as for import contract')
+    parser.add_argument('--return-type', default='05', help='return type of Main, as for import contract')
+    parser.add_argument('--no-storage', dest='storage', action='store_false', help='the contract uses no storage')
+    parser.add_argument('--dynamic-invoke', action='store_true', help='the contract invokes contracts dynamically')
+    parser.add_argument('--payable', action='store_true', help='the contract accepts assets')
+    parser.add_argument('--host', help='host of the consensus nodes, this container by default')
+    parser.add_argument('--timeout', type=int, default=300, help='seconds to wait for syncing and confirmation')
+    parser.add_argument('--sync-only', action='store_true', help='only sync the chain and the wallet')
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # neo-python prints its progress to standard output, which is kept for
+    # the report
+    output = sys.stdout
+    sys.stdout = sys.stderr
+
+    settings.setup_privnet(args.host)
+
+    blockchain = LevelDBBlockchain(settings.chain_leveldb_path)
+    Blockchain.RegisterBlockchain(blockchain)
+
+    wallet = open_wallet(args.wallet, args.password, args.wif) if args.wallet else None
+
+    task.LoopingCall(blockchain.PersistBlocks).start(.1)
+    if wallet is not None:
+        task.LoopingCall(wallet.ProcessBlocks).start(.5)
+
+    if args.sync_only:
+        args.contracts = []
+
+    outcome = {'status': 1}
+    reactor.callWhenRunning(threading.Thread(target=run, args=(args, wallet, output, outcome), daemon=True).start)
+    NodeLeader.Instance().Start()
+    reactor.run()
+
+    if wallet is not None:
+        wallet.Close()
+    Blockchain.Default().Dispose()
+    NodeLeader.Instance().Shutdown()
+
+    return outcome['status']
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
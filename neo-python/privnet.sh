@@ -0,0 +1,42 @@
+#!/bin/bash
+# Start the consensus nodes of the private network, wait until they answer
+# RPC and run the given command against them. The nodes are stopped cleanly
+# when the command exits, so their chain can be baked into the image.
+
+PRIVNET_START=${PRIVNET_START:-/opt/run.sh}
+PRIVNET_RPC=${PRIVNET_RPC:-http://127.0.0.1:30333}
+
+stop_nodes() {
+    pkill -INT -f neo-cli.dll
+    for i in $(seq 1 30); do
+        pgrep -f neo-cli.dll > /dev/null || return 0
+        sleep 1
+    done
+    pkill -KILL -f neo-cli.dll
+}
+
+trap stop_nodes EXIT
+
+"$PRIVNET_START" > /var/log/privnet.log 2>&1 &
+
+python3.6 - "$PRIVNET_RPC" <<'PYTHON' >&2 || exit 1
+import json, sys, time, urllib.request
+
+request = json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': 'getblockcount', 'params': []}).encode()
+
+for _ in range(120):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(sys.argv[1], request), timeout=2) as response:
+            print('Private network at block', json.loads(response.read().decode())['result'] - 1)
+            sys.exit(0)
+    except OSError:
+        time.sleep(1)
+
+print('The consensus nodes did not start, see /var/log/privnet.log')
+sys.exit(1)
+PYTHON
+
+# neo-cli draws a new nonce at every start, the chain is still the baked one
+rm -f ~/.neopython/Chains/privnet/.privnet-nonce
+
+"$@"
@@ -0,0 +1,109 @@
+"""
+Packing of invocations for the binary ABI of the contract
+
+Next to the operation names, Main accepts a one byte opcode as operation
+and a single packed byte array as argument for the frequent operations.
+The layouts match DispatchOpcode in sunny_dapp.py: integers are little
+endian two's complement of a fixed width, and the variable length field is
+last.
+"""
+from .merkle import pack_int
+
+ADDRESS_WIDTH = 20
+TIMESTAMP_WIDTH = 5
+UTC_OFFSET_WIDTH = 1
+VALUE_WIDTH = 8
+WEATHER_PARAM_WIDTH = 2
+
+OPCODES = {
+    'agreement': 1,
+    'resultNotice': 2,
+    'claim': 3,
+    'refundAll': 4,
+    'deleteAgreement': 5,
+    'transfer': 6,
+    'balance': 7,
+}
+
+
+def to_bytes(value):
+    if isinstance(value, str):
+        return value.encode()
+
+    return bytes(value)
+
+
+def pack_agreement(agreement_key, customer, insurer, location, timestamp, utc_offset, amount, premium,
+                   dapp_name=None, fee=0):
+    """
+    Pack the arguments of the agreement operation, in the order of the
+    string ABI. dapp_name is not part of the packed arguments.
+
+    :rtype: bytes
+    """
+
+    agreement_key = to_bytes(agreement_key)
+
+    if len(agreement_key) > 127:
+        raise ValueError('agreement_key must be at most 127 bytes')
+
+    return b''.join((
+        to_bytes(customer),
+        to_bytes(insurer),
+        pack_int(timestamp, TIMESTAMP_WIDTH),
+        pack_int(utc_offset, UTC_OFFSET_WIDTH),
+        pack_int(amount, VALUE_WIDTH),
+        pack_int(premium, VALUE_WIDTH),
+        pack_int(fee, VALUE_WIDTH),
+        pack_int(len(agreement_key), 1),
+        agreement_key,
+        to_bytes(location),
+    ))
+
+
+def pack_result_notice(agreement_key, weather_param, oracle_cost):
+    return pack_int(weather_param, WEATHER_PARAM_WIDTH) + pack_int(oracle_cost, VALUE_WIDTH) + to_bytes(agreement_key)
+
+
+def pack_key(agreement_key):
+    return to_bytes(agreement_key)
+
+
+def pack_transfer(sender, receiver, amount):
+    length = (amount.bit_length() + 8) // 8 if amount > 0 else 1
+    return to_bytes(sender) + to_bytes(receiver) + pack_int(amount, length)
+
+
+def pack_address(address):
+    return to_bytes(address)
+
+
+PACKERS = {
+    'agreement': pack_agreement,
+    'resultNotice': pack_result_notice,
+    'claim': pack_key,
+    'refundAll': pack_key,
+    'deleteAgreement': pack_key,
+    'transfer': pack_transfer,
+    'balance': pack_address,
+}
+
+
+def encode(operation, args):
+    """
+    Translate an invocation of the string ABI into the binary ABI
+
+    :param operation: the name of the operation
+    :type operation: str
+
+    :param args: the arguments of the operation
+    :type args: list
+
+    :return: the opcode and the argument list for Main
+    :rtype: tuple
+    """
+
+    if operation not in OPCODES:
+        raise ValueError('{} has no opcode'.format(operation))
+
+    return bytes([OPCODES[operation]]), [PACKERS[operation](*args)]
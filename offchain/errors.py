@@ -0,0 +1,96 @@
+"""
+Render the error codes of a release build as messages
+
+A release build of a contract logs and notifies short numeric codes
+instead of English sentences, and the compiler writes the messages of the
+codes to <name>.errors.json next to the .avm. ErrorTable reads that file
+and turns codes back into messages; anything that is not a known code is
+returned as it is, so debug builds render unchanged.
+
+    python -m offchain.errors compiled/sunny_dapp.errors.json 3 17
+    neo-python-log | python -m offchain.errors compiled/sunny_dapp.errors.json
+"""
+import argparse
+import json
+import re
+import sys
+
+# A code stands alone as the message, as logged by Runtime.Log
+CODE = re.compile(r'^\d+$')
+
+# Codes inside a line of output, such as a log line of a node
+QUOTED_CODE = re.compile(r'''(?P<quote>['"])(?P<code>\d+)(?P=quote)''')
+
+
+class ErrorTable(object):
+    """
+    Code to message table of one contract
+
+    :param codes: {code: message}
+    :type codes: dict
+    """
+
+    def __init__(self, codes, contract=None):
+        self.codes = dict((str(code), message) for code, message in codes.items())
+        self.contract = contract
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            table = json.load(f)
+
+        return cls(table.get('codes', {}), table.get('contract'))
+
+    def decode(self, message):
+        """
+        :param message: a logged or notified message, as str or bytes
+        :type message: str or bytes
+
+        :return: the message of the code, or the message itself if it is
+            not a code of this table
+        :rtype: str
+        """
+
+        if isinstance(message, bytes):
+            message = message.decode('utf-8', 'replace')
+
+        if CODE.match(message):
+            return self.codes.get(message, message)
+
+        return message
+
+    def decode_line(self, line):
+        """
+        Replace the quoted codes in a line of output by their messages
+        """
+
+        def replace(match):
+            message = self.codes.get(match.group('code'))
+            if message is None:
+                return match.group(0)
+            return match.group('quote') + message + match.group('quote')
+
+        return QUOTED_CODE.sub(replace, line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render the error codes of a release build as messages')
+    parser.add_argument('table', help='<name>.errors.json written by the compiler')
+    parser.add_argument('codes', nargs='*', help='codes to render, lines of standard input if none')
+    args = parser.parse_args(argv)
+
+    table = ErrorTable.load(args.table)
+
+    if args.codes:
+        for code in args.codes:
+            print('{}: {}'.format(code, table.decode(code)))
+        return 0
+
+    for line in sys.stdin:
+        sys.stdout.write(table.decode_line(line))
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
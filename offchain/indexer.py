@@ -0,0 +1,455 @@
+"""
+Index the events of the contract into SQLite
+
+Events are read from a neo-python node through its REST API, or from a
+file of recorded notifications with one JSON object per line:
+
+    {"block": 12, "tx": "0x...", "event": "agreement",
+     "args": [{"type": "ByteArray", "value": "6b30"}, ...]}
+
+Arguments use the contract parameter notation of neo-python. Events are
+applied in batches, each in one transaction together with the position in
+the source, so an interrupted run resumes where it stopped without
+applying an event twice. The database holds a table of agreements, with
+their status, location and day, and a table of balances per account.
+
+    python -m offchain.indexer --db sunny.db --file notifications.jsonl
+    python -m offchain.indexer --db sunny.db --rpc http://localhost:8080 --contract 0x... --follow
+"""
+import argparse
+import binascii
+import json
+import sqlite3
+import time
+from urllib.request import urlopen
+
+STATUS_INITIALIZED = 1
+STATUS_RESULT_NOTICED = 2
+STATUS_CLAIMED = 3
+STATUS_REFUNDED = 4
+
+SECONDS_PER_DAY = 86400
+
+# Layout of the agreement record, as in sunny_dapp.py: (offset, width)
+RECORD_FIELDS = (
+    ('status', 0, 1),
+    ('settings_version', 1, 2),
+    ('customer', 3, 20),
+    ('insurer', 23, 20),
+    ('timestamp', 43, 5),
+    ('utc_offset', 48, 1),
+    ('amount', 49, 8),
+    ('premium', 57, 8),
+    ('fee', 65, 8),
+    ('weather_param', 73, 2),
+    ('oracle_cost', 75, 8),
+)
+ADDRESS_FIELDS = ('customer', 'insurer')
+LOCATION_OFFSET = 91
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS agreements (
+    agreement_key BLOB PRIMARY KEY,
+    status INTEGER,
+    settings_version INTEGER,
+    customer BLOB,
+    insurer BLOB,
+    location TEXT,
+    day INTEGER,
+    timestamp INTEGER,
+    utc_offset INTEGER,
+    amount INTEGER,
+    premium INTEGER,
+    fee INTEGER,
+    weather_param INTEGER,
+    oracle_cost INTEGER,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    updated_block INTEGER
+);
+CREATE INDEX IF NOT EXISTS agreements_status ON agreements (status, deleted);
+CREATE INDEX IF NOT EXISTS agreements_location_day ON agreements (location, day);
+CREATE TABLE IF NOT EXISTS balances (
+    account BLOB PRIMARY KEY,
+    balance INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    source TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    block INTEGER
+);
+"""
+
+
+def to_int(value):
+    """
+    Interpret an event argument as an integer, like the AVM does
+    """
+
+    if isinstance(value, bytes):
+        return int.from_bytes(value, 'little', signed=True) if value else 0
+
+    return int(value)
+
+
+def to_bytes(value):
+    if isinstance(value, bytes):
+        return value
+
+    if isinstance(value, str):
+        return value.encode()
+
+    if isinstance(value, bool):
+        return b'\x01' if value else b''
+
+    value = int(value)
+    if value == 0:
+        return b''
+
+    length = ((value if value > 0 else -value - 1).bit_length() + 8) // 8
+
+    return value.to_bytes(length, 'little', signed=True)
+
+
+def decode_parameter(parameter):
+    """
+    Convert a contract parameter in neo-python notation to a python value
+    """
+
+    kind = parameter.get('type')
+    value = parameter.get('value')
+
+    if kind == 'ByteArray':
+        return binascii.unhexlify(value)
+
+    if kind == 'Integer':
+        return int(value)
+
+    if kind == 'Boolean':
+        if isinstance(value, str):
+            return value.lower() == 'true'
+        return bool(value)
+
+    if kind == 'String':
+        return value.encode()
+
+    if kind == 'Array':
+        return [decode_parameter(item) for item in value]
+
+    return value
+
+
+def encode_parameter(value):
+    """
+    Convert a python value to a contract parameter in neo-python notation
+    """
+
+    if isinstance(value, (list, tuple)):
+        return {'type': 'Array', 'value': [encode_parameter(item) for item in value]}
+
+    if isinstance(value, int) and not isinstance(value, bool):
+        return {'type': 'Integer', 'value': str(value)}
+
+    return {'type': 'ByteArray', 'value': binascii.hexlify(to_bytes(value)).decode()}
+
+
+def decode_agreement(data):
+    """
+    Unpack an agreement record
+
+    :rtype: dict
+    """
+
+    row = {}
+
+    for name, offset, width in RECORD_FIELDS:
+        field = data[offset:offset + width]
+        row[name] = field if name in ADDRESS_FIELDS else to_int(field)
+
+    row['location'] = data[LOCATION_OFFSET:].decode('utf-8', 'replace')
+    row['day'] = row['timestamp'] // SECONDS_PER_DAY
+
+    return row
+
+
+def write_notifications(path, events, block=0, tx=None):
+    """
+    Append events to a file of recorded notifications, for instance the
+    events captured by the emulator
+
+    :param events: (event, args) tuples
+    :type events: list
+    """
+
+    with open(path, 'a') as f:
+        for event, args in events:
+            record = {'block': block, 'tx': tx, 'event': event, 'args': [encode_parameter(arg) for arg in args]}
+            f.write(json.dumps(record) + '\n')
+
+
+class FileSource(object):
+    """
+    Notifications recorded in a file, one JSON object per line
+
+    :param path: path of the file
+    :type path: str
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = 'file:' + path
+
+    def read(self, position):
+        """
+        Yield (position, block, event, args) for the notifications after
+        position, the number of notifications already consumed
+        """
+
+        with open(self.path) as f:
+            for i, line in enumerate(f):
+                if i < position or not line.strip():
+                    continue
+
+                record = json.loads(line)
+                args = [decode_parameter(arg) for arg in record['args']]
+
+                yield i + 1, record.get('block'), record['event'], args
+
+
+class NodeSource(object):
+    """
+    Notifications of a contract served by the REST API of a neo-python node,
+    started with np-api-server --port-rest
+
+    :param url: base url of the REST API
+    :type url: str
+
+    :param contract: script hash of the contract
+    :type contract: str
+
+    :param page_size: notifications per request
+    :type page_size: int
+    """
+
+    def __init__(self, url, contract, page_size=500, timeout=30):
+        self.url = url.rstrip('/')
+        self.contract = contract
+        self.page_size = page_size
+        self.timeout = timeout
+        self.name = 'node:' + contract
+
+    def fetch(self, page):
+        url = '{}/v1/notifications/contract/{}?page={}&pagesize={}'.format(self.url, self.contract, page,
+                                                                           self.page_size)
+        response = urlopen(url, timeout=self.timeout)
+
+        try:
+            return json.loads(response.read().decode())
+        finally:
+            response.close()
+
+    def read(self, position):
+        page = position // self.page_size + 1
+
+        while True:
+            results = self.fetch(page).get('results') or []
+            offset = (page - 1) * self.page_size
+
+            for i, notification in enumerate(results):
+                if offset + i < position:
+                    continue
+
+                state = decode_parameter(notification['state'])
+                event = state[0].decode() if isinstance(state[0], bytes) else state[0]
+
+                yield offset + i + 1, notification.get('block'), event, state[1:]
+
+            if len(results) < self.page_size:
+                return
+
+            page += 1
+
+
+class Indexer(object):
+    """
+    Applies the events of the contract to a SQLite database
+
+    :param path: path of the database
+    :type path: str
+
+    :param batch_size: number of events applied per transaction
+    :type batch_size: int
+    """
+
+    def __init__(self, path, batch_size=1000):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.batch_size = batch_size
+        self.agreements = {}
+        self.balances = {}
+
+    def close(self):
+        self.db.close()
+
+    def checkpoint(self, source):
+        row = self.db.execute('SELECT position FROM checkpoints WHERE source = ?', (source.name,)).fetchone()
+
+        return row[0] if row else 0
+
+    def run(self, source):
+        """
+        Apply the events of source after its checkpoint
+
+        :return: the number of events applied
+        :rtype: int
+        """
+
+        position = self.checkpoint(source)
+        applied = 0
+        pending = 0
+        block = None
+
+        for position, block, event, args in source.read(position):
+            self.apply(block, event, args)
+            applied += 1
+            pending += 1
+
+            if pending >= self.batch_size:
+                self.flush(source, position, block)
+                pending = 0
+
+        if pending:
+            self.flush(source, position, block)
+
+        return applied
+
+    def update(self, agreement_key, block, **columns):
+        columns['updated_block'] = block
+        self.agreements.setdefault(bytes(agreement_key), {}).update(columns)
+
+    def credit(self, account, amount):
+        account = bytes(account)
+        self.balances[account] = self.balances.get(account, 0) + amount
+
+    def apply(self, block, event, args):
+        """
+        Record the effect of one event in the pending batch
+        """
+
+        if event == 'agreement':
+            agreement_key = args[0]
+            columns = decode_agreement(args[1]) if len(args) > 1 else {'status': STATUS_INITIALIZED}
+            columns['deleted'] = 0
+            self.update(agreement_key, block, **columns)
+
+        elif event == 'result-notice':
+            self.update(args[0], block, status=STATUS_RESULT_NOTICED, weather_param=to_int(args[1]),
+                        oracle_cost=to_int(args[2]))
+
+        elif event == 'pay-out':
+            self.update(args[0], block, status=STATUS_CLAIMED)
+
+        elif event == 'refund-all':
+            self.update(args[0], block, status=STATUS_REFUNDED)
+
+        elif event == 'archive':
+            columns = decode_agreement(args[1])
+            columns['deleted'] = 1
+            self.update(args[0], block, **columns)
+
+        elif event == 'delete':
+            self.update(args[0], block, deleted=1)
+
+        elif event == 'transfer':
+            amount = to_int(args[2])
+            self.credit(args[0], -amount)
+            self.credit(args[1], amount)
+
+    def flush(self, source, position, block):
+        """
+        Write the pending batch and the checkpoint in one transaction
+        """
+
+        groups = {}
+        for agreement_key, columns in self.agreements.items():
+            names = tuple(sorted(columns))
+            groups.setdefault(names, []).append((agreement_key,) + tuple(columns[name] for name in names))
+
+        with self.db:
+            for names, rows in groups.items():
+                self.db.executemany(
+                    'INSERT INTO agreements (agreement_key, {}) VALUES (?, {}) ON CONFLICT (agreement_key) '
+                    'DO UPDATE SET {}'.format(', '.join(names), ', '.join('?' for _ in names),
+                                              ', '.join('{0} = excluded.{0}'.format(name) for name in names)),
+                    rows)
+
+            self.db.executemany(
+                'INSERT INTO balances (account, balance) VALUES (?, ?) ON CONFLICT (account) '
+                'DO UPDATE SET balance = balance + excluded.balance',
+                list(self.balances.items()))
+
+            self.db.execute(
+                'INSERT INTO checkpoints (source, position, block) VALUES (?, ?, ?) ON CONFLICT (source) '
+                'DO UPDATE SET position = excluded.position, block = excluded.block',
+                (source.name, position, block))
+
+        self.agreements = {}
+        self.balances = {}
+
+    # Queries
+
+    def agreements_by_status(self, status):
+        return [row[0] for row in self.db.execute(
+            'SELECT agreement_key FROM agreements WHERE status = ? AND deleted = 0', (status,))]
+
+    def agreements_by_location(self, location, day):
+        return [row[0] for row in self.db.execute(
+            'SELECT agreement_key FROM agreements WHERE location = ? AND day = ? AND deleted = 0',
+            (location, day))]
+
+    def balance(self, account):
+        row = self.db.execute('SELECT balance FROM balances WHERE account = ?', (bytes(account),)).fetchone()
+
+        return row[0] if row else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Index the events of the contract into SQLite')
+    parser.add_argument('--db', default='sunny.db', help='path of the SQLite database')
+    parser.add_argument('--file', help='file of recorded notifications')
+    parser.add_argument('--rpc', help='base url of the REST API of a neo-python node')
+    parser.add_argument('--contract', help='script hash of the contract, with --rpc')
+    parser.add_argument('--batch-size', type=int, default=1000, help='events applied per transaction')
+    parser.add_argument('--follow', action='store_true', help='keep polling for new events')
+    parser.add_argument('--interval', type=float, default=15.0, help='seconds between two polls with --follow')
+    args = parser.parse_args(argv)
+
+    if args.file:
+        source = FileSource(args.file)
+    elif args.rpc and args.contract:
+        source = NodeSource(args.rpc, args.contract)
+    else:
+        parser.error('either --file or --rpc and --contract is required')
+
+    indexer = Indexer(args.db, args.batch_size)
+
+    try:
+        while True:
+            applied = indexer.run(source)
+            print('Applied {} events, checkpoint at {}'.format(applied, indexer.checkpoint(source)))
+
+            if not args.follow:
+                break
+
+            time.sleep(args.interval)
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        indexer.close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,126 @@
+"""
+Merkle trees of weather observations for the postResultRoot and
+claimWithProof operations of the contract
+
+The hashing matches VerifyProof in sunny_dapp.py: a leaf is
+sha256(0x00 + day + weather_param + location) with day and weather_param
+as 3 and 2 byte little endian integers, an inner node is
+sha256(0x01 + left + right). A node without a sibling is paired with
+itself.
+"""
+import hashlib
+
+DAY_WIDTH = 3
+WEATHER_PARAM_WIDTH = 2
+
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+
+def pack_int(value, width):
+    return value.to_bytes(width, 'little', signed=True)
+
+
+def leaf_data(location, day, weather_param):
+    """
+    :param location: location of the observation, typically a city
+    :type location: str or bytes
+
+    :param day: the day of the observation, a timestamp divided by 86400
+    :type day: int
+
+    :param weather_param: relative sunshine duration percent
+    :type weather_param: int
+
+    :rtype: bytes
+    """
+
+    if isinstance(location, str):
+        location = location.encode()
+
+    return pack_int(day, DAY_WIDTH) + pack_int(weather_param, WEATHER_PARAM_WIDTH) + location
+
+
+def hash_leaf(data):
+    return hashlib.sha256(LEAF_PREFIX + data).digest()
+
+
+def hash_node(left, right):
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+class MerkleTree(object):
+    """
+    Merkle tree over a list of observations
+
+    :param observations: (location, day, weather_param) tuples
+    :type observations: list
+    """
+
+    def __init__(self, observations):
+        if not observations:
+            raise ValueError('A Merkle tree needs at least one observation')
+
+        self.observations = list(observations)
+        self.positions = dict(((location, day), i) for i, (location, day, _) in enumerate(self.observations))
+
+        level = [hash_leaf(leaf_data(*observation)) for observation in self.observations]
+        self.levels = [level]
+
+        while len(level) > 1:
+            if len(level) % 2:
+                level = level + [level[-1]]
+            level = [hash_node(level[i], level[i + 1]) for i in range(0, len(level), 2)]
+            self.levels.append(level)
+
+    @property
+    def root(self):
+        return self.levels[-1][0]
+
+    def proof(self, index):
+        """
+        Sibling hashes from the leaf at index up to the root
+
+        :rtype: list
+        """
+
+        proof = []
+
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            proof.append(level[sibling] if sibling < len(level) else level[index])
+            index //= 2
+
+        return proof
+
+    def claim_args(self, location, day):
+        """
+        Arguments of claimWithProof after the agreement key for the
+        observation of a location and day
+
+        :return: [weather_param, leaf_index, proof]
+        :rtype: list
+        """
+
+        index = self.positions[(location, day)]
+
+        return [self.observations[index][2], index, self.proof(index)]
+
+
+def verify(root, location, day, weather_param, index, proof):
+    """
+    Verify a proof like the contract does
+
+    :rtype: bool
+    """
+
+    node = hash_leaf(leaf_data(location, day, weather_param))
+
+    for sibling in proof:
+        if index % 2:
+            node = hash_node(sibling, node)
+        else:
+            node = hash_node(node, sibling)
+        index //= 2
+
+    return index == 0 and node == root
@@ -0,0 +1,269 @@
+"""
+Local stand-in for the JSON-RPC and REST API of a NEO node
+
+The contract runs in the emulator. invokefunction is a test invocation
+whose changes are rolled back, and every transaction accepted by
+sendrawtransaction is executed at once in a block of its own. The REST
+notification endpoint that offchain.indexer reads is served as well.
+
+    node = MockNode(Emulator(), contract_hash)
+    server = MockRpcServer(node)
+    server.start()
+    rpc = RpcClient([server.url])
+"""
+import binascii
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlsplit
+
+from emulator import APPLICATION, ByteArray, ExecutionFault
+
+from .indexer import decode_parameter, encode_parameter
+from .rpc import (ATTRIBUTE_SCRIPT, GAS_ASSET, FIXED8, InvocationTransaction, Reader, address_to_script_hash,
+                  hash160, hash_to_hex, hex_to_hash, parse_invocation, verify_signature)
+
+
+def stack_item(value):
+    """
+    Arguments as the AVM hands them to the contract, byte arrays compare
+    as the integers they encode
+    """
+
+    if isinstance(value, list):
+        return [stack_item(item) for item in value]
+    if isinstance(value, bytes):
+        return ByteArray(value)
+
+    return value
+
+
+class MockNode(object):
+    """
+    Chain state behind the mock API
+
+    :param emulator: emulator running the contract
+    :type emulator: emulator.Emulator
+
+    :param contract_hash: script hash of the contract, as displayed
+    :type contract_hash: str
+    """
+
+    def __init__(self, emulator, contract_hash):
+        self.emulator = emulator
+        self.contract_hash = contract_hash if contract_hash.startswith('0x') else '0x' + contract_hash
+        self.script_hash = hex_to_hash(self.contract_hash)
+        self.lock = threading.Lock()
+        self.transactions = {}
+        self.logs = {}
+        self.notifications = []
+        self.unspent = {}
+
+    def add_unspent(self, script_hash, tx_hash, index, value):
+        """
+        Give an account a GAS output, value in 10^-8 GAS
+        """
+
+        self.unspent[(hex_to_hash(tx_hash), index)] = (script_hash, value)
+
+    # Methods
+
+    def getblockcount(self):
+        return self.emulator.clock.height + 1
+
+    def invokefunction(self, contract_hash, operation, params=()):
+        args = [stack_item(decode_parameter(param)) for param in params]
+        interop = self.emulator.interop
+
+        # A test invocation leaves no trace
+        interop.begin(frozenset(), APPLICATION)
+
+        try:
+            result = self.emulator.main(operation, args)
+        except Exception:
+            return {'state': 'FAULT, BREAK', 'gas_consumed': '0', 'stack': []}
+        finally:
+            interop.rollback()
+
+        return {'state': 'HALT, BREAK', 'gas_consumed': '0', 'stack': [encode_parameter(result)]}
+
+    def sendrawtransaction(self, raw):
+        tx = InvocationTransaction.deserialize(binascii.unhexlify(raw))
+
+        if tx.hash in self.transactions:
+            return False
+
+        message = tx.serialize_unsigned()
+        signers = set(value for usage, value in tx.attributes if usage == ATTRIBUTE_SCRIPT)
+        witnesses = set()
+
+        for invocation, verification in tx.witnesses:
+            script_hash = hash160(verification)
+            signature = Reader(invocation).read_var_bytes()
+            public_key = Reader(verification).read_var_bytes()
+
+            if verify_signature(public_key, message, signature) is False:
+                return False
+
+            witnesses.add(script_hash)
+
+        if not signers <= witnesses:
+            return False
+
+        if not self.spend(tx, witnesses):
+            return False
+
+        contract_hash, operation, args = parse_invocation(tx.script)
+        if contract_hash != self.script_hash:
+            return False
+
+        self.transactions[tx.hash] = tx
+        self.emulator.clock.height += 1
+        self.execute(tx.hash, operation.decode(), stack_item(args), witnesses)
+
+        return True
+
+    def spend(self, tx, witnesses):
+        total = 0
+
+        for tx_hash, index in tx.inputs:
+            output = self.unspent.get((tx_hash, index))
+            if output is None or output[0] not in witnesses:
+                return False
+            total += output[1]
+
+        change = sum(value for _, value, _ in tx.outputs)
+        if total < tx.gas + change:
+            return False
+
+        for tx_hash, index in tx.inputs:
+            del self.unspent[(tx_hash, index)]
+
+        for index, (asset, value, script_hash) in enumerate(tx.outputs):
+            if hash_to_hex(asset) == GAS_ASSET:
+                self.unspent[(hex_to_hash(tx.hash), index)] = (script_hash, value)
+
+        return True
+
+    def execute(self, tx_hash, operation, args, witnesses):
+        interop = self.emulator.interop
+        marker = len(interop.events)
+
+        try:
+            result = self.emulator.invoke(operation, args, witnesses)
+            state = 'HALT, BREAK'
+            stack = [encode_parameter(result)]
+        except ExecutionFault:
+            state = 'FAULT, BREAK'
+            stack = []
+
+        notifications = []
+        for event, event_args in interop.events[marker:]:
+            notification = {'block': self.getblockcount() - 1, 'tx': '0x' + tx_hash, 'contract': self.contract_hash,
+                            'state': encode_parameter([event.encode()] + list(event_args))}
+            notifications.append(notification)
+
+        self.notifications.extend(notifications)
+        self.logs[tx_hash] = {'txid': '0x' + tx_hash, 'vmstate': state, 'stack': stack,
+                              'notifications': notifications}
+
+    def getapplicationlog(self, tx_hash):
+        return self.logs[tx_hash.replace('0x', '')]
+
+    def getunspents(self, address):
+        script_hash = address_to_script_hash(address)
+        unspent = [{'txid': hash_to_hex(tx_hash), 'n': index, 'value': value / float(FIXED8)}
+                   for (tx_hash, index), (owner, value) in sorted(self.unspent.items()) if owner == script_hash]
+
+        return {'address': address, 'balance': [{'asset_hash': GAS_ASSET, 'asset': 'GAS', 'unspent': unspent}]}
+
+    def handle(self, request):
+        method = getattr(self, request.get('method') or '', None)
+        response = {'jsonrpc': '2.0', 'id': request.get('id')}
+
+        if method is None or request['method'] in ('handle', 'execute', 'spend', 'add_unspent'):
+            response['error'] = {'code': -32601, 'message': 'Method not found'}
+            return response
+
+        try:
+            with self.lock:
+                response['result'] = method(*request.get('params', []))
+        except Exception as e:
+            response['error'] = {'code': -32603, 'message': str(e)}
+
+        return response
+
+    def notifications_page(self, page, page_size):
+        start = (page - 1) * page_size
+        results = self.notifications[start:start + page_size]
+
+        return {'results': results, 'page': page, 'page_len': page_size, 'total': len(self.notifications),
+                'total_pages': -(-len(self.notifications) // page_size)}
+
+
+class MockRpcHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])).decode())
+        node = self.server.node
+
+        if isinstance(request, list):
+            self.reply([node.handle(item) for item in request])
+        else:
+            self.reply(node.handle(request))
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        node = self.server.node
+
+        if not url.path.startswith('/v1/notifications/contract/'):
+            self.send_error(404)
+            return
+
+        page = int(query.get('page', ['1'])[0])
+        page_size = int(query.get('pagesize', ['500'])[0])
+
+        with node.lock:
+            self.reply(node.notifications_page(page, page_size))
+
+
+class MockRpcServer(ThreadingMixIn, HTTPServer):
+    """
+    HTTP server for a MockNode, on a free local port by default
+    """
+
+    daemon_threads = True
+
+    def __init__(self, node, address=('127.0.0.1', 0)):
+        HTTPServer.__init__(self, address, MockRpcHandler)
+        self.node = node
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'http://{}:{}/'.format(*self.server_address[:2])
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
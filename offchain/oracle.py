@@ -0,0 +1,310 @@
+"""
+Oracle service that notices the weather results of due agreements
+
+Due agreements are discovered from the agreement events, through the
+SQLite store of offchain.indexer. Agreements are grouped by location and
+day, so the weather of every location and day is fetched once, however
+many agreements depend on it. Fetches run concurrently through a weather
+provider, and every group is settled with resultNoticeByLocation
+invocations of at most batch_size index slots each. A limited number of
+invocations is in flight at the same time.
+
+The provider and the submitter are pluggable. RpcSubmitter signs the
+invocations with the key of the oracle and relays them to nodes through
+offchain.rpc. FileProvider reads the observations from a JSON file and
+EmulatorSubmitter invokes the contract in the emulator, which together
+stand in for a weather service and a node.
+
+A location and day whose weather cannot be fetched, or whose invocations
+fail, is logged and tried again on a later run; it does not hold up the
+other locations and days.
+"""
+import abc
+import asyncio
+import json
+import logging
+import time
+
+from .indexer import SECONDS_PER_DAY, STATUS_INITIALIZED
+
+logger = logging.getLogger(__name__)
+
+
+class WeatherProvider(abc.ABC):
+    """
+    Source of relative sunshine durations
+    """
+
+    @abc.abstractmethod
+    async def sunshine(self, location, day):
+        """
+        :param location: location of the observation, typically a city
+        :type location: str
+
+        :param day: the day of the observation, a timestamp divided by 86400
+        :type day: int
+
+        :return: relative sunshine duration in percent
+        :rtype: int
+        :raises KeyError: if there is no observation
+        """
+
+
+class FileProvider(WeatherProvider):
+    """
+    Observations stored in a JSON file as {location: {day: percent}}
+
+    :param path: path of the file
+    :type path: str
+
+    :param delay: seconds every lookup takes, to simulate a remote service
+    :type delay: float
+    """
+
+    def __init__(self, path, delay=0):
+        self.path = path
+        self.delay = delay
+
+        with open(path) as f:
+            self.observations = json.load(f)
+
+    async def sunshine(self, location, day):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+        return int(self.observations[location][str(day)])
+
+
+class EmulatorSubmitter(object):
+    """
+    Invokes the contract in the emulator with the witness of the oracle
+
+    :param emulator: the emulator running the contract
+    :type emulator: emulator.Emulator
+
+    :param oracle: script hash of the oracle
+    :type oracle: bytes
+    """
+
+    def __init__(self, emulator, oracle):
+        self.emulator = emulator
+        self.oracle = oracle
+
+    async def call(self, operation, args):
+        return self.emulator.invoke(operation, args)
+
+    async def invoke(self, operation, args):
+        return self.emulator.invoke(operation, args, [self.oracle])
+
+
+class RpcSubmitter(object):
+    """
+    Signs invocations of the contract with the wallet of the oracle and
+    relays them to the nodes
+
+    The result of a relayed invocation is only known once it is in a
+    block, so invoke returns the hash of its transaction and the noticed
+    agreements show up through the indexer.
+
+    :param client: client of the contract, with the wallet of the oracle
+    :type client: offchain.rpc.SunnyClient
+
+    :param gas: GAS for the execution of every invocation above the free
+        allowance, in 10^-8
+    :type gas: int
+
+    :param fee: network fee of every invocation, in 10^-8 GAS
+    :type fee: int
+    """
+
+    def __init__(self, client, gas=0, fee=0):
+        self.client = client
+        self.gas = gas
+        self.fee = fee
+
+    async def call(self, operation, args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.client.test_invoke, operation, args)
+
+    async def invoke(self, operation, args):
+        # The client limits the transactions in flight itself
+        return await asyncio.wrap_future(self.client.submit(operation, args, self.gas, self.fee))
+
+
+class Oracle(object):
+    """
+    Notices the results of the agreements whose day has passed
+
+    :param indexer: store of the contract events
+    :type indexer: offchain.indexer.Indexer
+
+    :param source: notification source the indexer follows
+    :type source: offchain.indexer.FileSource or offchain.indexer.NodeSource
+
+    :param provider: weather provider
+    :type provider: WeatherProvider
+
+    :param submitter: sends invocations of the contract signed by the oracle
+    :type submitter: RpcSubmitter or EmulatorSubmitter
+
+    :param oracle_cost: cost charged per agreement
+    :type oracle_cost: int
+
+    :param batch_size: index slots noticed per invocation
+    :type batch_size: int
+
+    :param max_fetches: weather lookups running at the same time
+    :type max_fetches: int
+
+    :param max_in_flight: invocations running at the same time
+    :type max_in_flight: int
+
+    :param retry_after: seconds before a location and day that was noticed
+        but still shows initialized agreements is noticed again
+    :type retry_after: float
+    """
+
+    def __init__(self, indexer, source, provider, submitter, oracle_cost=0, batch_size=100, max_fetches=16,
+                 max_in_flight=8, retry_after=600):
+        self.indexer = indexer
+        self.source = source
+        self.provider = provider
+        self.submitter = submitter
+        self.oracle_cost = oracle_cost
+        self.batch_size = batch_size
+        self.max_fetches = max_fetches
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.observations = {}
+        self.fetches = {}
+        self.submitted = {}
+
+    def due(self, now):
+        """
+        Locations and days with initialized agreements whose day has passed
+
+        :return: (location, day) tuples
+        :rtype: list
+        """
+
+        today = int(now) // SECONDS_PER_DAY
+        rows = set(self.indexer.db.execute(
+            'SELECT DISTINCT location, day FROM agreements WHERE status = ? AND deleted = 0 AND day < ?',
+            (STATUS_INITIALIZED, today)))
+
+        # Locations and days without initialized agreements are settled for
+        # good and are forgotten
+        for key in [key for key in self.submitted if key not in rows]:
+            del self.submitted[key]
+
+        # Noticed agreements only show up once their events are indexed
+        return [(location, day) for location, day in sorted(rows)
+                if now - self.submitted.get((location, day), now - self.retry_after) >= self.retry_after]
+
+    async def observation(self, location, day, fetch_slots):
+        """
+        Weather of a location and day, fetched once and then cached
+        """
+
+        key = (location, day)
+
+        if key in self.observations:
+            return self.observations[key]
+
+        if key not in self.fetches:
+            self.fetches[key] = asyncio.ensure_future(self._fetch(location, day, fetch_slots))
+
+        try:
+            return await self.fetches[key]
+        finally:
+            self.fetches.pop(key, None)
+
+    async def _fetch(self, location, day, fetch_slots):
+        async with fetch_slots:
+            weather_param = await self.provider.sunshine(location, day)
+
+        self.observations[(location, day)] = weather_param
+
+        return weather_param
+
+    async def settle(self, location, day, now, fetch_slots, submit_slots):
+        """
+        Notice the result of all agreements of a location and day
+
+        :return: the number of agreements noticed
+        :rtype: int
+        """
+
+        try:
+            weather_param = await self.observation(location, day, fetch_slots)
+        except KeyError:
+            logger.warning('No observation for %s on day %s', location, day)
+            return 0
+        except Exception:
+            logger.exception('Could not fetch the weather of %s on day %s', location, day)
+            return 0
+
+        try:
+            size = await self.submitter.call('locationIndexSize', [location, day])
+        except Exception:
+            logger.exception('Could not read the index size of %s on day %s', location, day)
+            return 0
+
+        size = int.from_bytes(size, 'little', signed=True) if isinstance(size, bytes) else int(size or 0)
+
+        async def submit(start):
+            async with submit_slots:
+                return await self.submitter.invoke(
+                    'resultNoticeByLocation', [location, day, weather_param, self.oracle_cost, start,
+                                               self.batch_size])
+
+        results = await asyncio.gather(*[submit(start) for start in range(0, size, self.batch_size)],
+                                       return_exceptions=True)
+        failed = [result for result in results if isinstance(result, Exception)]
+
+        for error in failed:
+            logger.error('Could not notice %s on day %s: %s', location, day, error)
+
+        # A day noticed in full no longer needs its observation; one that
+        # failed in full is tried again on the next run
+        if not failed:
+            self.observations.pop((location, day), None)
+        if len(failed) < len(results):
+            self.submitted[(location, day)] = now
+
+        # Relayed invocations return the hash of their transaction, not a
+        # count, and are noticed once they are in a block
+        return sum(result for result in results if isinstance(result, int))
+
+    async def run_once(self, now=None):
+        """
+        Catch up with the events and notice everything that is due
+
+        :return: the number of agreements noticed
+        :rtype: int
+        """
+
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.indexer.run, self.source)
+
+        fetch_slots = asyncio.Semaphore(self.max_fetches)
+        submit_slots = asyncio.Semaphore(self.max_in_flight)
+
+        if now is None:
+            now = time.time()
+
+        due = self.due(now)
+        noticed = await asyncio.gather(*[self.settle(location, day, now, fetch_slots, submit_slots)
+                                         for location, day in due], return_exceptions=True)
+
+        for (location, day), result in zip(due, noticed):
+            if isinstance(result, Exception):
+                logger.error('Could not settle %s on day %s: %s', location, day, result)
+
+        return sum(result for result in noticed if isinstance(result, int))
+
+    async def run(self, interval=60):
+        while True:
+            noticed = await self.run_once()
+            logger.info('Noticed %s agreements', noticed)
+            await asyncio.sleep(interval)
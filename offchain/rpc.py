@@ -0,0 +1,862 @@
+"""
+Client for the operations of the contract over the JSON-RPC API of NEO
+nodes
+
+Requests go over a pool of persistent HTTP connections to one or more
+nodes. Read-only operations are test invocations with invokefunction, and
+many of them are sent together as JSON-RPC batches spread over the pooled
+connections. Writes are invocation transactions built and signed locally:
+every transaction carries a random nonce, and the GAS outputs it spends
+are reserved until it is confirmed or rejected, so that many transactions
+can be in flight at the same time. The change of a transaction in flight
+goes back to the unspent outputs at once.
+
+Signing needs the optional cryptography package.
+
+    rpc = RpcClient(['http://localhost:30333'])
+    client = SunnyClient(rpc, '0x...', Wallet.from_wif('...'))
+    name, oracle = client.read_many([('name', []), ('oracle', [])])
+    future = client.submit('claim', ['agreement-0'])
+"""
+import binascii
+import hashlib
+import http.client
+import itertools
+import json
+import os
+import queue
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+try:
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
+except ImportError:
+    ec = None
+
+from .indexer import decode_parameter, encode_parameter, to_bytes
+
+GAS_ASSET = '602c79718b16e442de58778e148d0b1084e3b2dffd5de6b7b16cee7969282de7'
+
+INVOCATION_TRANSACTION = 0xd1
+TRANSACTION_VERSION = 1
+
+ATTRIBUTE_SCRIPT = 0x20
+ATTRIBUTE_REMARK = 0xf0
+
+ADDRESS_VERSION = 0x17
+FIXED8 = 100000000
+
+PUSH0 = 0x00
+PUSHDATA1 = 0x4c
+PUSHDATA2 = 0x4d
+PUSHDATA4 = 0x4e
+PUSHM1 = 0x4f
+PUSH1 = 0x51
+PUSH16 = 0x60
+PACK = 0xc1
+APPCALL = 0x67
+CHECKSIG = 0xac
+
+BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
+
+class RpcError(Exception):
+    """
+    Error returned by a node
+    """
+
+    def __init__(self, code, message):
+        super(RpcError, self).__init__('{}: {}'.format(code, message))
+        self.code = code
+        self.message = message
+
+
+# Encoding
+
+def hash160(data):
+    return hashlib.new('ripemd160', hashlib.sha256(data).digest()).digest()
+
+
+def hash256(data):
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+def base58_encode(data):
+    number = int.from_bytes(data, 'big')
+    encoded = ''
+
+    while number:
+        number, remainder = divmod(number, 58)
+        encoded = BASE58_ALPHABET[remainder] + encoded
+
+    return '1' * (len(data) - len(data.lstrip(b'\x00'))) + encoded
+
+
+def base58_decode(text):
+    number = 0
+
+    for char in text:
+        number = number * 58 + BASE58_ALPHABET.index(char)
+
+    data = number.to_bytes((number.bit_length() + 7) // 8, 'big')
+
+    return b'\x00' * (len(text) - len(text.lstrip('1'))) + data
+
+
+def base58check_decode(text):
+    data = base58_decode(text)
+
+    if hash256(data[:-4])[:4] != data[-4:]:
+        raise ValueError('Invalid checksum')
+
+    return data[:-4]
+
+
+def address_to_script_hash(address):
+    data = base58check_decode(address)
+
+    if data[0] != ADDRESS_VERSION:
+        raise ValueError('Invalid address version')
+
+    return data[1:]
+
+
+def script_hash_to_address(script_hash):
+    data = bytes([ADDRESS_VERSION]) + script_hash
+
+    return base58_encode(data + hash256(data)[:4])
+
+
+def hex_to_hash(value):
+    """
+    Convert a hash as displayed, big endian with an optional 0x, to bytes
+    """
+
+    if value.startswith('0x'):
+        value = value[2:]
+
+    return binascii.unhexlify(value)[::-1]
+
+
+def hash_to_hex(value):
+    return binascii.hexlify(value[::-1]).decode()
+
+
+def var_int(value):
+    if value < 0xfd:
+        return struct.pack('<B', value)
+    if value <= 0xffff:
+        return b'\xfd' + struct.pack('<H', value)
+    if value <= 0xffffffff:
+        return b'\xfe' + struct.pack('<I', value)
+    return b'\xff' + struct.pack('<Q', value)
+
+
+def var_bytes(data):
+    return var_int(len(data)) + data
+
+
+class Reader(object):
+
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def read(self, length):
+        if self.offset + length > len(self.data):
+            raise ValueError('Unexpected end of data')
+        chunk = self.data[self.offset:self.offset + length]
+        self.offset += length
+        return chunk
+
+    def read_byte(self):
+        return self.read(1)[0]
+
+    def read_var_int(self):
+        first = self.read_byte()
+        if first < 0xfd:
+            return first
+        if first == 0xfd:
+            return struct.unpack('<H', self.read(2))[0]
+        if first == 0xfe:
+            return struct.unpack('<I', self.read(4))[0]
+        return struct.unpack('<Q', self.read(8))[0]
+
+    def read_var_bytes(self):
+        return self.read(self.read_var_int())
+
+    @property
+    def done(self):
+        return self.offset >= len(self.data)
+
+
+# Scripts
+
+def push_data(data):
+    length = len(data)
+
+    if length <= 75:
+        return bytes([length]) + data
+    if length <= 0xff:
+        return bytes([PUSHDATA1, length]) + data
+    if length <= 0xffff:
+        return bytes([PUSHDATA2]) + struct.pack('<H', length) + data
+
+    return bytes([PUSHDATA4]) + struct.pack('<I', length) + data
+
+
+def push(value):
+    """
+    Script that pushes a value on the evaluation stack
+
+    :rtype: bytes
+    """
+
+    if isinstance(value, (list, tuple)):
+        return b''.join(push(item) for item in reversed(value)) + push(len(value)) + bytes([PACK])
+
+    if isinstance(value, bool):
+        return bytes([PUSH1 if value else PUSH0])
+
+    if isinstance(value, int):
+        if value == -1:
+            return bytes([PUSHM1])
+        if value == 0:
+            return bytes([PUSH0])
+        if 0 < value <= 16:
+            return bytes([PUSH1 - 1 + value])
+
+    return push_data(to_bytes(value))
+
+
+def invocation_script(contract_hash, operation, args):
+    """
+    Script that calls Main of a contract with an operation and arguments
+
+    :param contract_hash: script hash of the contract
+    :type contract_hash: bytes
+
+    :rtype: bytes
+    """
+
+    return push(list(args)) + push(operation) + bytes([APPCALL]) + contract_hash
+
+
+def parse_invocation(script):
+    """
+    Inverse of invocation_script
+
+    :return: the contract hash, the operation and the arguments
+    :rtype: tuple
+    """
+
+    reader = Reader(script)
+    stack = []
+
+    while not reader.done:
+        opcode = reader.read_byte()
+
+        if opcode == PUSH0:
+            stack.append(b'')
+        elif opcode <= 75:
+            stack.append(reader.read(opcode))
+        elif opcode == PUSHDATA1:
+            stack.append(reader.read(reader.read_byte()))
+        elif opcode == PUSHDATA2:
+            stack.append(reader.read(struct.unpack('<H', reader.read(2))[0]))
+        elif opcode == PUSHDATA4:
+            stack.append(reader.read(struct.unpack('<I', reader.read(4))[0]))
+        elif opcode == PUSHM1:
+            stack.append(-1)
+        elif PUSH1 <= opcode <= PUSH16:
+            stack.append(opcode - PUSH1 + 1)
+        elif opcode == PACK:
+            count = stack.pop()
+            count = count if isinstance(count, int) else int.from_bytes(count, 'little', signed=True)
+            items = [stack.pop() for _ in range(count)]
+            stack.append(items)
+        elif opcode == APPCALL:
+            contract_hash = reader.read(20)
+            if not reader.done or len(stack) != 2:
+                raise ValueError('Not a single contract invocation')
+            operation = stack.pop()
+            return contract_hash, operation, stack.pop()
+        else:
+            raise ValueError('Unsupported opcode {:#x}'.format(opcode))
+
+    raise ValueError('Script does not call a contract')
+
+
+def verification_script(public_key):
+    return push_data(public_key) + bytes([CHECKSIG])
+
+
+# Transactions
+
+class InvocationTransaction(object):
+    """
+    NEO 2 invocation transaction
+
+    :param script: the script to run
+    :type script: bytes
+
+    :param gas: GAS paid for the execution, in units of 10^-8 GAS
+    :type gas: int
+
+    :param attributes: (usage, data) tuples
+    :type attributes: list
+
+    :param inputs: (transaction hash, output index) tuples
+    :type inputs: list
+
+    :param outputs: (asset hash, value, script hash) tuples
+    :type outputs: list
+    """
+
+    def __init__(self, script, gas=0, attributes=(), inputs=(), outputs=(), witnesses=()):
+        self.script = script
+        self.gas = gas
+        self.attributes = list(attributes)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.witnesses = list(witnesses)
+
+    def serialize_unsigned(self):
+        data = [bytes([INVOCATION_TRANSACTION, TRANSACTION_VERSION]), var_bytes(self.script),
+                struct.pack('<q', self.gas), var_int(len(self.attributes))]
+
+        for usage, value in self.attributes:
+            data.append(bytes([usage]))
+            data.append(value if usage == ATTRIBUTE_SCRIPT else var_bytes(value))
+
+        data.append(var_int(len(self.inputs)))
+        for tx_hash, index in self.inputs:
+            data.append(tx_hash + struct.pack('<H', index))
+
+        data.append(var_int(len(self.outputs)))
+        for asset, value, script_hash in self.outputs:
+            data.append(asset + struct.pack('<q', value) + script_hash)
+
+        return b''.join(data)
+
+    def serialize(self):
+        data = [self.serialize_unsigned(), var_int(len(self.witnesses))]
+
+        for invocation, verification in self.witnesses:
+            data.append(var_bytes(invocation) + var_bytes(verification))
+
+        return b''.join(data)
+
+    @property
+    def hash(self):
+        return hash_to_hex(hash256(self.serialize_unsigned()))
+
+    @classmethod
+    def deserialize(cls, data):
+        reader = Reader(data)
+
+        if reader.read_byte() != INVOCATION_TRANSACTION:
+            raise ValueError('Not an invocation transaction')
+
+        version = reader.read_byte()
+        script = reader.read_var_bytes()
+        gas = struct.unpack('<q', reader.read(8))[0] if version >= 1 else 0
+
+        attributes = []
+        for _ in range(reader.read_var_int()):
+            usage = reader.read_byte()
+            if usage == ATTRIBUTE_SCRIPT:
+                attributes.append((usage, reader.read(20)))
+            else:
+                attributes.append((usage, reader.read_var_bytes()))
+
+        inputs = [(reader.read(32), struct.unpack('<H', reader.read(2))[0]) for _ in range(reader.read_var_int())]
+        outputs = [(reader.read(32), struct.unpack('<q', reader.read(8))[0], reader.read(20))
+                   for _ in range(reader.read_var_int())]
+        witnesses = [(reader.read_var_bytes(), reader.read_var_bytes()) for _ in range(reader.read_var_int())]
+
+        return cls(script, gas, attributes, inputs, outputs, witnesses)
+
+
+class Wallet(object):
+    """
+    Key pair of one account
+
+    :param private_key: 32 byte secp256r1 private key
+    :type private_key: bytes
+    """
+
+    def __init__(self, private_key):
+        if ec is None:
+            raise RuntimeError('Signing transactions requires the cryptography package')
+
+        self.key = ec.derive_private_key(int.from_bytes(private_key, 'big'), ec.SECP256R1())
+        self.public_key = self.key.public_key().public_bytes(serialization.Encoding.X962,
+                                                             serialization.PublicFormat.CompressedPoint)
+        self.verification_script = verification_script(self.public_key)
+        self.script_hash = hash160(self.verification_script)
+        self.address = script_hash_to_address(self.script_hash)
+
+    @classmethod
+    def from_wif(cls, wif):
+        data = base58check_decode(wif)
+
+        if len(data) != 34 or data[0] != 0x80 or data[33] != 0x01:
+            raise ValueError('Invalid WIF')
+
+        return cls(data[1:33])
+
+    def sign(self, message):
+        r, s = decode_dss_signature(self.key.sign(message, ec.ECDSA(hashes.SHA256())))
+
+        return r.to_bytes(32, 'big') + s.to_bytes(32, 'big')
+
+
+def verify_signature(public_key, message, signature):
+    """
+    Check a 64 byte signature, if the cryptography package is available
+
+    :return: True, False or None when it cannot be checked
+    """
+
+    if ec is None:
+        return None
+
+    key = ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), public_key)
+    r = int.from_bytes(signature[:32], 'big')
+    s = int.from_bytes(signature[32:], 'big')
+
+    try:
+        key.verify(encode_dss_signature(r, s), message, ec.ECDSA(hashes.SHA256()))
+    except Exception:
+        return False
+
+    return True
+
+
+# Connections
+
+class ConnectionPool(object):
+    """
+    Persistent HTTP connections to one or more nodes, handed out round robin
+
+    :param urls: JSON-RPC urls of the nodes
+    :type urls: list
+
+    :param size: connections per node
+    :type size: int
+    """
+
+    def __init__(self, urls, size=4, timeout=30):
+        self.endpoints = [urlsplit(url) for url in urls]
+        self.size = size
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.created = 0
+        self.next_endpoint = itertools.cycle(self.endpoints)
+
+    def _connect(self):
+        endpoint = next(self.next_endpoint)
+        connection_class = http.client.HTTPSConnection if endpoint.scheme == 'https' else http.client.HTTPConnection
+        connection = connection_class(endpoint.hostname, endpoint.port, timeout=self.timeout)
+
+        return connection, endpoint.path or '/'
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self.lock:
+            if self.created < self.size * len(self.endpoints):
+                self.created += 1
+                return self._connect()
+
+        return self.idle.get()
+
+    def release(self, connection):
+        self.idle.put(connection)
+
+    def discard(self, connection):
+        connection[0].close()
+
+        with self.lock:
+            self.created -= 1
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait()[0].close()
+            except queue.Empty:
+                return
+
+
+class RpcClient(object):
+    """
+    JSON-RPC client over a ConnectionPool
+
+    :param urls: JSON-RPC urls of the nodes
+    :type urls: list
+
+    :param pool_size: connections per node
+    :type pool_size: int
+    """
+
+    def __init__(self, urls, pool_size=4, timeout=30):
+        self.pool = ConnectionPool(urls, pool_size, timeout)
+        self.ids = itertools.count(1)
+        self.executor = ThreadPoolExecutor(pool_size * len(urls))
+
+    def close(self):
+        self.executor.shutdown()
+        self.pool.close()
+
+    def post(self, payload):
+        body = json.dumps(payload).encode()
+        connection = self.pool.acquire()
+
+        try:
+            http_connection, path = connection
+            http_connection.request('POST', path, body, {'Content-Type': 'application/json'})
+            response = http_connection.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            self.pool.discard(connection)
+            raise
+
+        self.pool.release(connection)
+
+        return json.loads(data.decode())
+
+    @staticmethod
+    def result(response):
+        if response.get('error'):
+            error = response['error']
+            return RpcError(error.get('code'), error.get('message'))
+
+        return response.get('result')
+
+    def call(self, method, *params):
+        result = self.result(self.post({'jsonrpc': '2.0', 'id': next(self.ids), 'method': method,
+                                        'params': list(params)}))
+
+        if isinstance(result, RpcError):
+            raise result
+
+        return result
+
+    def batch(self, calls):
+        """
+        Send (method, params) calls as one JSON-RPC batch
+
+        :return: the results in the order of calls, RpcError for failed calls
+        :rtype: list
+        """
+
+        if not calls:
+            return []
+
+        requests = [{'jsonrpc': '2.0', 'id': next(self.ids), 'method': method, 'params': list(params)}
+                    for method, params in calls]
+        responses = self.post(requests)
+
+        # A node that rejects the whole batch, or does not support batches,
+        # answers with a single error object
+        if isinstance(responses, dict):
+            error = self.result(responses) if responses.get('error') else RpcError(-32603, 'Invalid batch response')
+            return [error] * len(requests)
+
+        responses = dict((response.get('id'), response) for response in responses)
+
+        return [self.result(responses.get(request['id'], {'error': {'code': -32603, 'message': 'No response'}}))
+                for request in requests]
+
+    def pipeline(self, calls, chunk_size=50):
+        """
+        Send many (method, params) calls as batches over several pooled
+        connections at the same time
+
+        :rtype: list
+        """
+
+        chunks = [calls[i:i + chunk_size] for i in range(0, len(calls), chunk_size)]
+
+        return [result for results in self.executor.map(self.batch, chunks) for result in results]
+
+
+# Contract
+
+def stack_result(result):
+    """
+    Decode the first stack item of an invocation result
+    """
+
+    if result.get('state', '').startswith('FAULT'):
+        raise RpcError(None, 'Invocation faulted')
+
+    stack = result.get('stack') or []
+
+    return decode_parameter(stack[0]) if stack else None
+
+
+class UnspentPool(object):
+    """
+    GAS outputs of an account that no transaction in flight spends
+
+    The outputs spent by a transaction, and its change, are kept per
+    transaction hash until the node no longer reports any of the spent
+    outputs, which is when the transaction is confirmed. Until then refresh
+    leaves them out, and keeps the change.
+
+    :param rpc: client of the node
+    :type rpc: RpcClient
+
+    :param address: address of the account
+    :type address: str
+    """
+
+    def __init__(self, rpc, address):
+        self.rpc = rpc
+        self.address = address
+        self.lock = threading.Lock()
+        self.reserved = set()
+        self.unspent = []
+        self.in_flight = {}
+
+    def refresh(self):
+        result = self.rpc.call('getunspents', self.address)
+        unspent = []
+
+        for balance in result.get('balance', []):
+            if balance.get('asset_hash', '').replace('0x', '') == GAS_ASSET:
+                for output in balance.get('unspent', []):
+                    value = int(round(float(output['value']) * FIXED8))
+                    unspent.append((hex_to_hash(output['txid']), output['n'], value))
+
+        with self.lock:
+            reported = set(output[:2] for output in unspent)
+
+            for tx_hash, (spent, _) in list(self.in_flight.items()):
+                if not spent & reported:
+                    del self.in_flight[tx_hash]
+
+            spent = set()
+            for outputs, change in self.in_flight.values():
+                spent.update(outputs)
+                unspent.extend(output for output in change if output[:2] not in reported)
+
+            self.unspent = [output for output in unspent if output[:2] not in spent]
+
+    def reserve(self, amount):
+        """
+        Reserve outputs worth at least amount
+
+        :return: the reserved (transaction hash, index, value) outputs
+        :rtype: list
+        """
+
+        with self.lock:
+            selected = []
+            total = 0
+
+            for output in self.unspent:
+                if total >= amount:
+                    break
+                if output[:2] not in self.reserved:
+                    selected.append(output)
+                    total += output[2]
+
+            if total < amount:
+                raise RpcError(None, 'Insufficient unreserved GAS')
+
+            self.reserved.update(output[:2] for output in selected)
+
+        return selected
+
+    def release(self, outputs):
+        with self.lock:
+            self.reserved.difference_update(output[:2] for output in outputs)
+
+    def spend(self, tx_hash, outputs, change=()):
+        """
+        Drop outputs spent by an accepted transaction and add its change
+
+        :param tx_hash: hash of the transaction
+        :type tx_hash: str
+
+        :param change: the (transaction hash, index, value) outputs of the
+            transaction that return to the account
+        :type change: list
+        """
+
+        with self.lock:
+            spent = set(output[:2] for output in outputs)
+            self.unspent = [output for output in self.unspent if output[:2] not in spent]
+            self.unspent.extend(change)
+            self.reserved.difference_update(spent)
+            self.in_flight[tx_hash] = (spent, list(change))
+
+
+class SunnyClient(object):
+    """
+    Operations of the contract
+
+    :param rpc: client of the nodes
+    :type rpc: RpcClient
+
+    :param contract_hash: script hash of the contract, as displayed
+    :type contract_hash: str
+
+    :param wallet: account that signs writes
+    :type wallet: Wallet
+
+    :param max_in_flight: transactions submitted at the same time
+    :type max_in_flight: int
+    """
+
+    def __init__(self, rpc, contract_hash, wallet=None, max_in_flight=16):
+        self.rpc = rpc
+        self.contract_hash = contract_hash if contract_hash.startswith('0x') else '0x' + contract_hash
+        self.script_hash = hex_to_hash(self.contract_hash)
+        self.wallet = wallet
+        self.executor = ThreadPoolExecutor(max_in_flight)
+        self.unspent = UnspentPool(rpc, wallet.address) if wallet is not None else None
+
+    def close(self):
+        self.executor.shutdown()
+
+    # Reads
+
+    def test_invoke(self, operation, args=()):
+        params = [encode_parameter(arg) for arg in args]
+
+        return stack_result(self.rpc.call('invokefunction', self.contract_hash, operation, params))
+
+    def read_many(self, calls):
+        """
+        Test invoke many (operation, args) calls through pipelined batches
+
+        :return: the results in the order of calls
+        :rtype: list
+        """
+
+        requests = [('invokefunction', [self.contract_hash, operation, [encode_parameter(arg) for arg in args]])
+                    for operation, args in calls]
+        results = []
+
+        for result in self.rpc.pipeline(requests):
+            if isinstance(result, RpcError):
+                raise result
+            results.append(stack_result(result))
+
+        return results
+
+    def name(self):
+        return self.test_invoke('name')
+
+    def oracle(self):
+        return self.test_invoke('oracle')
+
+    def settings(self):
+        return self.test_invoke('settings')
+
+    def balance(self, address):
+        return self.test_invoke('balance', [address])
+
+    def agreements(self, status=0, cursor=0, page_size=100):
+        return self.test_invoke('agreements', [status, cursor, page_size])
+
+    # Writes
+
+    @staticmethod
+    def nonce():
+        """
+        Random remark that makes a transaction unique, since NEO 2 has no
+        account nonce. Unlike a counter it does not collide with the
+        transactions of another client signing with the same wallet.
+
+        :rtype: bytes
+        """
+
+        return os.urandom(8)
+
+    def build(self, operation, args, gas=0, fee=0):
+        """
+        Build and sign a transaction that invokes the contract
+
+        :param gas: GAS for the execution above the free allowance, in 10^-8
+        :type gas: int
+
+        :param fee: network fee, in 10^-8 GAS
+        :type fee: int
+
+        :return: the transaction and the outputs it spends
+        :rtype: tuple
+        """
+
+        if self.wallet is None:
+            raise RuntimeError('A wallet is required to send transactions')
+
+        script = invocation_script(self.script_hash, operation, args)
+        attributes = [(ATTRIBUTE_SCRIPT, self.wallet.script_hash), (ATTRIBUTE_REMARK, self.nonce())]
+        inputs = []
+        outputs = []
+        spent = []
+
+        if gas + fee > 0:
+            if not self.unspent.unspent:
+                self.unspent.refresh()
+            spent = self.unspent.reserve(gas + fee)
+            inputs = [(tx_hash, index) for tx_hash, index, _ in spent]
+            change = sum(value for _, _, value in spent) - gas - fee
+            if change:
+                outputs.append((hex_to_hash(GAS_ASSET), change, self.wallet.script_hash))
+
+        tx = InvocationTransaction(script, gas, attributes, inputs, outputs)
+        signature = self.wallet.sign(tx.serialize_unsigned())
+        tx.witnesses = [(push_data(signature), self.wallet.verification_script)]
+
+        return tx, spent
+
+    def send(self, operation, args, gas=0, fee=0):
+        """
+        Sign and send a transaction
+
+        :return: the hash of the transaction
+        :rtype: str
+        """
+
+        tx, spent = self.build(operation, args, gas, fee)
+
+        try:
+            accepted = self.rpc.call('sendrawtransaction', binascii.hexlify(tx.serialize()).decode())
+        except Exception:
+            self.unspent.release(spent)
+            raise
+
+        if not accepted:
+            self.unspent.release(spent)
+            raise RpcError(None, 'Transaction {} was rejected'.format(tx.hash))
+
+        if spent:
+            change = [(hex_to_hash(tx.hash), index, value)
+                      for index, (asset, value, script_hash) in enumerate(tx.outputs)
+                      if asset == hex_to_hash(GAS_ASSET) and script_hash == self.wallet.script_hash]
+            self.unspent.spend(tx.hash, spent, change)
+
+        return tx.hash
+
+    def submit(self, operation, args, gas=0, fee=0):
+        """
+        Send a transaction in the background
+
+        :rtype: concurrent.futures.Future
+        """
+
+        return self.executor.submit(self.send, operation, args, gas, fee)
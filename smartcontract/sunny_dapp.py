@@ -20,7 +20,7 @@ from boa.blockchain.vm.Neo.Blockchain import GetHeight, GetHeader
 from boa.blockchain.vm.Neo.Action import RegisterAction
 from boa.blockchain.vm.Neo.TriggerType import Application, Verification
 from boa.blockchain.vm.Neo.Storage import GetContext, Get, Put, Delete
-from boa.code.builtins import list
+from boa.code.builtins import concat, take, substr, sha1, sha256, list
 
 
 # -------------------------------------------
@@ -33,16 +33,171 @@ OWNER = b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x
 THRESHOLD = 50
 # Threshold of relative sunshine duration percent on a given day
 
+# -------------------------------------------
+# Storage layout
+# -------------------------------------------
+
+# Agreements are stored as a single byte array with a fixed layout. Integers
+# are little endian two's complement numbers of a fixed width, the location
+# takes the remaining bytes. Settings are not copied into the agreement, it
+# refers to the settings version that was current when it was created.
+
+STATUS_INITIALIZED = 1
+STATUS_RESULT_NOTICED = 2
+STATUS_CLAIMED = 3
+STATUS_REFUNDED = 4
+
+STATUS_OFFSET = 0
+STATUS_WIDTH = 1
+SETTINGS_VERSION_OFFSET = 1
+SETTINGS_VERSION_WIDTH = 2
+CUSTOMER_OFFSET = 3
+INSURER_OFFSET = 23
+ADDRESS_WIDTH = 20
+TIMESTAMP_OFFSET = 43
+TIMESTAMP_WIDTH = 5
+UTC_OFFSET_OFFSET = 48
+UTC_OFFSET_WIDTH = 1
+AMOUNT_OFFSET = 49
+PREMIUM_OFFSET = 57
+FEE_OFFSET = 65
+VALUE_WIDTH = 8
+WEATHER_PARAM_OFFSET = 73
+WEATHER_PARAM_WIDTH = 2
+ORACLE_COST_OFFSET = 75
+INDEX_SLOT_OFFSET = 83
+INDEX_SLOT_WIDTH = 4
+LIST_SLOT_OFFSET = 87
+LOCATION_OFFSET = 91
+
+# All settings are stored in one record under SETTINGS_KEY: the oracle,
+# time_margin, min_time, max_time, the settings version, the auto prune flag
+# and the dApp name in the remaining bytes. Every change stores the record
+# under a new version as well, under SETTINGS_VERSION_PREFIX + version, which
+# is what agreements refer to.
+
+SETTINGS_ORACLE_OFFSET = 0
+SETTINGS_TIME_MARGIN_OFFSET = 20
+SETTINGS_MIN_TIME_OFFSET = 24
+SETTINGS_MAX_TIME_OFFSET = 28
+TIME_WIDTH = 4
+SETTINGS_RECORD_VERSION_OFFSET = 32
+SETTINGS_AUTO_PRUNE_OFFSET = 34
+SETTINGS_AUTO_PRUNE_WIDTH = 1
+SETTINGS_NAME_OFFSET = 35
+
+MAX_VALUE = 9223372036854775807
+# Largest amount that fits in VALUE_WIDTH bytes
+
+MAX_TIME = 2147483647
+# Largest time setting that fits in TIME_WIDTH bytes
+
+PADDING = b'\x00\x00\x00\x00\x00\x00\x00\x00'
+NEGATIVE_PADDING = b'\xff\xff\xff\xff\xff\xff\xff\xff'
+
+# Every storage key starts with the prefix of the namespace it belongs to, so
+# that a key chosen by a user for an agreement can never collide with a
+# balance, the settings or an index.
+
+AGREEMENT_PREFIX = 'a/'
+BALANCE_PREFIX = 'b/'
+SETTINGS_KEY = 's/'
+SETTINGS_VERSION_PREFIX = 's/v'
+INDEX_PREFIX = 'i/'
+ROOT_PREFIX = 'r/'
+LIST_PREFIX = 'l/'
+
+# Agreements are indexed by location and local day of the event, so that the
+# oracle can settle all agreements of a location and day at once. The index
+# of a location and day is a counter stored under
+# INDEX_PREFIX + sha1(location) + day, and the agreement keys are stored in
+# slots under that key followed by the slot number. Removed agreements leave
+# an empty slot.
+
+# All agreements are also kept in one list, so that they can be enumerated a
+# page at a time. Its length is stored under LIST_PREFIX and the agreement
+# keys under LIST_PREFIX + slot number. Deleted agreements leave an empty
+# slot.
+
+MAX_PAGE_SIZE = 100
+
+# Balances, settings, index counters and result roots are read and written
+# through a cache that lives for one invocation, so that a key that is
+# touched several times costs a single Get and a single Put. Agreement
+# records and index slots are touched at most once per invocation and go to
+# storage directly. The cache is a list of three lists: the keys, their
+# values and their state.
+
+CACHE_CLEAN = 0
+CACHE_DIRTY = 1
+CACHE_DELETED = 2
+
+DAY_WIDTH = 3
+SECONDS_PER_DAY = 86400
+
+# The counter of a location index holds the next free slot below
+# INDEX_SLOTS plus INDEX_SLOTS times the number of agreements in the index
+INDEX_SLOTS = 4294967296
+
+# Instead of noticing results per agreement, an oracle can post one Merkle
+# root per day that commits to the weather of all its locations. It is
+# stored under ROOT_PREFIX + oracle + day, followed by the oracle cost charged
+# per agreement. A leaf is sha256(0x00 + day + weather_param + location), an
+# inner node sha256(0x01 + left + right).
+
+HASH_WIDTH = 32
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+# Besides the operation names, Main accepts a binary ABI for the frequent
+# operations: a one byte opcode as operation and a single packed byte array
+# as argument. The opcodes are dispatched with a binary search, so every
+# operation is reached after the same few comparisons. Packed arguments are
+# fixed width fields, with a variable length field last:
+#
+#   agreement        customer, insurer, timestamp, utc_offset, amount,
+#                    premium, fee, key length (1 byte), key, location
+#   resultNotice     weather_param, oracle_cost, key
+#   claim            key
+#   refundAll        key
+#   deleteAgreement  key
+#   transfer         from, to, amount
+#   balance          address
+
+OP_AGREEMENT = 1
+OP_RESULT_NOTICE = 2
+OP_CLAIM = 3
+OP_REFUND_ALL = 4
+OP_DELETE_AGREEMENT = 5
+OP_TRANSFER = 6
+OP_BALANCE = 7
+
+PACKED_CUSTOMER_OFFSET = 0
+PACKED_INSURER_OFFSET = 20
+PACKED_TIMESTAMP_OFFSET = 40
+PACKED_UTC_OFFSET_OFFSET = 45
+PACKED_AMOUNT_OFFSET = 46
+PACKED_PREMIUM_OFFSET = 54
+PACKED_FEE_OFFSET = 62
+PACKED_KEY_LENGTH_OFFSET = 70
+PACKED_KEY_OFFSET = 71
+PACKED_ORACLE_COST_OFFSET = 2
+PACKED_NOTICE_KEY_OFFSET = 10
+PACKED_RECEIVER_OFFSET = 20
+PACKED_TRANSFER_AMOUNT_OFFSET = 40
+
 # -------------------------------------------
 # Events
 # -------------------------------------------
 
-DispatchAgreementEvent = RegisterAction('agreement', 'agreement_key')
+DispatchAgreementEvent = RegisterAction('agreement', 'agreement_key', 'agreement_data')
 DispatchResultNoticeEvent = RegisterAction('result-notice', 'agreement_key', 'weather_param', 'oracle_cost')
 DispatchClaimEvent = RegisterAction('pay-out', 'agreement_key')
 DispatchTransferEvent = RegisterAction('transfer', 'from', 'to', 'amount')
 DispatchRefundAllEvent = RegisterAction('refund-all', 'agreement_key')
 DispatchDeleteAgreementEvent = RegisterAction('delete', 'agreement_key')
+DispatchResultRootEvent = RegisterAction('result-root', 'oracle', 'day', 'root', 'oracle_cost')
+DispatchArchiveEvent = RegisterAction('archive', 'agreement_key', 'agreement_data')
 
 
 def Main(operation, args):
@@ -72,6 +227,19 @@ def Main(operation, args):
 
     elif trigger == Application():
 
+        # Storage reads and writes of shared keys go through the cache, which
+        # is written back once the operation is done
+        cache = NewCache()
+        result = 'unknown operation'
+
+        if len(operation) == 1:
+            if len(args) == 1:
+                result = DispatchOpcode(cache, operation, args[0])
+                Flush(cache)
+                return result
+
+            return False
+
         if operation == 'deploy':
             if len(args) == 6:
                 dapp_name = args[0]
@@ -80,69 +248,72 @@ def Main(operation, args):
                 min_time = args[3]
                 max_time = args[4]
                 fee = args[5]
-                d = Deploy(dapp_name, oracle, time_margin, min_time, max_time)
+                d = Deploy(cache, dapp_name, oracle, time_margin, min_time, max_time)
 
                 Log("Dapp deployed")
-                return d
+                result = d
             else:
                 return False
 
         elif operation == 'name':
-            context = GetContext()
-            n = Get(context, 'dapp_name')
-            return n
+            settings = CacheGet(cache, SETTINGS_KEY)
+            result = substr(settings, SETTINGS_NAME_OFFSET, len(settings) - SETTINGS_NAME_OFFSET)
+
+        elif operation == 'settings':
+            settings = CacheGet(cache, SETTINGS_KEY)
+            result = GetSettings(settings)
+
+        elif operation == 'updateAutoPrune':
+            if len(args) == 1:
+                auto_prune = args[0]
+                result = UpdateAutoPrune(cache, auto_prune)
+
+            else:
+                return False
 
         elif operation == 'updateName':
             if len(args) == 1:
                 new_name = args[0]
-                n = UpdateName(new_name)
+                n = UpdateName(cache, new_name)
                 Log("Name updated")
-                return n
+                result = n
 
             else:
                 return False
 
         elif operation == 'oracle':
-            context = GetContext()
-            o = Get(context, 'oracle')
-
-            return o
+            settings = CacheGet(cache, SETTINGS_KEY)
+            result = GetField(settings, SETTINGS_ORACLE_OFFSET, ADDRESS_WIDTH)
 
         elif operation == 'updateOracle':
             if len(args) == 1:
                 new_oracle = args[0]
-                o = UpdateOracle(new_oracle)
+                o = UpdateOracle(cache, new_oracle)
                 Log("Oracle updated")
-                return o
+                result = o
 
             else:
                 return False
 
         elif operation == 'time_margin':
-            context = GetContext()
-            time_margin = Get(context, 'time_margin')
-
-            return time_margin
+            settings = CacheGet(cache, SETTINGS_KEY)
+            result = GetField(settings, SETTINGS_TIME_MARGIN_OFFSET, TIME_WIDTH)
 
         elif operation == 'min_time':
-            context = GetContext()
-            min_time = Get(context, 'min_time')
-
-            return min_time
+            settings = CacheGet(cache, SETTINGS_KEY)
+            result = GetField(settings, SETTINGS_MIN_TIME_OFFSET, TIME_WIDTH)
 
         elif operation == 'max_time':
-            context = GetContext()
-            max_time = Get(context, 'max_time')
-
-            return max_time
+            settings = CacheGet(cache, SETTINGS_KEY)
+            result = GetField(settings, SETTINGS_MAX_TIME_OFFSET, TIME_WIDTH)
 
         elif operation == 'updateTimeLimits':
             if len(args) == 2:
                 time_variable = args[0]
                 value = args[1]
-                t = UpdateTimeLimits(time_variable, value)
+                t = UpdateTimeLimits(cache, time_variable, value)
                 Log("Time limits updated")
-                return t
+                result = t
 
             else:
                 return False
@@ -159,10 +330,22 @@ def Main(operation, args):
                 premium = args[7]
                 dapp_name = args[8]
                 fee = args[9]
-                a = Agreement(agreement_key, customer, insurer, location, timestamp, utc_offset, amount, premium, dapp_name, fee)
+                a = Agreement(cache, agreement_key, customer, insurer, location, timestamp, utc_offset, amount, premium, dapp_name, fee)
 
                 Log("Agreement added!")
-                return a
+                result = a
+
+            else:
+                return False
+
+        elif operation == 'agreementBatch':
+            if len(args) == 2:
+                dapp_name = args[0]
+                agreements = args[1]
+                a = AgreementBatch(cache, dapp_name, agreements)
+
+                Log("Agreements added!")
+                result = a
 
             else:
                 return False
@@ -172,7 +355,50 @@ def Main(operation, args):
                 agreement_key = args[0]
                 weather_param = args[1]
                 oracle_cost = args[2]
-                return ResultNotice(agreement_key, weather_param, oracle_cost)
+                result = ResultNotice(cache, agreement_key, weather_param, oracle_cost)
+
+            else:
+                return False
+
+        elif operation == 'resultNoticeByLocation':
+            if len(args) == 6:
+                location = args[0]
+                day = args[1]
+                weather_param = args[2]
+                oracle_cost = args[3]
+                start = args[4]
+                count = args[5]
+                result = ResultNoticeByLocation(cache, location, day, weather_param, oracle_cost, start, count)
+
+            else:
+                return False
+
+        elif operation == 'locationIndexSize':
+            if len(args) == 2:
+                location = args[0]
+                day = args[1]
+                result = CacheGet(cache, LocationIndexKey(location, day)) % INDEX_SLOTS
+
+            else:
+                return False
+
+        elif operation == 'agreements':
+            if len(args) == 3:
+                status = args[0]
+                cursor = args[1]
+                page_size = args[2]
+                result = ListAgreements(cache, status, cursor, page_size)
+
+            else:
+                return False
+
+        elif operation == 'agreementCount':
+            result = CacheGet(cache, LIST_PREFIX)
+
+        elif operation == 'balance':
+            if len(args) == 1:
+                address = args[0]
+                result = CacheGet(cache, BalanceKey(address))
 
             else:
                 return False
@@ -180,7 +406,43 @@ def Main(operation, args):
         elif operation == 'claim':
             if len(args) == 1:
                 agreement_key = args[0]
-                return Claim(agreement_key)
+                result = Claim(cache, agreement_key)
+
+            else:
+                return False
+
+        elif operation == 'claimBatch':
+            if len(args) == 1:
+                agreement_keys = args[0]
+                result = ClaimBatch(cache, agreement_keys)
+
+            else:
+                return False
+
+        elif operation == 'postResultRoot':
+            if len(args) == 3:
+                day = args[0]
+                root = args[1]
+                oracle_cost = args[2]
+                result = PostResultRoot(cache, day, root, oracle_cost, 0)
+
+            elif len(args) == 4:
+                day = args[0]
+                root = args[1]
+                oracle_cost = args[2]
+                version = args[3]
+                result = PostResultRoot(cache, day, root, oracle_cost, version)
+
+            else:
+                return False
+
+        elif operation == 'claimWithProof':
+            if len(args) == 4:
+                agreement_key = args[0]
+                weather_param = args[1]
+                leaf_index = args[2]
+                proof = args[3]
+                result = ClaimWithProof(cache, agreement_key, weather_param, leaf_index, proof)
 
             else:
                 return False
@@ -190,7 +452,7 @@ def Main(operation, args):
                 t_from = args[0]
                 t_to = args[1]
                 t_amount = args[2]
-                return DoTransfer(t_from, t_to, t_amount)
+                result = DoTransfer(cache, t_from, t_to, t_amount)
 
             else:
                 return False
@@ -198,7 +460,7 @@ def Main(operation, args):
         elif operation == 'refundAll':
             if len(args) == 1:
                 agreement_key = args[0]
-                return RefundAll(agreement_key)
+                result = RefundAll(cache, agreement_key)
 
             else:
                 return False
@@ -206,22 +468,99 @@ def Main(operation, args):
         elif operation == 'deleteAgreement':
             if len(args) == 1:
                 agreement_key = args[0]
-                return DeleteAgreement(agreement_key)
+                result = DeleteAgreement(cache, agreement_key)
 
             else:
                 return False
 
-        result = 'unknown operation'
+        elif operation == 'pruneBatch':
+            if len(args) == 1:
+                agreement_keys = args[0]
+                result = PruneBatch(cache, agreement_keys)
+
+            else:
+                return False
+
+        Flush(cache)
 
         return result
 
     return False
 
 
-def Deploy(dapp_name, oracle, time_margin, min_time, max_time):
+def DispatchOpcode(cache, opcode, packed):
+    """
+    Method to run an operation of the binary ABI
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param opcode: the opcode of the operation
+    :type opcode: int
+
+    :param packed: the packed arguments of the operation
+    :type packed: bytearray
+
+    :return: the result of the operation
+    """
+
+    if opcode < OP_REFUND_ALL:
+
+        if opcode < OP_RESULT_NOTICE:
+
+            if opcode == OP_AGREEMENT:
+                customer = substr(packed, PACKED_CUSTOMER_OFFSET, ADDRESS_WIDTH)
+                insurer = substr(packed, PACKED_INSURER_OFFSET, ADDRESS_WIDTH)
+                timestamp = substr(packed, PACKED_TIMESTAMP_OFFSET, TIMESTAMP_WIDTH)
+                utc_offset = substr(packed, PACKED_UTC_OFFSET_OFFSET, UTC_OFFSET_WIDTH)
+                amount = substr(packed, PACKED_AMOUNT_OFFSET, VALUE_WIDTH)
+                premium = substr(packed, PACKED_PREMIUM_OFFSET, VALUE_WIDTH)
+                fee = substr(packed, PACKED_FEE_OFFSET, VALUE_WIDTH)
+                key_length = substr(packed, PACKED_KEY_LENGTH_OFFSET, 1)
+                agreement_key = substr(packed, PACKED_KEY_OFFSET, key_length)
+                location_offset = PACKED_KEY_OFFSET + key_length
+                location = substr(packed, location_offset, len(packed) - location_offset)
+
+                return Agreement(cache, agreement_key, customer, insurer, location, timestamp, utc_offset, amount,
+                                 premium, '', fee)
+
+        elif opcode == OP_RESULT_NOTICE:
+            weather_param = substr(packed, 0, WEATHER_PARAM_WIDTH)
+            oracle_cost = substr(packed, PACKED_ORACLE_COST_OFFSET, VALUE_WIDTH)
+            agreement_key = substr(packed, PACKED_NOTICE_KEY_OFFSET, len(packed) - PACKED_NOTICE_KEY_OFFSET)
+
+            return ResultNotice(cache, agreement_key, weather_param, oracle_cost)
+
+        else:
+            return Claim(cache, packed)
+
+    elif opcode < OP_TRANSFER:
+
+        if opcode == OP_REFUND_ALL:
+            return RefundAll(cache, packed)
+
+        return DeleteAgreement(cache, packed)
+
+    elif opcode == OP_TRANSFER:
+        sender = substr(packed, 0, ADDRESS_WIDTH)
+        receiver = substr(packed, PACKED_RECEIVER_OFFSET, ADDRESS_WIDTH)
+        amount = substr(packed, PACKED_TRANSFER_AMOUNT_OFFSET, len(packed) - PACKED_TRANSFER_AMOUNT_OFFSET)
+
+        return DoTransfer(cache, sender, receiver, amount)
+
+    elif opcode == OP_BALANCE:
+        return CacheGet(cache, BalanceKey(packed))
+
+    return 'unknown operation'
+
+
+def Deploy(cache, dapp_name, oracle, time_margin, min_time, max_time):
     """
     Method for the dApp owner initiate settings in storage
 
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
     :param dapp_name: name of the dapp
     :type dapp_name: str
 
@@ -245,35 +584,38 @@ def Deploy(dapp_name, oracle, time_margin, min_time, max_time):
         Log("Must be owner to deploy dApp")
         return False
 
-    context = GetContext()
-    Put(context, 'dapp_name', dapp_name)
-    Put(context, 'oracle', oracle)
+    if len(oracle) != ADDRESS_WIDTH:
+        Log("oracle must be a script hash")
+        return False
 
     if time_margin < 0:
         Log("time_margin must be positive")
         return False
 
-    Put(context, 'time_margin', time_margin)
+    if max_time > MAX_TIME:
+        Log("max_time is too large")
+        return False
 
     if min_time < 3600 + time_margin:
         Log("min_time must be greater than 3600 + time_margin")
         return False
 
-    Put(context, 'min_time', min_time)
-
     if max_time <= (min_time + time_margin):
         Log("max_time must be greather than min_time + time_margin")
         return False
 
-    Put(context, 'max_time', max_time)
+    SaveSettings(cache, oracle, time_margin, min_time, max_time, 0, dapp_name)
 
     return True
 
 
-def UpdateName(new_name):
+def UpdateName(cache, new_name):
     """
     Method for the dApp owner to update the dapp name
 
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
     :param new_name: new name of the dapp
     :type new_name: str
 
@@ -285,16 +627,30 @@ def UpdateName(new_name):
         Log("Must be owner to update name")
         return False
 
-    context = GetContext()
-    Put(context, 'dapp_name', new_name)
+    settings = CacheGet(cache, SETTINGS_KEY)
+
+    if not settings:
+        Log("Must first deploy contract with the deploy operation")
+        return False
+
+    oracle = GetField(settings, SETTINGS_ORACLE_OFFSET, ADDRESS_WIDTH)
+    time_margin = GetField(settings, SETTINGS_TIME_MARGIN_OFFSET, TIME_WIDTH)
+    min_time = GetField(settings, SETTINGS_MIN_TIME_OFFSET, TIME_WIDTH)
+    max_time = GetField(settings, SETTINGS_MAX_TIME_OFFSET, TIME_WIDTH)
+    auto_prune = GetField(settings, SETTINGS_AUTO_PRUNE_OFFSET, SETTINGS_AUTO_PRUNE_WIDTH)
+
+    SaveSettings(cache, oracle, time_margin, min_time, max_time, auto_prune, new_name)
 
     return True
 
 
-def UpdateOracle(new_oracle):
+def UpdateOracle(cache, new_oracle):
     """
     Method for the dApp owner to update oracle that is used to signal events
 
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
     :param new_name: new oracle for the dapp
     :type new_name: bytearray
 
@@ -306,16 +662,34 @@ def UpdateOracle(new_oracle):
         Log("Must be owner to update oracle")
         return False
 
-    context = GetContext()
-    Put(context, 'oracle', new_oracle)
+    if len(new_oracle) != ADDRESS_WIDTH:
+        Log("oracle must be a script hash")
+        return False
+
+    settings = CacheGet(cache, SETTINGS_KEY)
+
+    if not settings:
+        Log("Must first deploy contract with the deploy operation")
+        return False
+
+    time_margin = GetField(settings, SETTINGS_TIME_MARGIN_OFFSET, TIME_WIDTH)
+    min_time = GetField(settings, SETTINGS_MIN_TIME_OFFSET, TIME_WIDTH)
+    max_time = GetField(settings, SETTINGS_MAX_TIME_OFFSET, TIME_WIDTH)
+    auto_prune = GetField(settings, SETTINGS_AUTO_PRUNE_OFFSET, SETTINGS_AUTO_PRUNE_WIDTH)
+    dapp_name = substr(settings, SETTINGS_NAME_OFFSET, len(settings) - SETTINGS_NAME_OFFSET)
+
+    SaveSettings(cache, new_oracle, time_margin, min_time, max_time, auto_prune, dapp_name)
 
     return True
 
 
-def UpdateTimeLimits(time_variable, value):
+def UpdateTimeLimits(cache, time_variable, value):
     """
     Method for the dApp owner to update the time limits
 
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
     :param time_variable: the name of the time variable to change
     :type time_variable: str
 
@@ -334,262 +708,1582 @@ def UpdateTimeLimits(time_variable, value):
         Log("Time limit value must be positive")
         return False
 
-    context = GetContext()
+    if value > MAX_TIME:
+        Log("Time limit value is too large")
+        return False
+
+    settings = CacheGet(cache, SETTINGS_KEY)
+
+    if not settings:
+        Log("Must first deploy contract with the deploy operation")
+        return False
+
+    oracle = GetField(settings, SETTINGS_ORACLE_OFFSET, ADDRESS_WIDTH)
+    time_margin = GetField(settings, SETTINGS_TIME_MARGIN_OFFSET, TIME_WIDTH)
+    min_time = GetField(settings, SETTINGS_MIN_TIME_OFFSET, TIME_WIDTH)
+    max_time = GetField(settings, SETTINGS_MAX_TIME_OFFSET, TIME_WIDTH)
+    auto_prune = GetField(settings, SETTINGS_AUTO_PRUNE_OFFSET, SETTINGS_AUTO_PRUNE_WIDTH)
+    dapp_name = substr(settings, SETTINGS_NAME_OFFSET, len(settings) - SETTINGS_NAME_OFFSET)
 
     if time_variable == 'time_margin':
         time_margin = value
-        Put(context, 'time_margin', time_margin)
 
     elif time_variable == 'min_time':
         min_time = value
-        Put(context, 'min_time', min_time)
 
     elif time_variable == 'max_time':
         max_time = value
-        Put(context, 'max_time', max_time)
 
     else:
         Log("Time variable name not existing")
         return False
 
+    SaveSettings(cache, oracle, time_margin, min_time, max_time, auto_prune, dapp_name)
+
     return True
 
 
-def Agreement(agreement_key, customer, insurer, location, timestamp, utc_offset, amount, premium, dapp_name, fee):
+def UpdateAutoPrune(cache, auto_prune):
+    """
+    Method for the dApp owner to turn the automatic removal of settled
+    agreements on or off. When it is on, an agreement is archived and
+    removed from storage as soon as it is claimed or refunded.
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
 
+    :param auto_prune: whether to remove settled agreements automatically
+    :type auto_prune: bool
+
+    :return: whether the update succeeded
+    :rtype: bool
     """
-    Method to create an agreement
 
-    :param agreement_key: unique identifier for the agreement
-    :type agreement_key: str
+    if not CheckWitness(OWNER):
+        Log("Must be owner to update auto prune")
+        return False
 
-    :param customer: customer party of the agreement
-    :type customer: bytearray
+    settings = CacheGet(cache, SETTINGS_KEY)
 
-    :param insurer: insurer party of the agreement
-    :type insurer: bytearray
+    if not settings:
+        Log("Must first deploy contract with the deploy operation")
+        return False
 
-    :param location: location were the event occurs, typically a city
-    :type location: str
+    oracle = GetField(settings, SETTINGS_ORACLE_OFFSET, ADDRESS_WIDTH)
+    time_margin = GetField(settings, SETTINGS_TIME_MARGIN_OFFSET, TIME_WIDTH)
+    min_time = GetField(settings, SETTINGS_MIN_TIME_OFFSET, TIME_WIDTH)
+    max_time = GetField(settings, SETTINGS_MAX_TIME_OFFSET, TIME_WIDTH)
+    dapp_name = substr(settings, SETTINGS_NAME_OFFSET, len(settings) - SETTINGS_NAME_OFFSET)
 
-    :param timestamp: timezone naive datetime of the day of the event
-    :type timestamp: int
+    if auto_prune:
+        SaveSettings(cache, oracle, time_margin, min_time, max_time, 1, dapp_name)
 
-    :param utc_offset: positive or negative utc_offset for timestamp
-    :type utc_offset: int
+    else:
+        SaveSettings(cache, oracle, time_margin, min_time, max_time, 0, dapp_name)
 
-    :param amount: the insured amount of NEO
-    :type amount: int
+    return True
 
-    :param premium: the amount of NEO to be paid as a premium to the insurer
-    :type premium: int
 
-    :param dapp_name: the name of the dApp
-    :type dapp_name: str
+def SaveSettings(cache, oracle, time_margin, min_time, max_time, auto_prune, dapp_name):
+    """
+    Method to store the settings as the current settings and as a new
+    settings version, which new agreements will refer to
 
-    :param fee: the fee to be charged
-    :type fee: int
+    :param cache: the storage cache of the invocation
+    :type cache: list
 
-    :return: whether the agreement was successful
-    :rtype: bool
+    :param oracle: oracle that is used
+    :type oracle: bytearray
+
+    :param time_margin: time margin in seconds
+    :type time_margin: int
+
+    :param min_time: minimum time until the datetime of the event in seconds
+    :type min_time: int
+
+    :param max_time: max_time until the datetime of the event in seconds
+    :type max_time: int
+
+    :param auto_prune: 1 to remove settled agreements automatically, else 0
+    :type auto_prune: int
+
+    :param dapp_name: name of the dapp
+    :type dapp_name: str
+
+    :return: the new settings version
+    :rtype: int
     """
 
-    if not CheckWitness(OWNER):
-        Log("Must be owner to add an agreement")
-        return False
+    previous = CacheGet(cache, SETTINGS_KEY)
+    version = GetField(previous, SETTINGS_RECORD_VERSION_OFFSET, SETTINGS_VERSION_WIDTH) + 1
+    packed_version = PackInt(version, SETTINGS_VERSION_WIDTH)
 
-    # Check if the contract is deployed
-    context = GetContext()
-    if not Get(context, dapp_name):
-        Log("Must first deploy contract with the deploy operation")
-        return False
+    settings = concat(oracle, PackInt(time_margin, TIME_WIDTH))
+    settings = concat(settings, PackInt(min_time, TIME_WIDTH))
+    settings = concat(settings, PackInt(max_time, TIME_WIDTH))
+    settings = concat(settings, packed_version)
+    settings = concat(settings, PackInt(auto_prune, SETTINGS_AUTO_PRUNE_WIDTH))
+    settings = concat(settings, dapp_name)
 
-    # Get timestamp of current block
-    currentHeight = GetHeight()
-    currentBlock = GetHeader(currentHeight)
-    current_time = currentBlock.Timestamp
+    CachePut(cache, SETTINGS_KEY, settings)
+    CachePut(cache, concat(SETTINGS_VERSION_PREFIX, packed_version), settings)
 
-    # Compute timezone adjusted time
-    timezone_timestamp = timestamp + (utc_offset * 3600)
-    timezone_current_time = current_time + (utc_offset * 3600)
+    return version
 
-    # Get contract settings
-    dapp_name = Get(context, 'dapp_name')
-    oracle = Get(context, 'oracle')
-    time_margin = Get(context, 'time_margin')
-    min_time = Get(context, 'min_time')
-    max_time = Get(context, 'max_time')
 
-    # Check if timestamp is not out of boundaries
-    if timezone_timestamp < (timezone_current_time + min_time - time_margin):
-        Log("Datetime must be > 1 day ahead")
-        return False
+def GetSettings(settings):
+    """
+    Method to unpack the settings record
 
-    elif timezone_timestamp > (timezone_current_time + max_time + time_margin):
-        Log("Datetime must be < 30 days ahead")
-        return False
+    :param settings: the settings record
+    :type settings: bytearray
 
-    # Check if amount and premium are not zero or below
-    if amount <= 0:
-        Log("Insured amount is zero or negative")
-        return False
+    :return: the dapp name, oracle, time_margin, min_time, max_time,
+    settings version and auto prune flag
+    :rtype: list
+    """
 
-    if premium <= 0:
-        Log("Premium is zero or negative")
-        return False
+    result = list(length=7)
+    result[0] = substr(settings, SETTINGS_NAME_OFFSET, len(settings) - SETTINGS_NAME_OFFSET)
+    result[1] = GetField(settings, SETTINGS_ORACLE_OFFSET, ADDRESS_WIDTH)
+    result[2] = GetField(settings, SETTINGS_TIME_MARGIN_OFFSET, TIME_WIDTH)
+    result[3] = GetField(settings, SETTINGS_MIN_TIME_OFFSET, TIME_WIDTH)
+    result[4] = GetField(settings, SETTINGS_MAX_TIME_OFFSET, TIME_WIDTH)
+    result[5] = GetField(settings, SETTINGS_RECORD_VERSION_OFFSET, SETTINGS_VERSION_WIDTH)
+    result[6] = GetField(settings, SETTINGS_AUTO_PRUNE_OFFSET, SETTINGS_AUTO_PRUNE_WIDTH)
 
-    status = 'initialized'
+    return result
 
-    # Set place holder variables
-    weather_param = 0
-    oracle_cost = 0
 
-    agreement_data = [customer, insurer, location, timestamp, utc_offset, amount, premium, fee, oracle, time_margin, min_time, max_time, status, weather_param, oracle_cost]
+def GetSettingsOracle(cache, agreement_data):
+    """
+    Method to look up the oracle of the settings version an agreement refers to
 
-    Put(context, agreement_key, agreement_data)
+    :param cache: the storage cache of the invocation
+    :type cache: list
 
-    DispatchAgreementEvent(agreement_key)
+    :param agreement_data: the agreement record
+    :type agreement_data: bytearray
 
-    return True
+    :return: the oracle of the agreement
+    :rtype: bytearray
+    """
 
+    version = GetField(agreement_data, SETTINGS_VERSION_OFFSET, SETTINGS_VERSION_WIDTH)
+    settings = CacheGet(cache, concat(SETTINGS_VERSION_PREFIX, version))
 
-def ResultNotice(agreement_key, weather_param, oracle_cost):
+    return GetField(settings, SETTINGS_ORACLE_OFFSET, ADDRESS_WIDTH)
+
+
+def AgreementKey(agreement_key):
     """
-    Method to signal resulte by oracle
+    Method to compute the storage key of an agreement record
 
     :param agreement_key: the key of the agreement
     :type agreement_key: bytearray
 
-    :param weather_param: weather parameter that the contract is depending on
-    :type weather_param: int
+    :return: the storage key
+    :rtype: bytearray
+    """
 
-    :param oracle_cost: costs made by the oracle to do this assignment
-    :type oracle_cost: int
+    return concat(AGREEMENT_PREFIX, agreement_key)
 
-    :return: whether a pay out to the customer is done
-    :rtype: bool
+
+def BalanceKey(address):
     """
+    Method to compute the storage key of the balance of an address
 
-    # Check if the method is triggered by the oracle for this agreement
-    context = GetContext()
-    agreement_data = Get(context, agreement_key)
-    oracle = agreement_data[8]
+    :param address: the script hash of the account
+    :type address: bytearray
 
-    if not CheckWitness(oracle):
-        Log("Must be oracle to notice results")
-        return False
+    :return: the storage key
+    :rtype: bytearray
+    """
 
-    timestamp = agreement_data[3]
-    utc_offset = agreement_data[4]
-    status = agreement_data[12]
+    return concat(BALANCE_PREFIX, address)
 
-    if not status == 'initialized':
-        Log("Contract has incorrect status to do a result notice")
-        return False
 
-    agreement_data[12] = 'result-noticed'
-    agreement_data[13] = weather_param
-    agreement_data[14] = oracle_cost
+def PackInt(value, width):
+    """
+    Method to encode an integer as a fixed width little endian byte array
 
-    # Get timestamp of current block
-    currentHeight = GetHeight()
-    currentBlock = GetHeader(currentHeight)
-    current_time = currentBlock.Timestamp
+    :param value: the integer to encode
+    :type value: int
 
-    Put(context, agreement_key, agreement_data)
+    :param width: the number of bytes
+    :type width: int
 
-    timezone_timestamp = timestamp + (3600 * utc_offset)
-    timezone_current_time = current_time + (3600 * utc_offset)
+    :return: the encoded integer
+    :rtype: bytearray
+    """
 
-    if timezone_current_time < timezone_timestamp:
-        Log("Datetime of result notice is lower than agreed datetime")
-        return False
+    if value < 0:
+        data = concat(value, NEGATIVE_PADDING)
     else:
-        DispatchResultNoticeEvent(agreement_key, weather_param, oracle_cost)
-        return True
+        data = concat(value, PADDING)
 
+    return take(data, width)
 
-def Claim(agreement_key):
+
+def GetField(record, offset, width):
     """
-    Method to handle the pay out
+    Method to read a field of a fixed layout record
 
-    :param agreement_key: the key of the agreement
-    :type agreement_key: bytearray
+    :param record: the record
+    :type record: bytearray
 
-    :return: whether a pay out to the customer is done
-    :rtype: bool
+    :param offset: the offset of the field
+    :type offset: int
+
+    :param width: the width of the field
+    :type width: int
+
+    :return: the field
+    :rtype: bytearray
     """
 
-    context = GetContext()
-    agreement_data = Get(context, agreement_key)
-    customer = agreement_data[0]
-    insurer = agreement_data[1]
-    oracle = agreement_data[8]
-    status = agreement_data[12]
-    amount = agreement_data[5]
-    premium = agreement_data[6]
-    fee = agreement_data[7]
-    weather_param = agreement_data[13]
-    oracle_cost = agreement_data[14]
+    return substr(record, offset, width)
 
-    # Check if the pay out is triggered by the owner, customer, or insurer.
-    valid_witness = False
 
-    if CheckWitness(OWNER):
-        valid_witness = True
+def SetField(record, offset, width, value):
+    """
+    Method to replace an integer field of a fixed layout record
 
-    elif CheckWitness(customer):
-        valid_witness = True
+    :param record: the record
+    :type record: bytearray
 
-    elif CheckWitness(insurer):
-        valid_witness = True
+    :param offset: the offset of the field
+    :type offset: int
 
-    if not valid_witness:
-        Log("Must be owner, customer or insurer to claim")
-        return False
+    :param width: the width of the field
+    :type width: int
+
+    :param value: the new value of the field
+    :type value: int
+
+    :return: the updated record
+    :rtype: bytearray
+    """
+
+    head = take(record, offset)
+    tail_offset = offset + width
+    tail = substr(record, tail_offset, len(record) - tail_offset)
+
+    record = concat(head, PackInt(value, width))
+
+    return concat(record, tail)
+
+
+def NewCache():
+    """
+    Method to create the storage cache of an invocation
+
+    :return: the empty cache
+    :rtype: list
+    """
+
+    keys = []
+    values = []
+    states = []
+
+    cache = [keys, values, states]
+
+    return cache
+
+
+def CacheFind(cache, key):
+    """
+    Method to find the position of a key in the cache
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param key: the storage key
+    :type key: bytearray
+
+    :return: the position of the key, or -1 if it is not cached
+    :rtype: int
+    """
+
+    keys = cache[0]
+
+    i = 0
+    for cached_key in keys:
+        if cached_key == key:
+            return i
+        i = i + 1
+
+    return -1
+
+
+def CacheGet(cache, key):
+    """
+    Method to read a key through the cache
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param key: the storage key
+    :type key: bytearray
+
+    :return: the value of the key
+    :rtype: bytearray
+    """
+
+    values = cache[1]
+
+    i = CacheFind(cache, key)
+    if i >= 0:
+        return values[i]
+
+    context = GetContext()
+    value = Get(context, key)
+
+    keys = cache[0]
+    states = cache[2]
+    keys.append(key)
+    values.append(value)
+    states.append(CACHE_CLEAN)
+
+    return value
+
+
+def CacheSet(cache, key, value, state):
+    """
+    Method to change a key in the cache
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param key: the storage key
+    :type key: bytearray
+
+    :param value: the new value
+    :type value: bytearray
+
+    :param state: CACHE_DIRTY or CACHE_DELETED
+    :type state: int
+    """
+
+    values = cache[1]
+    states = cache[2]
+
+    i = CacheFind(cache, key)
+    if i >= 0:
+        values[i] = value
+        states[i] = state
+
+    else:
+        keys = cache[0]
+        keys.append(key)
+        values.append(value)
+        states.append(state)
+
+
+def CachePut(cache, key, value):
+    """
+    Method to write a key through the cache
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param key: the storage key
+    :type key: bytearray
+
+    :param value: the new value
+    :type value: bytearray
+    """
+
+    CacheSet(cache, key, value, CACHE_DIRTY)
+
+
+def CacheDelete(cache, key):
+    """
+    Method to delete a key through the cache
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param key: the storage key
+    :type key: bytearray
+    """
+
+    CacheSet(cache, key, 0, CACHE_DELETED)
+
+
+def Flush(cache):
+    """
+    Method to write the final value of every changed key back to storage
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+    """
+
+    context = GetContext()
+    keys = cache[0]
+    values = cache[1]
+    states = cache[2]
+
+    i = 0
+    for key in keys:
+        state = states[i]
+
+        if state == CACHE_DIRTY:
+            Put(context, key, values[i])
+
+        elif state == CACHE_DELETED:
+            Delete(context, key)
+
+        i = i + 1
+
+
+def Agreement(cache, agreement_key, customer, insurer, location, timestamp, utc_offset, amount, premium, dapp_name, fee):
+
+    """
+    Method to create an agreement
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param agreement_key: unique identifier for the agreement
+    :type agreement_key: str
+
+    :param customer: customer party of the agreement
+    :type customer: bytearray
+
+    :param insurer: insurer party of the agreement
+    :type insurer: bytearray
+
+    :param location: location were the event occurs, typically a city
+    :type location: str
+
+    :param timestamp: timezone naive datetime of the day of the event
+    :type timestamp: int
+
+    :param utc_offset: positive or negative utc_offset for timestamp
+    :type utc_offset: int
+
+    :param amount: the insured amount of NEO
+    :type amount: int
+
+    :param premium: the amount of NEO to be paid as a premium to the insurer
+    :type premium: int
+
+    :param dapp_name: the name of the dApp, kept for compatibility
+    :type dapp_name: str
+
+    :param fee: the fee to be charged
+    :type fee: int
+
+    :return: whether the agreement was successful
+    :rtype: bool
+    """
+
+    if not CheckWitness(OWNER):
+        Log("Must be owner to add an agreement")
+        return False
+
+    # Check if the contract is deployed
+    context = GetContext()
+    settings = CacheGet(cache, SETTINGS_KEY)
+    if not settings:
+        Log("Must first deploy contract with the deploy operation")
+        return False
+
+    # Get timestamp of current block
+    currentHeight = GetHeight()
+    currentBlock = GetHeader(currentHeight)
+    current_time = currentBlock.Timestamp
+
+    # Get contract settings
+    settings_version = GetField(settings, SETTINGS_RECORD_VERSION_OFFSET, SETTINGS_VERSION_WIDTH)
+    time_margin = GetField(settings, SETTINGS_TIME_MARGIN_OFFSET, TIME_WIDTH)
+    min_time = GetField(settings, SETTINGS_MIN_TIME_OFFSET, TIME_WIDTH)
+    max_time = GetField(settings, SETTINGS_MAX_TIME_OFFSET, TIME_WIDTH)
+
+    agreement_data = NewAgreementRecord(customer, insurer, location, timestamp, utc_offset, amount, premium, fee,
+                                        current_time, settings_version, time_margin, min_time, max_time)
+
+    if not agreement_data:
+        return False
+
+    if Get(context, AgreementKey(agreement_key)):
+        Log("Agreement already exists")
+        return False
+
+    agreement_data = IndexAgreement(cache, agreement_key, agreement_data)
+    agreement_data = ListAgreement(cache, agreement_key, agreement_data)
+    Put(context, AgreementKey(agreement_key), agreement_data)
+
+    DispatchAgreementEvent(agreement_key, agreement_data)
+
+    return True
+
+
+def AgreementBatch(cache, dapp_name, agreements):
+
+    """
+    Method to create many agreements in one invocation. The owner witness,
+    block time and settings are checked and read once for the whole batch.
+    Nothing is stored unless all agreements are valid.
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param dapp_name: the name of the dApp, kept for compatibility
+    :type dapp_name: str
+
+    :param agreements: lists with the agreement_key, customer, insurer,
+    location, timestamp, utc_offset, amount, premium and fee of an agreement
+    :type agreements: list
+
+    :return: whether the agreements were successful
+    :rtype: bool
+    """
+
+    if not CheckWitness(OWNER):
+        Log("Must be owner to add an agreement")
+        return False
+
+    # Check if the contract is deployed
+    context = GetContext()
+    settings = CacheGet(cache, SETTINGS_KEY)
+    if not settings:
+        Log("Must first deploy contract with the deploy operation")
+        return False
+
+    # Get timestamp of current block
+    currentHeight = GetHeight()
+    currentBlock = GetHeader(currentHeight)
+    current_time = currentBlock.Timestamp
+
+    # Get contract settings
+    settings_version = GetField(settings, SETTINGS_RECORD_VERSION_OFFSET, SETTINGS_VERSION_WIDTH)
+    time_margin = GetField(settings, SETTINGS_TIME_MARGIN_OFFSET, TIME_WIDTH)
+    min_time = GetField(settings, SETTINGS_MIN_TIME_OFFSET, TIME_WIDTH)
+    max_time = GetField(settings, SETTINGS_MAX_TIME_OFFSET, TIME_WIDTH)
+
+    # Validate and encode all agreements before storing any of them
+    keys = []
+    records = []
+
+    for agreement in agreements:
+        if len(agreement) != 9:
+            Log("Agreement must have 9 fields")
+            return False
+
+        customer = agreement[1]
+        insurer = agreement[2]
+        location = agreement[3]
+        timestamp = agreement[4]
+        utc_offset = agreement[5]
+        amount = agreement[6]
+        premium = agreement[7]
+        fee = agreement[8]
+
+        agreement_data = NewAgreementRecord(customer, insurer, location, timestamp, utc_offset, amount, premium, fee,
+                                            current_time, settings_version, time_margin, min_time, max_time)
+
+        if not agreement_data:
+            return False
+
+        if Get(context, AgreementKey(agreement[0])):
+            Log("Agreement already exists")
+            return False
+
+        # A key repeated in the batch would get two index and list slots
+        if ContainsKey(keys, agreement[0]):
+            Log("Agreement key repeated in batch")
+            return False
+
+        keys.append(agreement[0])
+        records.append(agreement_data)
+
+    i = 0
+    for agreement in agreements:
+        agreement_key = agreement[0]
+        agreement_data = IndexAgreement(cache, agreement_key, records[i])
+        agreement_data = ListAgreement(cache, agreement_key, agreement_data)
+        Put(context, AgreementKey(agreement_key), agreement_data)
+        DispatchAgreementEvent(agreement_key, agreement_data)
+        i = i + 1
+
+    return True
+
+
+def ContainsKey(keys, key):
+    """
+    Method to check if a list of agreement keys holds a key
+
+    :param keys: the agreement keys
+    :type keys: list
+
+    :param key: the key to look for
+    :type key: bytearray
+
+    :return: whether the key is in the list
+    :rtype: bool
+    """
+
+    for existing in keys:
+        if existing == key:
+            return True
+
+    return False
+
+
+def NewAgreementRecord(customer, insurer, location, timestamp, utc_offset, amount, premium, fee,
+                       current_time, settings_version, time_margin, min_time, max_time):
+
+    """
+    Method to validate an agreement against the settings and encode it
+
+    :param current_time: timestamp of the current block
+    :type current_time: int
+
+    :param settings_version: the current settings version
+    :type settings_version: int
+
+    :param time_margin: time margin in seconds
+    :type time_margin: int
+
+    :param min_time: minimum time until the datetime of the event in seconds
+    :type min_time: int
+
+    :param max_time: max_time until the datetime of the event in seconds
+    :type max_time: int
+
+    :return: the agreement record, or False if the agreement is invalid
+    :rtype: bytearray
+    """
+
+    # Compute timezone adjusted time
+    timezone_timestamp = timestamp + (utc_offset * 3600)
+    timezone_current_time = current_time + (utc_offset * 3600)
+
+    # Check if timestamp is not out of boundaries
+    if timezone_timestamp < (timezone_current_time + min_time - time_margin):
+        Log("Datetime must be > 1 day ahead")
+        return False
+
+    elif timezone_timestamp > (timezone_current_time + max_time + time_margin):
+        Log("Datetime must be < 30 days ahead")
+        return False
+
+    # Check if amount and premium are not zero or below
+    if amount <= 0:
+        Log("Insured amount is zero or negative")
+        return False
+
+    if premium <= 0:
+        Log("Premium is zero or negative")
+        return False
+
+    # Check if all values fit in the agreement record
+    if len(customer) != ADDRESS_WIDTH:
+        Log("customer must be a script hash")
+        return False
+
+    if len(insurer) != ADDRESS_WIDTH:
+        Log("insurer must be a script hash")
+        return False
+
+    if utc_offset < -12 or utc_offset > 14:
+        Log("utc_offset must be between -12 and 14")
+        return False
+
+    if amount > MAX_VALUE or premium > MAX_VALUE or fee > MAX_VALUE:
+        Log("Amount, premium or fee is too large")
+        return False
+
+    # Weather param and oracle cost are placeholders until the result notice
+    agreement_data = concat(PackInt(STATUS_INITIALIZED, STATUS_WIDTH), PackInt(settings_version, SETTINGS_VERSION_WIDTH))
+    agreement_data = concat(agreement_data, customer)
+    agreement_data = concat(agreement_data, insurer)
+    agreement_data = concat(agreement_data, PackInt(timestamp, TIMESTAMP_WIDTH))
+    agreement_data = concat(agreement_data, PackInt(utc_offset, UTC_OFFSET_WIDTH))
+    agreement_data = concat(agreement_data, PackInt(amount, VALUE_WIDTH))
+    agreement_data = concat(agreement_data, PackInt(premium, VALUE_WIDTH))
+    agreement_data = concat(agreement_data, PackInt(fee, VALUE_WIDTH))
+    agreement_data = concat(agreement_data, PackInt(0, WEATHER_PARAM_WIDTH))
+    agreement_data = concat(agreement_data, PackInt(0, VALUE_WIDTH))
+    agreement_data = concat(agreement_data, PackInt(0, INDEX_SLOT_WIDTH))
+    agreement_data = concat(agreement_data, PackInt(0, INDEX_SLOT_WIDTH))
+    agreement_data = concat(agreement_data, location)
+
+    return agreement_data
+
+
+def LocationIndexKey(location, day):
+    """
+    Method to compute the storage key of the index of a location and day
+
+    :param location: location were the event occurs, typically a city
+    :type location: str
+
+    :param day: local day of the event, the timestamp divided by 86400
+    :type day: int
+
+    :return: the key of the index
+    :rtype: bytearray
+    """
+
+    return concat(concat(INDEX_PREFIX, sha1(location)), PackInt(day, DAY_WIDTH))
+
+
+def IndexAgreement(cache, agreement_key, agreement_data):
+    """
+    Method to add an agreement to the index of its location and day
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param agreement_key: the key of the agreement
+    :type agreement_key: bytearray
+
+    :param agreement_data: the agreement record
+    :type agreement_data: bytearray
+
+    :return: the agreement record with its index slot set
+    :rtype: bytearray
+    """
+
+    location = substr(agreement_data, LOCATION_OFFSET, len(agreement_data) - LOCATION_OFFSET)
+    timestamp = GetField(agreement_data, TIMESTAMP_OFFSET, TIMESTAMP_WIDTH)
+    day = timestamp // SECONDS_PER_DAY
+
+    index_key = LocationIndexKey(location, day)
+    counter = CacheGet(cache, index_key)
+    slot = counter % INDEX_SLOTS
+    CachePut(cache, index_key, counter + INDEX_SLOTS + 1)
+
+    context = GetContext()
+    Put(context, concat(index_key, PackInt(slot, INDEX_SLOT_WIDTH)), agreement_key)
+
+    return SetField(agreement_data, INDEX_SLOT_OFFSET, INDEX_SLOT_WIDTH, slot)
+
+
+def UnindexAgreement(cache, agreement_data):
+    """
+    Method to remove an agreement from the index of its location and day.
+    The counter of the index is deleted with its last agreement, so a
+    settled location and day leaves no key behind.
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param agreement_data: the agreement record
+    :type agreement_data: bytearray
+    """
+
+    location = substr(agreement_data, LOCATION_OFFSET, len(agreement_data) - LOCATION_OFFSET)
+    timestamp = GetField(agreement_data, TIMESTAMP_OFFSET, TIMESTAMP_WIDTH)
+    day = timestamp // SECONDS_PER_DAY
+    slot = GetField(agreement_data, INDEX_SLOT_OFFSET, INDEX_SLOT_WIDTH)
+
+    index_key = LocationIndexKey(location, day)
+    counter = CacheGet(cache, index_key) - INDEX_SLOTS
+
+    if counter < INDEX_SLOTS:
+        CacheDelete(cache, index_key)
+
+    else:
+        CachePut(cache, index_key, counter)
+
+    context = GetContext()
+    Delete(context, concat(index_key, slot))
+
+
+def ListAgreement(cache, agreement_key, agreement_data):
+    """
+    Method to append an agreement to the list of all agreements
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param agreement_key: the key of the agreement
+    :type agreement_key: bytearray
+
+    :param agreement_data: the agreement record
+    :type agreement_data: bytearray
+
+    :return: the agreement record with its list slot set
+    :rtype: bytearray
+    """
+
+    slot = CacheGet(cache, LIST_PREFIX)
+    CachePut(cache, LIST_PREFIX, slot + 1)
+
+    context = GetContext()
+    Put(context, concat(LIST_PREFIX, PackInt(slot, INDEX_SLOT_WIDTH)), agreement_key)
+
+    return SetField(agreement_data, LIST_SLOT_OFFSET, INDEX_SLOT_WIDTH, slot)
+
+
+def UnlistAgreement(agreement_data):
+    """
+    Method to remove an agreement from the list of all agreements
+
+    :param agreement_data: the agreement record
+    :type agreement_data: bytearray
+    """
+
+    slot = GetField(agreement_data, LIST_SLOT_OFFSET, INDEX_SLOT_WIDTH)
+
+    context = GetContext()
+    Delete(context, concat(LIST_PREFIX, slot))
+
+
+def ListAgreements(cache, status, cursor, page_size):
+    """
+    Method to enumerate the agreements a page at a time. At most page_size
+    slots of the list are read, starting at cursor, so the cost of a call is
+    bounded whatever the number of agreements.
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param status: only return agreements with this status, 0 for all
+    :type status: int
+
+    :param cursor: the list slot to start at, 0 for the first page
+    :type cursor: int
+
+    :param page_size: the number of list slots to read
+    :type page_size: int
+
+    :return: the cursor of the next page, 0 after the last page, and the keys
+    of the matching agreements
+    :rtype: list
+    """
+
+    if page_size <= 0 or page_size > MAX_PAGE_SIZE:
+        Log("page_size must be between 1 and 100")
+        return False
+
+    context = GetContext()
+
+    end = cursor + page_size
+    size = CacheGet(cache, LIST_PREFIX)
+    if end > size:
+        end = size
+
+    keys = []
+    slot = cursor
+
+    while slot < end:
+        agreement_key = Get(context, concat(LIST_PREFIX, PackInt(slot, INDEX_SLOT_WIDTH)))
+        slot = slot + 1
+
+        if agreement_key:
+            if status == 0:
+                keys.append(agreement_key)
+
+            else:
+                agreement_data = Get(context, AgreementKey(agreement_key))
+                if GetField(agreement_data, STATUS_OFFSET, STATUS_WIDTH) == status:
+                    keys.append(agreement_key)
+
+    if slot >= size:
+        slot = 0
+
+    result = list(length=2)
+    result[0] = slot
+    result[1] = keys
+
+    return result
+
+
+def ResultNotice(cache, agreement_key, weather_param, oracle_cost):
+    """
+    Method to signal resulte by oracle
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param agreement_key: the key of the agreement
+    :type agreement_key: bytearray
+
+    :param weather_param: weather parameter that the contract is depending on
+    :type weather_param: int
+
+    :param oracle_cost: costs made by the oracle to do this assignment
+    :type oracle_cost: int
+
+    :return: whether a pay out to the customer is done
+    :rtype: bool
+    """
+
+    context = GetContext()
+    agreement_data = Get(context, AgreementKey(agreement_key))
+
+    if not agreement_data:
+        Log("Agreement does not exist")
+        return False
+
+    # Check if the method is triggered by the oracle for this agreement
+    oracle = GetSettingsOracle(cache, agreement_data)
+
+    if not CheckWitness(oracle):
+        Log("Must be oracle to notice results")
+        return False
+
+    timestamp = GetField(agreement_data, TIMESTAMP_OFFSET, TIMESTAMP_WIDTH)
+    utc_offset = GetField(agreement_data, UTC_OFFSET_OFFSET, UTC_OFFSET_WIDTH)
+    status = GetField(agreement_data, STATUS_OFFSET, STATUS_WIDTH)
+
+    if not status == STATUS_INITIALIZED:
+        Log("Contract has incorrect status to do a result notice")
+        return False
+
+    if weather_param < 0 or weather_param > 100:
+        Log("weather_param must be a percentage")
+        return False
+
+    if oracle_cost < 0 or oracle_cost > MAX_VALUE:
+        Log("oracle_cost is out of range")
+        return False
+
+    agreement_data = SetField(agreement_data, STATUS_OFFSET, STATUS_WIDTH, STATUS_RESULT_NOTICED)
+    agreement_data = SetField(agreement_data, WEATHER_PARAM_OFFSET, WEATHER_PARAM_WIDTH, weather_param)
+    agreement_data = SetField(agreement_data, ORACLE_COST_OFFSET, VALUE_WIDTH, oracle_cost)
+
+    # Get timestamp of current block
+    currentHeight = GetHeight()
+    currentBlock = GetHeader(currentHeight)
+    current_time = currentBlock.Timestamp
+
+    Put(context, AgreementKey(agreement_key), agreement_data)
+
+    timezone_timestamp = timestamp + (3600 * utc_offset)
+    timezone_current_time = current_time + (3600 * utc_offset)
+
+    if timezone_current_time < timezone_timestamp:
+        Log("Datetime of result notice is lower than agreed datetime")
+        return False
+    else:
+        DispatchResultNoticeEvent(agreement_key, weather_param, oracle_cost)
+        return True
+
+
+def ResultNoticeByLocation(cache, location, day, weather_param, oracle_cost, start, count):
+    """
+    Method to signal the result of a location and day for all agreements
+    in a range of slots of its index. Agreements that are not initialized,
+    whose event has not yet passed or that have another oracle are skipped.
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param location: location were the event occurs, typically a city
+    :type location: str
+
+    :param day: local day of the event, the timestamp divided by 86400
+    :type day: int
+
+    :param weather_param: weather parameter that the contracts are depending on
+    :type weather_param: int
+
+    :param oracle_cost: costs made by the oracle for each agreement
+    :type oracle_cost: int
+
+    :param start: the first slot of the index to notice
+    :type start: int
+
+    :param count: the number of slots to notice
+    :type count: int
+
+    :return: the number of agreements noticed
+    :rtype: int
+    """
+
+    if weather_param < 0 or weather_param > 100:
+        Log("weather_param must be a percentage")
+        return False
+
+    if oracle_cost < 0 or oracle_cost > MAX_VALUE:
+        Log("oracle_cost is out of range")
+        return False
+
+    context = GetContext()
+    index_key = LocationIndexKey(location, day)
+
+    end = start + count
+    size = CacheGet(cache, index_key) % INDEX_SLOTS
+    if end > size:
+        end = size
+
+    # Get timestamp of current block
+    currentHeight = GetHeight()
+    currentBlock = GetHeader(currentHeight)
+    current_time = currentBlock.Timestamp
+
+    # The oracle witness is only checked again when the settings version changes
+    witnessed_version = 0
+    rejected_version = 0
+
+    noticed = 0
+    slot = start
+
+    while slot < end:
+        agreement_key = Get(context, concat(index_key, PackInt(slot, INDEX_SLOT_WIDTH)))
+        slot = slot + 1
+
+        if agreement_key:
+            agreement_data = Get(context, AgreementKey(agreement_key))
+            status = GetField(agreement_data, STATUS_OFFSET, STATUS_WIDTH)
+            timestamp = GetField(agreement_data, TIMESTAMP_OFFSET, TIMESTAMP_WIDTH)
+            version = GetField(agreement_data, SETTINGS_VERSION_OFFSET, SETTINGS_VERSION_WIDTH)
+
+            valid = False
+
+            if not status == STATUS_INITIALIZED:
+                Log("Contract has incorrect status to do a result notice")
+
+            elif current_time < timestamp:
+                Log("Datetime of result notice is lower than agreed datetime")
+
+            elif version == witnessed_version:
+                valid = True
+
+            elif not version == rejected_version:
+                oracle = GetSettingsOracle(cache, agreement_data)
+                if CheckWitness(oracle):
+                    witnessed_version = version
+                    valid = True
+                else:
+                    rejected_version = version
+                    Log("Must be oracle to notice results")
+
+            if valid:
+                agreement_data = SetField(agreement_data, STATUS_OFFSET, STATUS_WIDTH, STATUS_RESULT_NOTICED)
+                agreement_data = SetField(agreement_data, WEATHER_PARAM_OFFSET, WEATHER_PARAM_WIDTH, weather_param)
+                agreement_data = SetField(agreement_data, ORACLE_COST_OFFSET, VALUE_WIDTH, oracle_cost)
+                Put(context, AgreementKey(agreement_key), agreement_data)
+
+                DispatchResultNoticeEvent(agreement_key, weather_param, oracle_cost)
+                noticed = noticed + 1
+
+    return noticed
+
+
+def Claim(cache, agreement_key):
+    """
+    Method to handle the pay out
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param agreement_key: the key of the agreement
+    :type agreement_key: bytearray
+
+    :return: whether a pay out to the customer is done
+    :rtype: bool
+    """
+
+    context = GetContext()
+    agreement_data = Get(context, AgreementKey(agreement_key))
+
+    if not agreement_data:
+        Log("Agreement does not exist")
+        return False
+
+    # Check if the pay out is triggered by the owner, customer, or insurer.
+    if not IsClaimant(agreement_data):
+        Log("Must be owner, customer or insurer to claim")
+        return False
+
+    status = GetField(agreement_data, STATUS_OFFSET, STATUS_WIDTH)
 
     # Check whether this contract has the right status to do a claim
-    if status == 'initialized':
+    if status == STATUS_INITIALIZED:
         Log("Status must be result-noticed to be able to do a claim")
         return False
 
-    elif status == 'claimed':
-        Log("Contract pay out is already claimed")
+    elif status == STATUS_CLAIMED:
+        Log("Contract pay out is already claimed")
+        return False
+
+    elif status == STATUS_REFUNDED:
+        Log("Contract is already refunded")
+        return False
+
+    return Settle(cache, agreement_key, agreement_data)
+
+
+def ClaimBatch(cache, agreement_keys):
+    """
+    Method for the owner to pay out many result-noticed agreements at once.
+    The transfers are netted per receiver: the owner balance is debited once
+    and every distinct receiver is credited once. Agreements that do not
+    exist or are not result-noticed are skipped, as are repeated keys.
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param agreement_keys: the keys of the agreements
+    :type agreement_keys: list
+
+    :return: the number of agreements paid out
+    :rtype: int
+    """
+
+    if not CheckWitness(OWNER):
+        Log("Must be owner to claim a batch")
+        return False
+
+    context = GetContext()
+
+    keys = []
+    records = []
+    receivers = []
+    credits = []
+    total = 0
+
+    # The oracle is only looked up again when the settings version changes
+    oracle_version = 0
+    oracle = 0
+
+    for agreement_key in agreement_keys:
+        agreement_data = Get(context, AgreementKey(agreement_key))
+        status = GetField(agreement_data, STATUS_OFFSET, STATUS_WIDTH)
+
+        # The records are only marked as claimed after the transfers, so a
+        # repeated key would still read as result-noticed
+        if ContainsKey(keys, agreement_key):
+            status = 0
+
+        if status == STATUS_RESULT_NOTICED:
+            customer = GetField(agreement_data, CUSTOMER_OFFSET, ADDRESS_WIDTH)
+            insurer = GetField(agreement_data, INSURER_OFFSET, ADDRESS_WIDTH)
+            amount = GetField(agreement_data, AMOUNT_OFFSET, VALUE_WIDTH)
+            premium = GetField(agreement_data, PREMIUM_OFFSET, VALUE_WIDTH)
+            fee = GetField(agreement_data, FEE_OFFSET, VALUE_WIDTH)
+            weather_param = GetField(agreement_data, WEATHER_PARAM_OFFSET, WEATHER_PARAM_WIDTH)
+            oracle_cost = GetField(agreement_data, ORACLE_COST_OFFSET, VALUE_WIDTH)
+
+            version = GetField(agreement_data, SETTINGS_VERSION_OFFSET, SETTINGS_VERSION_WIDTH)
+            if not version == oracle_version:
+                oracle = GetSettingsOracle(cache, agreement_data)
+                oracle_version = version
+
+            net_premium = premium - fee
+            total = total + AddCredit(receivers, credits, insurer, net_premium)
+
+            if weather_param < THRESHOLD:
+                total = total + AddCredit(receivers, credits, customer, amount)
+
+            total = total + AddCredit(receivers, credits, oracle, oracle_cost)
+
+            keys.append(agreement_key)
+            records.append(agreement_data)
+
+    owner_key = BalanceKey(OWNER)
+    owner_balance = CacheGet(cache, owner_key)
+
+    if owner_balance < total:
+        Log("Insufficient funds to transfer")
+        return False
+
+    if owner_balance == total:
+        CacheDelete(cache, owner_key)
+
+    else:
+        difference = owner_balance - total
+        CachePut(cache, owner_key, difference)
+
+    i = 0
+    for receiver in receivers:
+        credit = credits[i]
+        receiver_key = BalanceKey(receiver)
+        to_value = CacheGet(cache, receiver_key)
+        CachePut(cache, receiver_key, to_value + credit)
+        DispatchTransferEvent(OWNER, receiver, credit)
+        i = i + 1
+
+    auto_prune = IsAutoPrune(cache)
+
+    i = 0
+    for agreement_key in keys:
+        agreement_data = SetField(records[i], STATUS_OFFSET, STATUS_WIDTH, STATUS_CLAIMED)
+        DispatchClaimEvent(agreement_key)
+
+        if auto_prune:
+            ArchiveAgreement(cache, agreement_key, agreement_data)
+
+        else:
+            Put(context, AgreementKey(agreement_key), agreement_data)
+
+        i = i + 1
+
+    return len(keys)
+
+
+def AddCredit(receivers, credits, receiver, amount):
+    """
+    Method to add an amount to the credit of a receiver in a batch
+
+    :param receivers: the receivers of the batch
+    :type receivers: list
+
+    :param credits: the credit of every receiver
+    :type credits: list
+
+    :param receiver: the address to credit
+    :type receiver: bytearray
+
+    :param amount: the amount to credit
+    :type amount: int
+
+    :return: the amount debited from the owner for this credit
+    :rtype: int
+    """
+
+    # DoTransfer ignores transfers of nothing and transfers to the sender
+    if amount <= 0:
+        return 0
+
+    if receiver == OWNER:
+        return 0
+
+    i = 0
+    for existing in receivers:
+        if existing == receiver:
+            credits[i] = credits[i] + amount
+            return amount
+        i = i + 1
+
+    receivers.append(receiver)
+    credits.append(amount)
+
+    return amount
+
+
+def PostResultRoot(cache, day, root, oracle_cost, version):
+    """
+    Method for the oracle to commit to the weather of all its locations on a
+    day with a single Merkle root. Agreements are settled by the oracle of
+    the settings version they refer to, so after an oracle change the
+    previous oracle posts the roots of the earlier agreements by passing
+    their settings version.
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param day: the day of the observations, a timestamp divided by 86400
+    :type day: int
+
+    :param root: the Merkle root of the observations
+    :type root: bytearray
+
+    :param oracle_cost: costs made by the oracle for each agreement
+    :type oracle_cost: int
+
+    :param version: the settings version whose oracle posts the root, 0
+        for the current settings
+    :type version: int
+
+    :return: whether the root was stored
+    :rtype: bool
+    """
+
+    if version == 0:
+        settings = CacheGet(cache, SETTINGS_KEY)
+
+    else:
+        settings = CacheGet(cache, concat(SETTINGS_VERSION_PREFIX, PackInt(version, SETTINGS_VERSION_WIDTH)))
+
+    if not settings:
+        Log("Unknown settings version")
+        return False
+
+    oracle = GetField(settings, SETTINGS_ORACLE_OFFSET, ADDRESS_WIDTH)
+
+    if not CheckWitness(oracle):
+        Log("Must be oracle to post a result root")
         return False
 
-    elif status == 'refunded':
-        Log("Contract is already refunded")
+    if len(root) != HASH_WIDTH:
+        Log("root must be a sha256 hash")
+        return False
+
+    if oracle_cost < 0 or oracle_cost > MAX_VALUE:
+        Log("oracle_cost is out of range")
+        return False
+
+    root_key = concat(concat(ROOT_PREFIX, oracle), PackInt(day, DAY_WIDTH))
+
+    if CacheGet(cache, root_key):
+        Log("Result root for this day is already posted")
+        return False
+
+    CachePut(cache, root_key, concat(root, PackInt(oracle_cost, VALUE_WIDTH)))
+    DispatchResultRootEvent(oracle, day, root, oracle_cost)
+
+    return True
+
+
+def ClaimWithProof(cache, agreement_key, weather_param, leaf_index, proof):
+    """
+    Method to handle the pay out of an agreement without a result notice,
+    by proving the weather of its location and day against the result root
+    posted by its oracle
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param agreement_key: the key of the agreement
+    :type agreement_key: bytearray
+
+    :param weather_param: weather parameter of the location and day
+    :type weather_param: int
+
+    :param leaf_index: position of the observation in the Merkle tree
+    :type leaf_index: int
+
+    :param proof: sibling hashes from the leaf up to the root
+    :type proof: list
+
+    :return: whether a pay out to the customer is done
+    :rtype: bool
+    """
+
+    context = GetContext()
+    agreement_data = Get(context, AgreementKey(agreement_key))
+
+    if not agreement_data:
+        Log("Agreement does not exist")
+        return False
+
+    if not IsClaimant(agreement_data):
+        Log("Must be owner, customer or insurer to claim")
+        return False
+
+    status = GetField(agreement_data, STATUS_OFFSET, STATUS_WIDTH)
+
+    if not status == STATUS_INITIALIZED:
+        Log("Status must be initialized to claim with a proof")
+        return False
+
+    if weather_param < 0 or weather_param > 100:
+        Log("weather_param must be a percentage")
+        return False
+
+    oracle = GetSettingsOracle(cache, agreement_data)
+    location = substr(agreement_data, LOCATION_OFFSET, len(agreement_data) - LOCATION_OFFSET)
+    timestamp = GetField(agreement_data, TIMESTAMP_OFFSET, TIMESTAMP_WIDTH)
+    day = PackInt(timestamp // SECONDS_PER_DAY, DAY_WIDTH)
+
+    root_data = CacheGet(cache, concat(concat(ROOT_PREFIX, oracle), day))
+
+    if not root_data:
+        Log("No result root posted for this day")
+        return False
+
+    root = take(root_data, HASH_WIDTH)
+    oracle_cost = GetField(root_data, HASH_WIDTH, VALUE_WIDTH)
+
+    leaf = concat(day, PackInt(weather_param, WEATHER_PARAM_WIDTH))
+    leaf = concat(leaf, location)
+
+    if not VerifyProof(root, leaf, leaf_index, proof):
+        Log("Invalid proof")
+        return False
+
+    agreement_data = SetField(agreement_data, STATUS_OFFSET, STATUS_WIDTH, STATUS_RESULT_NOTICED)
+    agreement_data = SetField(agreement_data, WEATHER_PARAM_OFFSET, WEATHER_PARAM_WIDTH, weather_param)
+    agreement_data = SetField(agreement_data, ORACLE_COST_OFFSET, VALUE_WIDTH, oracle_cost)
+    DispatchResultNoticeEvent(agreement_key, weather_param, oracle_cost)
+
+    return Settle(cache, agreement_key, agreement_data)
+
+
+def VerifyProof(root, leaf, leaf_index, proof):
+    """
+    Method to verify a Merkle proof
+
+    :param root: the Merkle root
+    :type root: bytearray
+
+    :param leaf: the data of the leaf
+    :type leaf: bytearray
+
+    :param leaf_index: position of the leaf in the tree
+    :type leaf_index: int
+
+    :param proof: sibling hashes from the leaf up to the root
+    :type proof: list
+
+    :return: whether the leaf is part of the tree
+    :rtype: bool
+    """
+
+    node = sha256(concat(LEAF_PREFIX, leaf))
+    index = leaf_index
+
+    for sibling in proof:
+        if index % 2 == 1:
+            node = sha256(concat(concat(NODE_PREFIX, sibling), node))
+        else:
+            node = sha256(concat(concat(NODE_PREFIX, node), sibling))
+        index = index // 2
+
+    if not index == 0:
         return False
 
+    return node == root
+
+
+def IsClaimant(agreement_data):
+    """
+    Method to check if the owner, customer or insurer of an agreement
+    witnessed the transaction
+
+    :param agreement_data: the agreement record
+    :type agreement_data: bytearray
+
+    :return: whether the transaction may claim the agreement
+    :rtype: bool
+    """
+
+    if CheckWitness(OWNER):
+        return True
+
+    customer = GetField(agreement_data, CUSTOMER_OFFSET, ADDRESS_WIDTH)
+    if CheckWitness(customer):
+        return True
+
+    insurer = GetField(agreement_data, INSURER_OFFSET, ADDRESS_WIDTH)
+    if CheckWitness(insurer):
+        return True
+
+    return False
+
+
+def Settle(cache, agreement_key, agreement_data):
+    """
+    Method to pay out a result-noticed agreement and mark it as claimed
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param agreement_key: the key of the agreement
+    :type agreement_key: bytearray
+
+    :param agreement_data: the agreement record
+    :type agreement_data: bytearray
+
+    :return: whether a pay out to the customer is done
+    :rtype: bool
+    """
+
+    customer = GetField(agreement_data, CUSTOMER_OFFSET, ADDRESS_WIDTH)
+    insurer = GetField(agreement_data, INSURER_OFFSET, ADDRESS_WIDTH)
+    oracle = GetSettingsOracle(cache, agreement_data)
+    amount = GetField(agreement_data, AMOUNT_OFFSET, VALUE_WIDTH)
+    premium = GetField(agreement_data, PREMIUM_OFFSET, VALUE_WIDTH)
+    fee = GetField(agreement_data, FEE_OFFSET, VALUE_WIDTH)
+    weather_param = GetField(agreement_data, WEATHER_PARAM_OFFSET, WEATHER_PARAM_WIDTH)
+    oracle_cost = GetField(agreement_data, ORACLE_COST_OFFSET, VALUE_WIDTH)
+
     net_premium = premium - fee
+    paid_out = weather_param < THRESHOLD
 
-    if weather_param >= THRESHOLD:
-        Notify("Day was sunny, no pay out to customer")
-        DoTransfer(OWNER, insurer, net_premium)
-        DispatchTransferEvent(OWNER, insurer, net_premium)
+    pay_out = 0
+    if paid_out:
+        pay_out = amount
+
+    # The payments come from the owner balance, which the owner committed
+    # when adding the agreement, so a claimant can settle without the owner
+    # witness. They are checked up front, so that an agreement is only
+    # marked as claimed once everybody is paid.
+    total = Owed(insurer, net_premium) + Owed(customer, pay_out) + Owed(oracle, oracle_cost)
+
+    if CacheGet(cache, BalanceKey(OWNER)) < total:
+        Log("Insufficient funds to transfer")
         return False
 
-    elif weather_param < THRESHOLD:
+    if paid_out:
         Notify("Day was not sunny, pay out insured amount to customer")
-        DoTransfer(OWNER, insurer, net_premium)
-        DispatchTransferEvent(OWNER, insurer, net_premium)
-        DoTransfer(OWNER, customer, amount)
-        DispatchTransferEvent(OWNER, customer, amount)
 
-    DoTransfer(OWNER, oracle, oracle_cost)
-    DispatchTransferEvent(OWNER, oracle, oracle_cost)
+    else:
+        Notify("Day was sunny, no pay out to customer")
+
+    if not PayOut(cache, insurer, net_premium):
+        return False
+
+    if not PayOut(cache, customer, pay_out):
+        return False
+
+    if not PayOut(cache, oracle, oracle_cost):
+        return False
 
-    agreement_data[12] = 'claimed'
-    Put(context, agreement_key, agreement_data)
+    agreement_data = SetField(agreement_data, STATUS_OFFSET, STATUS_WIDTH, STATUS_CLAIMED)
     DispatchClaimEvent(agreement_key)
 
-    return True
+    if IsAutoPrune(cache):
+        ArchiveAgreement(cache, agreement_key, agreement_data)
+
+    else:
+        context = GetContext()
+        Put(context, AgreementKey(agreement_key), agreement_data)
+
+    return paid_out
+
+
+def Owed(receiver, amount):
+    """
+    Method to get what a payment from the owner debits the owner balance
+
+    :param receiver: the address to pay
+    :type receiver: bytearray
+
+    :param amount: the amount to pay
+    :type amount: int
+
+    :return: the amount debited
+    :rtype: int
+    """
+
+    if amount <= 0:
+        return 0
+
+    if receiver == OWNER:
+        return 0
+
+    return amount
+
+
+def PayOut(cache, receiver, amount):
+    """
+    Method to pay a party of a settled agreement from the owner balance
 
+    :param cache: the storage cache of the invocation
+    :type cache: list
 
-def DoTransfer(sender, receiver, amount):
+    :param receiver: the address to pay
+    :type receiver: bytearray
+
+    :param amount: the amount to pay, nothing is paid if it is not positive
+    :type amount: int
+
+    :return: whether the payment was successful
+    :rtype: bool
+    """
+
+    if amount <= 0:
+        return True
+
+    return MoveFunds(cache, OWNER, receiver, amount)
+
+
+def DoTransfer(cache, sender, receiver, amount):
     """
     Method to transfer tokens from one account to another
 
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
     :param sender: the address to transfer from
     :type sender: bytearray
 
@@ -614,38 +2308,66 @@ def DoTransfer(sender, receiver, amount):
         Log("Not owner of funds to be transferred")
         return False
 
+    return MoveFunds(cache, sender, receiver, amount)
+
+
+def MoveFunds(cache, sender, receiver, amount):
+    """
+    Method to move a positive amount of tokens between two balances, once
+    the sender is authorized
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param sender: the address to transfer from
+    :type sender: bytearray
+
+    :param receiver: the address to transfer to
+    :type receiver: bytearray
+
+    :param amount: the amount of tokens to transfer
+    :type amount: int
+
+    :return: whether the transfer was successful
+    :rtype: bool
+    """
+
     if sender == receiver:
         Log("Sending funds to self")
         return True
 
-    context = GetContext()
-    from_val = Get(context, sender)
+    sender_key = BalanceKey(sender)
+    from_val = CacheGet(cache, sender_key)
 
     if from_val < amount:
         Log("Insufficient funds to transfer")
         return False
 
     if from_val == amount:
-        Delete(context, sender)
+        CacheDelete(cache, sender_key)
 
     else:
         difference = from_val - amount
-        Put(context, sender, difference)
+        CachePut(cache, sender_key, difference)
 
-    to_value = Get(context, receiver)
+    receiver_key = BalanceKey(receiver)
+    to_value = CacheGet(cache, receiver_key)
 
     to_total = to_value + amount
 
-    Put(context, receiver, to_total)
+    CachePut(cache, receiver_key, to_total)
     DispatchTransferEvent(sender, receiver, amount)
 
     return True
 
 
-def RefundAll(agreement_key):
+def RefundAll(cache, agreement_key):
     """
     Method refund payments in case a total eclipse or EMP caused oracle failure
 
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
     :param agreement_key: agreement_key
     :type agreement_key: bytearray
 
@@ -659,41 +2381,62 @@ def RefundAll(agreement_key):
         return False
 
     context = GetContext()
-    agreement_data = Get(context, agreement_key)
-    status = agreement_data[12]
-    customer = agreement_data[0]
-    insurer = agreement_data[1]
-    status = agreement_data[12]
-    amount = agreement_data[5]
-    premium = agreement_data[6]
-    fee = agreement_data[7]
-
-    if status == 'claimed':
+    agreement_data = Get(context, AgreementKey(agreement_key))
+
+    if not agreement_data:
+        Log("Agreement does not exist")
+        return False
+
+    customer = GetField(agreement_data, CUSTOMER_OFFSET, ADDRESS_WIDTH)
+    insurer = GetField(agreement_data, INSURER_OFFSET, ADDRESS_WIDTH)
+    status = GetField(agreement_data, STATUS_OFFSET, STATUS_WIDTH)
+    amount = GetField(agreement_data, AMOUNT_OFFSET, VALUE_WIDTH)
+    premium = GetField(agreement_data, PREMIUM_OFFSET, VALUE_WIDTH)
+    fee = GetField(agreement_data, FEE_OFFSET, VALUE_WIDTH)
+
+    if status == STATUS_CLAIMED:
         Log("contract pay out has already been claimed")
         return False
 
-    elif status == 'refunded':
+    elif status == STATUS_REFUNDED:
         Log("A RefundAll already took place")
         return False
 
-    # Perform refund
+    # Perform refund, only marking the agreement as refunded, and archiving
+    # it, once both parties are paid
     net_premium = premium - fee
-    DoTransfer(OWNER, insurer, net_premium)
-    DispatchTransferEvent(OWNER, insurer, net_premium)
-    DoTransfer(OWNER, customer, amount)
-    DispatchTransferEvent(OWNER, customer, amount)
+    total = Owed(insurer, net_premium) + Owed(customer, amount)
+
+    if CacheGet(cache, BalanceKey(OWNER)) < total:
+        Log("Insufficient funds to transfer")
+        return False
 
-    agreement_data[12] = 'refunded'
-    Put(context, agreement_key, agreement_data)
+    if not PayOut(cache, insurer, net_premium):
+        return False
+
+    if not PayOut(cache, customer, amount):
+        return False
+
+    agreement_data = SetField(agreement_data, STATUS_OFFSET, STATUS_WIDTH, STATUS_REFUNDED)
+    UnindexAgreement(cache, agreement_data)
     DispatchRefundAllEvent(agreement_key)
 
+    if IsAutoPrune(cache):
+        ArchiveAgreement(cache, agreement_key, agreement_data)
+
+    else:
+        Put(context, AgreementKey(agreement_key), agreement_data)
+
     return True
 
 
-def DeleteAgreement(agreement_key):
+def DeleteAgreement(cache, agreement_key):
     """
     Method for the dApp owner to delete claimed or refunded agreements
 
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
     :param agreement_key: agreement_key
     :type agreement_key: str
 
@@ -705,16 +2448,111 @@ def DeleteAgreement(agreement_key):
         Log("Must be owner to delete an agreement")
         return False
 
-    context = GetContext
-    agreement_data = Get(context, agreement_key)
-    status = agreement_data[12]
+    context = GetContext()
+    agreement_data = Get(context, AgreementKey(agreement_key))
+    status = GetField(agreement_data, STATUS_OFFSET, STATUS_WIDTH)
 
-    if status == 'claimed':
-        Delete(context, agreement_key)
+    if status == STATUS_CLAIMED:
+        RemoveAgreement(cache, agreement_key, agreement_data)
         DispatchDeleteAgreementEvent(agreement_key)
 
-    elif status == 'refunded':
-        Delete(context, agreement_key)
+    elif status == STATUS_REFUNDED:
+        RemoveAgreement(cache, agreement_key, agreement_data)
         DispatchDeleteAgreementEvent(agreement_key)
 
     return False
+
+
+def PruneBatch(cache, agreement_keys):
+    """
+    Method for the dApp owner to delete many claimed or refunded agreements
+    at once. Agreements that do not exist or are not settled are skipped.
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param agreement_keys: the keys of the agreements
+    :type agreement_keys: list
+
+    :return: the number of agreements deleted
+    :rtype: int
+    """
+
+    if not CheckWitness(OWNER):
+        Log("Must be owner to prune agreements")
+        return False
+
+    context = GetContext()
+    pruned = 0
+
+    for agreement_key in agreement_keys:
+        agreement_data = Get(context, AgreementKey(agreement_key))
+        status = GetField(agreement_data, STATUS_OFFSET, STATUS_WIDTH)
+
+        if status == STATUS_CLAIMED or status == STATUS_REFUNDED:
+            RemoveAgreement(cache, agreement_key, agreement_data)
+            DispatchDeleteAgreementEvent(agreement_key)
+            pruned = pruned + 1
+
+    return pruned
+
+
+def RemoveAgreement(cache, agreement_key, agreement_data):
+    """
+    Method to delete an agreement record together with its index and list
+    entries. Refunded agreements were already removed from the location
+    index by RefundAll.
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param agreement_key: the key of the agreement
+    :type agreement_key: bytearray
+
+    :param agreement_data: the agreement record
+    :type agreement_data: bytearray
+    """
+
+    context = GetContext()
+    Delete(context, AgreementKey(agreement_key))
+
+    status = GetField(agreement_data, STATUS_OFFSET, STATUS_WIDTH)
+    if not status == STATUS_REFUNDED:
+        UnindexAgreement(cache, agreement_data)
+
+    UnlistAgreement(agreement_data)
+
+
+def ArchiveAgreement(cache, agreement_key, agreement_data):
+    """
+    Method to emit the final record of a settled agreement in an archive
+    event and remove it from storage
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :param agreement_key: the key of the agreement
+    :type agreement_key: bytearray
+
+    :param agreement_data: the final agreement record
+    :type agreement_data: bytearray
+    """
+
+    DispatchArchiveEvent(agreement_key, agreement_data)
+    RemoveAgreement(cache, agreement_key, agreement_data)
+
+
+def IsAutoPrune(cache):
+    """
+    Method to check whether settled agreements are removed automatically
+
+    :param cache: the storage cache of the invocation
+    :type cache: list
+
+    :return: whether auto prune is on
+    :rtype: bool
+    """
+
+    settings = CacheGet(cache, SETTINGS_KEY)
+
+    return GetField(settings, SETTINGS_AUTO_PRUNE_OFFSET, SETTINGS_AUTO_PRUNE_WIDTH) == 1
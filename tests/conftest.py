@@ -0,0 +1,120 @@
+"""
+Fixtures shared by the tests: a deployed contract in the emulator with a
+funded owner
+"""
+import pytest
+
+from emulator import Emulator
+from emulator.avm import JUMPS, OPCODES
+from emulator.vm import int_to_bytes, to_int
+
+OWNER = b'\x01' * 20
+ORACLE = b'\x0a' * 20
+INSURER = b'\x0b' * 20
+CUSTOMER = b'\x0c' * 20
+
+SECONDS_PER_DAY = 86400
+OWNER_FUNDS = 10 ** 9
+
+
+def deploy(interop=None):
+    """
+    A deployed contract with a funded owner
+    """
+
+    emu = Emulator(interop=interop, overrides={'OWNER': OWNER})
+    assert emu.invoke('deploy', ['dapp_name', ORACLE, 3600, SECONDS_PER_DAY, 2592000, 0], [OWNER])
+    emu.storage[emu.balance_key(OWNER)] = OWNER_FUNDS
+    return emu
+
+
+@pytest.fixture
+def emu():
+    return deploy()
+
+
+def event_time(emu):
+    """
+    Timestamp of the first day the contract accepts an agreement for
+    """
+
+    return (emu.clock.time // SECONDS_PER_DAY + 2) * SECONDS_PER_DAY
+
+
+def agreement_fields(key, timestamp, amount=1000, premium=100, fee=0, customer=CUSTOMER, location='Amsterdam'):
+    """
+    Fields of an agreement as listed in an agreementBatch
+    """
+
+    return [key, customer, INSURER, location, timestamp, 0, amount, premium, fee]
+
+
+def make_agreement(emu, key, timestamp, **kwargs):
+    fields = agreement_fields(key, timestamp, **kwargs)
+    return emu.invoke('agreement', fields[:8] + ['dapp_name', fields[8]], [OWNER])
+
+
+def after_event(emu, timestamp):
+    """
+    Move the clock past the day of the event, when results may be noticed
+    """
+
+    emu.clock.set_time(timestamp + SECONDS_PER_DAY)
+
+
+def balance(emu, address):
+    return to_int(emu.storage.get(emu.balance_key(address), 0))
+
+
+def push(value):
+    """
+    Encode the push of an integer or a byte array
+    """
+
+    if isinstance(value, int):
+        if value == -1:
+            return bytes([OPCODES['PUSHM1']])
+        if 0 <= value <= 16:
+            return bytes([OPCODES['PUSH{}'.format(value)] if value else OPCODES['PUSH0']])
+        value = int_to_bytes(value)
+
+    if len(value) <= 75:
+        return bytes([len(value)]) + value
+
+    if len(value) <= 0xff:
+        return bytes([OPCODES['PUSHDATA1'], len(value)]) + value
+
+    return bytes([OPCODES['PUSHDATA2']]) + len(value).to_bytes(2, 'little') + value
+
+
+def assemble(*program):
+    """
+    Assemble a script from opcode names, integers and byte arrays to push,
+    'label:' markers, (jump, 'label') pairs and ('SYSCALL', name) pairs
+
+    :rtype: bytes
+    """
+
+    def encode(item, offset, labels):
+        if isinstance(item, tuple):
+            name, operand = item
+            if OPCODES[name] in JUMPS:
+                relative = labels.get(operand, offset) - offset
+                return bytes([OPCODES[name]]) + relative.to_bytes(2, 'little', signed=True)
+            return bytes([OPCODES[name], len(operand)]) + operand.encode()
+        if isinstance(item, str):
+            return b'' if item.endswith(':') else bytes([OPCODES[item]])
+        return push(item)
+
+    labels = {}
+    offset = 0
+    for item in program:
+        if isinstance(item, str) and item.endswith(':'):
+            labels[item[:-1]] = offset
+        offset += len(encode(item, offset, labels))
+
+    script = b''
+    for item in program:
+        script += encode(item, len(script), labels)
+
+    return script
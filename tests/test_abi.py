@@ -0,0 +1,82 @@
+import pytest
+
+from emulator.dispatch import compare
+from offchain.abi import encode
+
+from .conftest import CUSTOMER, INSURER, ORACLE, OWNER, after_event, agreement_fields, deploy, event_time
+
+AFTER_EVENT = object()
+
+
+def agreement(key, timestamp, **kwargs):
+    fields = agreement_fields(key, timestamp, **kwargs)
+    return 'agreement', fields[:8] + ['dapp_name', fields[8]], [OWNER]
+
+
+def scenario(timestamp):
+    yield agreement(b'k1', timestamp, fee=10)
+    yield agreement(b'k2', timestamp, location='Utrecht')
+    yield agreement(b'k3', timestamp)
+    # A second agreement with the same key is rejected
+    yield agreement(b'k1', timestamp)
+    yield 'transfer', [OWNER, CUSTOMER, 50], [OWNER]
+    yield 'transfer', [CUSTOMER, INSURER, 20], [CUSTOMER]
+    # Not signed by the sender
+    yield 'transfer', [CUSTOMER, INSURER, 20], [INSURER]
+    yield 'balance', [CUSTOMER], []
+    yield AFTER_EVENT
+    yield 'resultNotice', [b'k1', 50, 5], [ORACLE]
+    yield 'resultNotice', [b'k2', 5, 5], [ORACLE]
+    # Not the oracle
+    yield 'resultNotice', [b'k3', 50, 5], [CUSTOMER]
+    yield 'claim', [b'k1'], [CUSTOMER]
+    yield 'claim', [b'k2'], [CUSTOMER]
+    yield 'refundAll', [b'k3'], [OWNER]
+    yield 'deleteAgreement', [b'k2'], [OWNER]
+    yield 'balance', [INSURER], []
+    yield 'balance', [CUSTOMER], []
+
+
+def run(binary):
+    emu = deploy()
+    timestamp = event_time(emu)
+    results = []
+
+    for step in scenario(timestamp):
+        if step is AFTER_EVENT:
+            after_event(emu, timestamp)
+            continue
+        operation, args, witnesses = step
+        if binary:
+            operation, args = encode(operation, args)
+        results.append(emu.invoke(operation, args, witnesses))
+
+    return emu, results
+
+
+def test_binary_abi_matches_string_abi():
+    string, string_results = run(binary=False)
+    binary, binary_results = run(binary=True)
+
+    assert [bool(result) for result in binary_results] == [bool(result) for result in string_results]
+    assert binary_results == string_results
+    assert binary.storage == string.storage
+    # Packed integers are notified as the fixed width byte arrays they were
+    # sliced from
+    assert [(name, args[0]) for name, args in binary.interop.events] == \
+        [(name, args[0]) for name, args in string.interop.events]
+
+
+@pytest.mark.parametrize('operation', ['claim', 'refundAll', 'deleteAgreement'])
+def test_binary_abi_rejects_unknown_agreements(emu, operation):
+    opcode, args = encode(operation, [b'missing'])
+
+    assert not emu.invoke(opcode, args, [OWNER])
+    assert not emu.invoke(operation, [b'missing'], [OWNER])
+
+
+def test_binary_dispatch_does_less_work():
+    result = compare()
+
+    for name, counts in result.items():
+        assert counts['binary']['compare'] < counts['string']['compare'], name
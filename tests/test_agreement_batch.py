@@ -0,0 +1,45 @@
+from emulator.vm import to_bytes
+
+from .conftest import OWNER, agreement_fields, event_time
+
+
+def list_all(emu):
+    return emu.invoke('agreements', [0, 0, 100])[1]
+
+
+def test_batch_creates_agreements(emu):
+    timestamp = event_time(emu)
+    batch = [agreement_fields(b'a', timestamp), agreement_fields(b'b', timestamp)]
+
+    assert emu.invoke('agreementBatch', ['dapp_name', batch], [OWNER])
+
+    assert list_all(emu) == [b'a', b'b']
+    assert emu.invoke('agreementCount') == 2
+
+
+def test_batch_with_existing_key_stores_nothing(emu):
+    timestamp = event_time(emu)
+    assert emu.invoke('agreementBatch', ['dapp_name', [agreement_fields(b'a', timestamp)]], [OWNER])
+
+    batch = [agreement_fields(b'b', timestamp), agreement_fields(b'a', timestamp)]
+
+    assert not emu.invoke('agreementBatch', ['dapp_name', batch], [OWNER])
+    assert list_all(emu) == [b'a']
+
+
+def test_batch_with_repeated_key_stores_nothing(emu):
+    timestamp = event_time(emu)
+    before = dict(emu.storage)
+    batch = [agreement_fields(b'd', timestamp), agreement_fields(b'e', timestamp), agreement_fields(b'd', timestamp)]
+
+    assert not emu.invoke('agreementBatch', ['dapp_name', batch], [OWNER])
+
+    assert emu.storage == before
+    assert 'Agreement key repeated in batch' in emu.interop.logs
+
+
+def test_batch_needs_owner(emu):
+    timestamp = event_time(emu)
+
+    assert not emu.invoke('agreementBatch', ['dapp_name', [agreement_fields(b'a', timestamp)]], [b'\x02' * 20])
+    assert emu.storage.get(to_bytes(emu.contract.AgreementKey(b'a'))) is None
@@ -0,0 +1,75 @@
+import pytest
+
+from .conftest import CUSTOMER, ORACLE, OWNER, after_event, event_time, make_agreement
+
+KEYS = [b'k0', b'k1', b'k2', b'k3', b'k4']
+
+STATUS_INITIALIZED = 1
+STATUS_RESULT_NOTICED = 2
+
+
+@pytest.fixture
+def listed(emu):
+    timestamp = event_time(emu)
+    for key in KEYS:
+        assert make_agreement(emu, key, timestamp)
+    return timestamp
+
+
+def pages(emu, status, page_size):
+    keys = []
+    cursor = 0
+
+    while True:
+        cursor, page = emu.invoke('agreements', [status, cursor, page_size])
+        assert len(page) <= page_size
+        keys.extend(page)
+        if cursor == 0:
+            return keys
+
+
+def test_count_is_the_number_of_agreements(emu, listed):
+    assert emu.invoke('agreementCount', []) == len(KEYS)
+
+
+@pytest.mark.parametrize('page_size', [1, 2, 5, 100])
+def test_pages_list_every_agreement_once(emu, listed, page_size):
+    assert pages(emu, 0, page_size) == KEYS
+
+
+def test_page_returns_the_next_cursor(emu, listed):
+    assert emu.invoke('agreements', [0, 0, 2]) == [2, [b'k0', b'k1']]
+    assert emu.invoke('agreements', [0, 2, 2]) == [4, [b'k2', b'k3']]
+    assert emu.invoke('agreements', [0, 4, 2]) == [0, [b'k4']]
+
+
+def test_pages_filter_on_status(emu, listed):
+    after_event(emu, listed)
+    assert emu.invoke('resultNotice', [b'k1', 10, 0], [ORACLE])
+    assert emu.invoke('resultNotice', [b'k3', 10, 0], [ORACLE])
+
+    assert pages(emu, STATUS_RESULT_NOTICED, 2) == [b'k1', b'k3']
+    assert pages(emu, STATUS_INITIALIZED, 2) == [b'k0', b'k2', b'k4']
+
+
+def test_deleted_agreements_leave_an_empty_slot(emu, listed):
+    after_event(emu, listed)
+    assert emu.invoke('resultNotice', [b'k2', 10, 0], [ORACLE])
+    emu.invoke('claim', [b'k2'], [CUSTOMER])
+    emu.invoke('deleteAgreement', [b'k2'], [OWNER])
+    assert emu.interop.events[-1] == ('delete', (b'k2',))
+
+    assert emu.invoke('agreements', [0, 2, 1]) == [3, []]
+    assert pages(emu, 0, 2) == [b'k0', b'k1', b'k3', b'k4']
+    assert emu.invoke('agreementCount', []) == len(KEYS)
+
+
+@pytest.mark.parametrize('page_size', [0, -1, 101])
+def test_page_size_is_bounded(emu, listed, page_size):
+    assert not emu.invoke('agreements', [0, 0, page_size])
+    assert emu.interop.logs[-1] == 'page_size must be between 1 and 100'
+
+
+def test_empty_list(emu):
+    assert not emu.invoke('agreementCount', [])
+    assert emu.invoke('agreements', [0, 0, 10]) == [0, []]
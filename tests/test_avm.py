@@ -0,0 +1,152 @@
+import json
+
+import pytest
+
+from emulator.avm import DebugInfo, Engine, format_profile
+from emulator.contract import ExecutionFault
+from emulator.interop import Interop
+
+from .conftest import OWNER, assemble
+
+# Sums 5 + 4 + ... + 1 in a loop and doubles the sum in a called method
+LOOP = (
+    'DROP', 'DROP',
+    0, 5,
+    'loop:',
+    'DUP', ('JMPIFNOT', 'end'),
+    'TUCK', 'ADD', 'SWAP', 'DEC',
+    ('JMP', 'loop'),
+    'end:',
+    'DROP', ('CALL', 'double'),
+    'RET',
+    'double:',
+    'DUP', 'ADD',
+    'RET',
+)
+
+
+def run(*program, **kwargs):
+    engine = Engine(assemble(*program), **kwargs)
+    return engine, engine.invoke('test')
+
+
+def test_jumps_and_calls():
+    engine, result = run(*LOOP)
+
+    assert result == 30
+    assert engine.profile.opcodes['CALL'] == 1
+    assert engine.profile.opcodes['JMP'] == 5
+    assert engine.profile.opcodes['RET'] == 2
+
+
+@pytest.mark.parametrize('program, expected', [
+    ((1, 2, 'TUCK', 3, 'PACK'), [2, 1, 2]),
+    ((1, 2, 3, 'ROT', 3, 'PACK'), [1, 3, 2]),
+    ((1, 2, 3, 2, 'XTUCK', 4, 'PACK'), [3, 2, 3, 1]),
+    ((1, 2, 3, 2, 'ROLL', 3, 'PACK'), [1, 3, 2]),
+    ((1, 2, 'TOALTSTACK', 'DUPFROMALTSTACK', 'FROMALTSTACK', 3, 'PACK'), [2, 2, 1]),
+])
+def test_stack_operations(program, expected):
+    _, result = run('DROP', 'DROP', *program)
+
+    assert result == expected
+
+
+def test_xtuck_of_zero_faults():
+    with pytest.raises(ExecutionFault):
+        run('DROP', 'DROP', 1, 2, 0, 'XTUCK')
+
+
+def test_syscalls_use_the_interop():
+    interop = Interop()
+    interop.storage[b'count'] = b'\x02'
+    interop.clock.set_time(1600000000)
+
+    program = (
+        'DROP', 'DROP',
+        b'count', ('SYSCALL', 'Neo.Storage.GetContext'), ('SYSCALL', 'Neo.Storage.Get'),
+        'INC', b'count', ('SYSCALL', 'Neo.Storage.GetContext'), ('SYSCALL', 'Neo.Storage.Put'),
+        b'counted', ('SYSCALL', 'Neo.Runtime.Log'),
+        5, b'counted', 2, 'PACK', ('SYSCALL', 'Neo.Runtime.Notify'),
+        ('SYSCALL', 'Neo.Runtime.GetTime'),
+        OWNER, ('SYSCALL', 'Neo.Runtime.CheckWitness'),
+        2, 'PACK',
+        'RET',
+    )
+    engine = Engine(assemble(*program), interop)
+
+    assert engine.invoke('test', witnesses=[OWNER]) == [True, interop.clock.time]
+    assert interop.storage[b'count'] == b'\x03'
+    assert interop.logs == ['counted']
+    assert interop.events == [('counted', (5,))]
+    assert engine.profile.syscalls['Neo.Storage.Get'] == 1
+
+
+def test_fault_rolls_back_storage_and_output():
+    interop = Interop()
+    program = (
+        'DROP', 'DROP',
+        b'value', b'key', ('SYSCALL', 'Neo.Storage.GetContext'), ('SYSCALL', 'Neo.Storage.Put'),
+        b'written', ('SYSCALL', 'Neo.Runtime.Log'),
+        'THROW',
+    )
+
+    with pytest.raises(ExecutionFault):
+        Engine(assemble(*program), interop).invoke('test')
+
+    assert interop.storage == {}
+    assert interop.logs == []
+
+
+@pytest.mark.parametrize('size, gas', [(1, 1000), (1024, 1000), (1025, 2000), (2048, 2000), (2049, 3000)])
+def test_storage_put_is_priced_per_kilobyte(size, gas):
+    # A one byte key and a value of size - 1 bytes
+    program = (
+        'DROP', 'DROP',
+        b'\x00' * (size - 1), b'k', ('SYSCALL', 'Neo.Storage.GetContext'), ('SYSCALL', 'Neo.Storage.Put'),
+        'RET',
+    )
+    engine, _ = run(*program)
+
+    assert engine.profile.syscall_gas['Neo.Storage.Put'] == gas
+
+
+def test_hot_spots_follow_the_debug_map(tmp_path):
+    script = assemble(*LOOP)
+    double = len(script) - 3
+    debug = {
+        'files': [{'id': 1, 'url': '/src/sunny_dapp.py'}],
+        'map': [
+            {'start': 0, 'end': double - 1, 'method': 'Main', 'file': 1, 'file_line_no': 10},
+            {'start': double, 'end': len(script) - 1, 'method': 'Double', 'file': 1, 'file_line_no': 20},
+        ],
+    }
+    path = tmp_path / 'loop.debug.json'
+    path.write_text(json.dumps(debug))
+
+    engine = Engine(script, debug=DebugInfo.load(str(path)))
+    engine.invoke('test')
+    profile = engine.profile
+
+    assert profile.line_opcodes['sunny_dapp.py:20'] == 3
+    assert profile.line_opcodes['sunny_dapp.py:10'] == sum(profile.opcodes.values()) - 3
+    assert profile.stack_opcodes['Main;Double;sunny_dapp.py:20'] == 3
+
+    folded = dict(line.rsplit(' ', 1) for line in profile.folded(weight='opcodes').splitlines())
+    assert folded == {'Main;sunny_dapp.py:10': str(profile.line_opcodes['sunny_dapp.py:10']),
+                      'Main;Double;sunny_dapp.py:20': '3'}
+    assert 'sunny_dapp.py:20' in format_profile(profile)
+
+
+def test_trace_writes_a_line_per_opcode():
+    lines = []
+
+    class Trace(object):
+        def write(self, line):
+            lines.append(line)
+
+    engine = Engine(assemble(*LOOP), trace=Trace())
+    engine.invoke('test')
+
+    assert len(lines) == sum(engine.profile.opcodes.values())
+    assert lines[0].split()[:2] == ['0000', 'DROP']
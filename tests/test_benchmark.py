@@ -0,0 +1,47 @@
+from emulator import Emulator
+from emulator.benchmark import Benchmark, Workload, compare
+
+from .conftest import OWNER
+
+LEGACY_CONTRACT = '''
+from boa.blockchain.vm.Neo.Storage import GetContext, Get
+
+
+def Main(operation, args):
+    return Get(GetContext(), args[0])
+'''
+
+
+def test_balance_key_of_contract_without_balance_key(tmp_path):
+    path = tmp_path / 'legacy_dapp.py'
+    path.write_text(LEGACY_CONTRACT)
+    emu = Emulator(str(path))
+
+    emu.storage[emu.balance_key(OWNER)] = 7
+
+    assert emu.balance_key(OWNER) == OWNER
+    assert emu.invoke('balance', [OWNER]) == 7
+
+
+def test_balance_key_of_contract_with_balance_key():
+    emu = Emulator()
+
+    assert emu.balance_key(OWNER) == bytes(emu.contract.BalanceKey(OWNER))
+
+
+def test_lifecycle_runs_without_faults():
+    report = Benchmark(Workload(agreements=50, customers=5, locations=3, days=4)).run()
+
+    assert report['total']['faults'] == 0
+    assert report['phases']['agreement']['count'] == 50
+    assert compare(report, report) == []
+
+
+def test_rejected_agreements_are_counted_apart():
+    report = Benchmark(Workload(agreements=100, customers=5, locations=3, days=40)).run()
+    agreement = report['phases']['agreement']
+
+    assert agreement['rejected'] > 0
+    assert agreement['count'] + agreement['rejected'] == 100
+    assert report['storage']['live_agreements'] == agreement['count']
+    assert report['phases']['deleteAgreement']['count'] == agreement['count']
@@ -0,0 +1,64 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'neo-boa'))
+
+from build_cache import BuildCache, file_hash  # noqa: E402
+
+
+def compile_contract(tmp_path, source, avm=b'\x00\x01'):
+    (tmp_path / 'sunny_dapp.py').write_text(source)
+    (tmp_path / 'sunny_dapp.avm').write_bytes(avm)
+
+    return file_hash(str(tmp_path / 'sunny_dapp.py')), str(tmp_path / 'sunny_dapp.avm')
+
+
+def test_unchanged_contract_is_current(tmp_path):
+    source_hash, avm = compile_contract(tmp_path, 'def Main(): pass\n')
+    cache = BuildCache(str(tmp_path), '0.4.2')
+    cache.record('sunny_dapp.py', source_hash, avm)
+    cache.save()
+
+    assert BuildCache(str(tmp_path), '0.4.2').is_current('sunny_dapp.py', source_hash, avm)
+
+
+def test_changed_source_is_stale(tmp_path):
+    source_hash, avm = compile_contract(tmp_path, 'def Main(): pass\n')
+    cache = BuildCache(str(tmp_path), '0.4.2')
+    cache.record('sunny_dapp.py', source_hash, avm)
+
+    source_hash, avm = compile_contract(tmp_path, 'def Main(): return 1\n')
+
+    assert not cache.is_current('sunny_dapp.py', source_hash, avm)
+
+
+def test_other_compiler_version_is_stale(tmp_path):
+    source_hash, avm = compile_contract(tmp_path, 'def Main(): pass\n')
+    cache = BuildCache(str(tmp_path), '0.4.2')
+    cache.record('sunny_dapp.py', source_hash, avm)
+    cache.save()
+
+    assert not BuildCache(str(tmp_path), '0.5.0').is_current('sunny_dapp.py', source_hash, avm)
+
+
+def test_modified_or_missing_avm_is_stale(tmp_path):
+    source_hash, avm = compile_contract(tmp_path, 'def Main(): pass\n')
+    cache = BuildCache(str(tmp_path), '0.4.2')
+    cache.record('sunny_dapp.py', source_hash, avm)
+
+    (tmp_path / 'sunny_dapp.avm').write_bytes(b'\x00\x02')
+    assert not cache.is_current('sunny_dapp.py', source_hash, avm)
+
+    os.remove(avm)
+    assert not cache.is_current('sunny_dapp.py', source_hash, avm)
+
+
+def test_prune_drops_removed_contracts(tmp_path):
+    source_hash, avm = compile_contract(tmp_path, 'def Main(): pass\n')
+    cache = BuildCache(str(tmp_path), '0.4.2')
+    cache.record('sunny_dapp.py', source_hash, avm)
+    cache.record('old_dapp.py', source_hash, avm)
+
+    cache.prune(['sunny_dapp.py'])
+
+    assert list(cache.contracts) == ['sunny_dapp.py']
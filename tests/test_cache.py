@@ -0,0 +1,88 @@
+import pytest
+
+from emulator.interop import Interop
+
+from .conftest import CUSTOMER, INSURER, ORACLE, OWNER, after_event, deploy, event_time, make_agreement
+
+
+@pytest.fixture
+def contract(emu):
+    emu.interop.begin(frozenset(), emu.interop.trigger)
+    return emu.contract
+
+
+def test_reads_are_served_from_the_cache(emu, contract):
+    emu.storage[b'x'] = 1
+    cache = contract.NewCache()
+
+    assert contract.CacheGet(cache, b'x') == 1
+    emu.storage[b'x'] = 2
+    assert contract.CacheGet(cache, b'x') == 1
+
+
+def test_writes_are_deferred_to_the_flush(emu, contract):
+    cache = contract.NewCache()
+
+    contract.CachePut(cache, b'x', 1)
+    contract.CachePut(cache, b'x', 2)
+    assert b'x' not in emu.storage
+    assert contract.CacheGet(cache, b'x') == 2
+
+    contract.Flush(cache)
+    assert emu.storage[b'x'] == 2
+
+
+def test_deletes_are_deferred_to_the_flush(emu, contract):
+    emu.storage[b'x'] = 1
+    emu.storage[b'y'] = 1
+    cache = contract.NewCache()
+
+    contract.CacheDelete(cache, b'x')
+    contract.CacheDelete(cache, b'y')
+    contract.CachePut(cache, b'y', 3)
+    assert emu.storage[b'x'] == 1
+    assert not contract.CacheGet(cache, b'x')
+
+    contract.Flush(cache)
+    assert b'x' not in emu.storage
+    assert emu.storage[b'y'] == 3
+
+
+def test_clean_keys_are_not_written_back(emu, contract):
+    emu.storage[b'x'] = 1
+    cache = contract.NewCache()
+    contract.CacheGet(cache, b'x')
+    contract.CacheGet(cache, b'missing')
+
+    # A write behind the cache is not overwritten by the value that was read
+    emu.storage[b'x'] = 2
+    contract.Flush(cache)
+
+    assert emu.storage[b'x'] == 2
+    assert b'missing' not in emu.storage
+
+
+class RecordingInterop(Interop):
+
+    def __init__(self):
+        super(RecordingInterop, self).__init__()
+        self.puts = []
+
+    def Put(self, context, key, value):
+        self.puts.append(key)
+        super(RecordingInterop, self).Put(context, key, value)
+
+
+def test_settle_writes_every_balance_once():
+    emu = deploy(RecordingInterop())
+    timestamp = event_time(emu)
+    assert make_agreement(emu, b'k1', timestamp, fee=10)
+    after_event(emu, timestamp)
+    assert emu.invoke('resultNotice', [b'k1', 5, 5], [ORACLE])
+
+    del emu.interop.puts[:]
+    assert emu.invoke('claim', [b'k1'], [CUSTOMER])
+
+    # The owner pays the insurer, the customer and the oracle
+    for address in (OWNER, INSURER, CUSTOMER, ORACLE):
+        assert emu.interop.puts.count(emu.balance_key(address)) == 1
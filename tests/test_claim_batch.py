@@ -0,0 +1,49 @@
+from .conftest import CUSTOMER, INSURER, ORACLE, OWNER, OWNER_FUNDS, after_event, balance, event_time, make_agreement
+
+
+def noticed_agreements(emu, keys, weather_param=10, oracle_cost=5):
+    timestamp = event_time(emu)
+
+    for key in keys:
+        assert make_agreement(emu, key, timestamp, amount=1000, premium=100)
+
+    after_event(emu, timestamp)
+
+    for key in keys:
+        assert emu.invoke('resultNotice', [key, weather_param, oracle_cost], [ORACLE])
+
+
+def test_claim_batch_pays_every_agreement_once(emu):
+    noticed_agreements(emu, [b'k1', b'k2'])
+
+    assert emu.invoke('claimBatch', [[b'k1', b'k2']], [OWNER]) == 2
+
+    assert balance(emu, CUSTOMER) == 2000
+    assert balance(emu, INSURER) == 200
+    assert balance(emu, ORACLE) == 10
+    assert balance(emu, OWNER) == OWNER_FUNDS - 2210
+
+
+def test_claim_batch_pays_a_repeated_key_once(emu):
+    noticed_agreements(emu, [b'k1'])
+
+    assert emu.invoke('claimBatch', [[b'k1', b'k1', b'k1']], [OWNER]) == 1
+
+    assert balance(emu, CUSTOMER) == 1000
+    assert balance(emu, INSURER) == 100
+    assert balance(emu, OWNER) == OWNER_FUNDS - 1105
+
+
+def test_claim_batch_skips_claimed_agreements(emu):
+    noticed_agreements(emu, [b'k1', b'k2'])
+    assert emu.invoke('claim', [b'k1'], [OWNER])
+
+    assert emu.invoke('claimBatch', [[b'k1', b'k2']], [OWNER]) == 1
+    assert balance(emu, CUSTOMER) == 2000
+
+
+def test_claim_batch_needs_owner(emu):
+    noticed_agreements(emu, [b'k1'])
+
+    assert not emu.invoke('claimBatch', [[b'k1']], [CUSTOMER])
+    assert balance(emu, CUSTOMER) == 0
@@ -0,0 +1,124 @@
+import pytest
+
+from emulator.vm import to_bytes
+from offchain.merkle import MerkleTree, verify
+
+from .conftest import (CUSTOMER, INSURER, ORACLE, OWNER, OWNER_FUNDS, SECONDS_PER_DAY, after_event, balance,
+                       event_time, make_agreement)
+
+STATUS_CLAIMED = 3
+
+OBSERVATIONS = [('Amsterdam', 0, 10), ('Berlin', 0, 80), ('Paris', 0, 45), ('Rome', 0, 95), ('Oslo', 0, 5)]
+
+
+def test_every_proof_verifies():
+    tree = MerkleTree(OBSERVATIONS)
+
+    for index, (location, day, weather_param) in enumerate(OBSERVATIONS):
+        assert verify(tree.root, location, day, weather_param, index, tree.proof(index))
+
+
+def test_proof_of_other_weather_or_index_fails():
+    tree = MerkleTree(OBSERVATIONS)
+    proof = tree.proof(0)
+
+    assert not verify(tree.root, 'Amsterdam', 0, 60, 0, proof)
+    assert not verify(tree.root, 'Amsterdam', 0, 10, 1, proof)
+    assert not verify(tree.root, 'Amsterdam', 0, 10, 0 + 8, proof)
+
+
+def test_tree_needs_observations():
+    with pytest.raises(ValueError):
+        MerkleTree([])
+
+
+def post_root(emu, weather_param=10, oracle_cost=5):
+    timestamp = event_time(emu)
+    day = timestamp // SECONDS_PER_DAY
+    assert make_agreement(emu, b'k1', timestamp, amount=1000, premium=100)
+
+    tree = MerkleTree([('Amsterdam', day, weather_param), ('Berlin', day, 80), ('Paris', day, 45)])
+    after_event(emu, timestamp)
+    assert emu.invoke('postResultRoot', [day, tree.root, oracle_cost], [ORACLE])
+
+    return tree.claim_args('Amsterdam', day)
+
+
+def status(emu, key):
+    record = emu.storage.get(to_bytes(emu.contract.AgreementKey(key)))
+    return record[0] if record else None
+
+
+@pytest.mark.parametrize('claimant', [OWNER, CUSTOMER, INSURER], ids=['owner', 'customer', 'insurer'])
+def test_claimant_is_paid(emu, claimant):
+    args = post_root(emu)
+
+    assert emu.invoke('claimWithProof', [b'k1'] + args, [claimant])
+
+    assert balance(emu, CUSTOMER) == 1000
+    assert balance(emu, INSURER) == 100
+    assert balance(emu, ORACLE) == 5
+    assert balance(emu, OWNER) == OWNER_FUNDS - 1105
+    assert status(emu, b'k1') == STATUS_CLAIMED
+
+
+def test_claim_is_paid_once(emu):
+    args = post_root(emu)
+    assert emu.invoke('claimWithProof', [b'k1'] + args, [CUSTOMER])
+
+    assert not emu.invoke('claimWithProof', [b'k1'] + args, [CUSTOMER])
+    assert not emu.invoke('claim', [b'k1'], [CUSTOMER])
+    assert balance(emu, CUSTOMER) == 1000
+
+
+def test_invalid_proof_is_rejected(emu):
+    weather_param, index, proof = post_root(emu)
+
+    assert not emu.invoke('claimWithProof', [b'k1', 60, index, proof], [CUSTOMER])
+    assert balance(emu, CUSTOMER) == 0
+    assert status(emu, b'k1') == 1
+
+
+def test_unfunded_claim_leaves_agreement_claimable(emu):
+    args = post_root(emu)
+    emu.storage[emu.balance_key(OWNER)] = 500
+
+    assert not emu.invoke('claimWithProof', [b'k1'] + args, [CUSTOMER])
+    assert balance(emu, CUSTOMER) == 0
+    assert status(emu, b'k1') == 1
+    assert not emu.invoke('pruneBatch', [[b'k1']], [OWNER])
+
+    emu.storage[emu.balance_key(OWNER)] = OWNER_FUNDS
+
+    assert emu.invoke('claimWithProof', [b'k1'] + args, [CUSTOMER])
+    assert balance(emu, CUSTOMER) == 1000
+
+
+def test_claim_after_an_oracle_change(emu):
+    new_oracle = b'\x0d' * 20
+    timestamp = event_time(emu)
+    day = timestamp // SECONDS_PER_DAY
+    assert make_agreement(emu, b'k1', timestamp, amount=1000, premium=100)
+    assert emu.invoke('updateOracle', [new_oracle], [OWNER])
+    assert make_agreement(emu, b'k2', timestamp, amount=500, premium=50)
+
+    tree = MerkleTree([('Amsterdam', day, 10), ('Berlin', day, 80)])
+    after_event(emu, timestamp)
+    args = tree.claim_args('Amsterdam', day)
+
+    # The current oracle posts for the agreements made after the change
+    assert emu.invoke('postResultRoot', [day, tree.root, 5], [new_oracle])
+    assert not emu.invoke('claimWithProof', [b'k1'] + args, [CUSTOMER])
+    assert emu.invoke('claimWithProof', [b'k2'] + args, [CUSTOMER])
+
+    # and the previous oracle for those of the settings version before
+    contract = emu.contract
+    record = bytes(emu.storage[to_bytes(contract.AgreementKey(b'k1'))])
+    offset = contract.SETTINGS_VERSION_OFFSET
+    version = int.from_bytes(record[offset:offset + contract.SETTINGS_VERSION_WIDTH], 'little')
+    assert not emu.invoke('postResultRoot', [day, tree.root, 5, version], [new_oracle])
+    assert emu.invoke('postResultRoot', [day, tree.root, 5, version], [ORACLE])
+    assert emu.invoke('claimWithProof', [b'k1'] + args, [CUSTOMER])
+
+    assert balance(emu, CUSTOMER) == 1500
+    assert not emu.invoke('postResultRoot', [day, tree.root, 5, 99], [ORACLE])
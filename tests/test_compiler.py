@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'neo-boa'))
+
+pytest.importorskip('boa.compiler')
+
+import compiler  # noqa: E402
+
+CONTRACTS = {
+    'add.py': 'def Main(a, b):\n    return a + b\n',
+    'sub.py': 'def Main(a, b):\n    return a - b\n',
+    'mul.py': 'def Main(a, b):\n    return a * b\n',
+    'broken.py': 'def Main(a, b:\n    return a\n',
+}
+
+
+@pytest.fixture
+def contracts(tmp_path):
+    source = tmp_path / 'contracts'
+    source.mkdir()
+    for file, text in CONTRACTS.items():
+        (source / file).write_text(text)
+
+    return str(source)
+
+
+def compile_to(contracts, output, workers):
+    os.mkdir(output)
+    results = compiler.compile_all(compiler.find_contracts(contracts, output), workers)
+    return dict((file, error) for file, _, error in results)
+
+
+def test_pool_compiles_every_contract(contracts, tmp_path):
+    errors = compile_to(contracts, str(tmp_path / 'pool'), 2)
+
+    assert sorted(errors) == sorted(CONTRACTS)
+    assert errors['broken.py'] is not None
+    for file in ('add.py', 'sub.py', 'mul.py'):
+        assert errors[file] is None
+        assert os.path.getsize(str(tmp_path / 'pool' / file.replace('.py', '.avm')))
+
+
+def test_pool_builds_the_same_scripts(contracts, tmp_path):
+    compile_to(contracts, str(tmp_path / 'serial'), 1)
+    compile_to(contracts, str(tmp_path / 'pool'), 3)
+
+    for file in ('add.avm', 'sub.avm', 'mul.avm'):
+        assert (tmp_path / 'pool' / file).read_bytes() == (tmp_path / 'serial' / file).read_bytes()
+
+
+def test_failure_sets_the_exit_status(contracts, tmp_path, capsys):
+    output = str(tmp_path / 'compiled')
+    os.mkdir(output)
+
+    assert compiler.main(['--input-dir', contracts, '--output-dir', output, '-j', '2']) == 1
+    assert '4 contracts compiled, 1 failed' in capsys.readouterr().out
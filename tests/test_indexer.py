@@ -0,0 +1,72 @@
+import pytest
+
+from offchain.indexer import STATUS_INITIALIZED, STATUS_RESULT_NOTICED, FileSource, Indexer, write_notifications
+
+from .conftest import CUSTOMER, OWNER, ORACLE, after_event, event_time, make_agreement
+
+
+class InterruptedSource(FileSource):
+    """
+    File source that fails after a number of notifications
+    """
+
+    def __init__(self, path, limit):
+        super(InterruptedSource, self).__init__(path)
+        self.limit = limit
+
+    def read(self, position):
+        for n, notification in enumerate(super(InterruptedSource, self).read(position)):
+            if n == self.limit:
+                raise ConnectionError('Source interrupted')
+            yield notification
+
+
+@pytest.fixture
+def notifications(emu, tmp_path):
+    timestamp = event_time(emu)
+
+    for n in range(5):
+        assert make_agreement(emu, b'k%d' % n, timestamp)
+
+    assert emu.invoke('transfer', [OWNER, CUSTOMER, 50], [OWNER])
+    after_event(emu, timestamp)
+    assert emu.invoke('resultNotice', [b'k0', 10, 0], [ORACLE])
+
+    path = str(tmp_path / 'notifications.jsonl')
+    write_notifications(path, emu.interop.events)
+
+    return path
+
+
+def index(path, database):
+    indexer = Indexer(database, batch_size=2)
+    indexer.run(FileSource(path))
+
+    rows = indexer.db.execute('SELECT agreement_key, status FROM agreements ORDER BY agreement_key').fetchall()
+    balance = indexer.balance(CUSTOMER)
+    indexer.close()
+
+    return rows, balance
+
+
+def test_resumes_after_an_interruption(notifications, tmp_path):
+    database = str(tmp_path / 'resumed.db')
+    indexer = Indexer(database, batch_size=2)
+
+    with pytest.raises(ConnectionError):
+        indexer.run(InterruptedSource(notifications, 5))
+
+    assert indexer.checkpoint(FileSource(notifications)) == 4
+    indexer.close()
+
+    assert index(notifications, database) == index(notifications, str(tmp_path / 'once.db'))
+
+
+def test_events_are_applied_once(notifications, tmp_path):
+    database = str(tmp_path / 'sunny.db')
+    index(notifications, database)
+
+    rows, balance = index(notifications, database)
+
+    assert rows == [(b'k0', STATUS_RESULT_NOTICED)] + [(b'k%d' % n, STATUS_INITIALIZED) for n in range(1, 5)]
+    assert balance == 50
@@ -0,0 +1,80 @@
+from .conftest import CUSTOMER, ORACLE, OWNER, SECONDS_PER_DAY, after_event, event_time, make_agreement
+
+STATUS_INITIALIZED = 1
+STATUS_RESULT_NOTICED = 2
+
+
+def status(emu, key):
+    record = emu.storage[bytes(emu.contract.AgreementKey(key))]
+    return bytes(record)[emu.contract.STATUS_OFFSET]
+
+
+def index_keys(emu):
+    return [key for key in emu.storage if key.startswith(b'i/')]
+
+
+def notice(emu, location, day, start=0, count=10, weather_param=10):
+    return emu.invoke('resultNoticeByLocation', [location, day, weather_param, 5, start, count], [ORACLE])
+
+
+def test_notices_the_agreements_of_a_location_and_day(emu):
+    timestamp = event_time(emu)
+    day = timestamp // SECONDS_PER_DAY
+    assert make_agreement(emu, b'a1', timestamp)
+    assert make_agreement(emu, b'a2', timestamp)
+    assert make_agreement(emu, b'b1', timestamp, location='Berlin')
+    assert make_agreement(emu, b'a3', timestamp + SECONDS_PER_DAY)
+    after_event(emu, timestamp + SECONDS_PER_DAY)
+
+    assert emu.invoke('locationIndexSize', ['Amsterdam', day]) == 2
+    assert notice(emu, 'Amsterdam', day) == 2
+
+    assert [status(emu, key) for key in (b'a1', b'a2', b'b1', b'a3')] == [
+        STATUS_RESULT_NOTICED, STATUS_RESULT_NOTICED, STATUS_INITIALIZED, STATUS_INITIALIZED]
+
+
+def test_notices_a_range_of_slots(emu):
+    timestamp = event_time(emu)
+    day = timestamp // SECONDS_PER_DAY
+    keys = [b'k%d' % n for n in range(5)]
+    for key in keys:
+        assert make_agreement(emu, key, timestamp)
+    after_event(emu, timestamp)
+
+    assert notice(emu, 'Amsterdam', day, start=1, count=2) == 2
+    assert notice(emu, 'Amsterdam', day, start=3, count=10) == 2
+    assert [status(emu, key) for key in keys] == [STATUS_INITIALIZED] + [STATUS_RESULT_NOTICED] * 4
+
+
+def test_needs_the_oracle_and_a_passed_day(emu):
+    timestamp = event_time(emu)
+    day = timestamp // SECONDS_PER_DAY
+    assert make_agreement(emu, b'k1', timestamp)
+
+    assert not notice(emu, 'Amsterdam', day)
+    after_event(emu, timestamp)
+
+    assert not emu.invoke('resultNoticeByLocation', ['Amsterdam', day, 10, 5, 0, 10], [CUSTOMER])
+    assert not notice(emu, 'Amsterdam', day, weather_param=101)
+    assert status(emu, b'k1') == STATUS_INITIALIZED
+
+
+def test_settled_index_leaves_no_keys(emu):
+    timestamp = event_time(emu)
+    day = timestamp // SECONDS_PER_DAY
+    for key in (b'k1', b'k2', b'k3'):
+        assert make_agreement(emu, key, timestamp)
+    after_event(emu, timestamp)
+
+    assert emu.invoke('refundAll', [b'k1'], [OWNER])
+    assert len(index_keys(emu)) == 3
+    assert emu.invoke('locationIndexSize', ['Amsterdam', day]) == 3
+
+    assert notice(emu, 'Amsterdam', day) == 2
+    for key in (b'k2', b'k3'):
+        emu.invoke('claim', [key], [CUSTOMER])
+    assert emu.invoke('pruneBatch', [[b'k1', b'k2', b'k3']], [OWNER]) == 3
+
+    assert index_keys(emu) == []
+    assert emu.invoke('locationIndexSize', ['Amsterdam', day]) == 0
+    assert emu.invoke('agreementCount') == 3
@@ -0,0 +1,171 @@
+import os
+import sys
+
+import pytest
+
+from emulator.avm import Engine, as_bytes
+from emulator.contract import ExecutionFault
+
+from .conftest import assemble
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'neo-boa'))
+
+from optimizer import JMP, OptimizerError, decode, optimize, remap_debug_map, verify  # noqa: E402
+
+# Every program starts with its first argument on the stack
+ARGUMENT = ('DROP', 0, 'PICKITEM')
+
+PROGRAMS = {
+    # Sums n + ... + 1 and doubles it in a called method
+    'loop': ARGUMENT + (
+        0, 'SWAP',
+        'loop:',
+        'DUP', ('JMPIFNOT', 'end'),
+        'TUCK', 'ADD', 'SWAP', 'DEC',
+        ('JMP', 'loop'),
+        'end:',
+        'DROP', ('CALL', 'double'),
+        'RET',
+        'double:',
+        'DUP', 'ADD',
+        'RET',
+    ),
+    # Jumps to jumps, NOPs, unreachable code and pushes that are dropped
+    'jumps': ARGUMENT + (
+        ('JMPIF', 'first'),
+        'NOP', 7, 'DROP',
+        ('JMP', 'second'),
+        'first:',
+        ('JMP', 'second'),
+        100, 'THROW',
+        'second:',
+        'NOP', 1, 'RET',
+    ),
+    # Arithmetic on constants, with a jump into the middle of a foldable run
+    'constants': ARGUMENT + (
+        ('JMPIF', 'add'),
+        1000, 2000, 'MUL', 5, 'NEGATE', 'ADD',
+        'RET',
+        'add:',
+        3, 'DUP', ('JMP', 'three'),
+        'three:',
+        4, 'ADD', 'ADD',
+        'RET',
+    ),
+    # A push followed by a DROP that is a jump target is kept
+    'landing': ARGUMENT + (
+        7, 'SWAP', ('JMPIF', 'drop'),
+        8,
+        'drop:',
+        'DROP', 'DEPTH',
+        'RET',
+    ),
+    # Identical failure paths, which the contract has many of
+    'tails': ARGUMENT + (
+        'DUP', 1, 'NUMEQUAL', ('JMPIF', 'one'),
+        'DUP', 2, 'NUMEQUAL', ('JMPIF', 'two'),
+        'DUP', 3, 'NUMEQUAL', ('JMPIF', 'end'),
+        'DROP', 1, 'RET',
+        'one:',
+        'DROP', b'Insufficient funds', ('SYSCALL', 'Neo.Runtime.Log'), 0, 'RET',
+        'two:',
+        'DROP', b'Insufficient funds', ('SYSCALL', 'Neo.Runtime.Log'), 0, 'RET',
+        'end:',
+    ),
+}
+
+ARGUMENTS = (0, 1, 2, 3, 4)
+
+
+def behaviour(script, argument):
+    engine = Engine(script)
+
+    try:
+        result = engine.invoke('test', [argument])
+    except ExecutionFault:
+        return 'FAULT', engine.interop.logs, engine.storage
+
+    # Folded constants are pushed as byte arrays, which the VM reads as the
+    # same integers
+    return as_bytes(result), engine.interop.logs, engine.storage
+
+
+@pytest.mark.parametrize('name', sorted(PROGRAMS))
+def test_optimized_script_behaves_the_same(name):
+    script = assemble(*PROGRAMS[name])
+    optimized, moved = optimize(script)
+
+    assert len(optimized) <= len(script)
+    for argument in ARGUMENTS:
+        assert behaviour(optimized, argument) == behaviour(script, argument)
+
+    # Every jump lands on an instruction and every kept instruction moved
+    # to the offset of an instruction
+    verify(optimized)
+    offsets = set(instruction.offset for instruction in decode(optimized))
+    assert set(moved.values()) <= offsets | {len(optimized)}
+
+
+def test_optimize_is_idempotent():
+    for program in PROGRAMS.values():
+        optimized, _ = optimize(assemble(*program))
+        assert optimize(optimized)[0] == optimized
+
+
+def test_tails_are_merged():
+    script = assemble(*PROGRAMS['tails'])
+    optimized, _ = optimize(script)
+
+    assert script.count(b'Insufficient funds') == 2
+    assert optimized.count(b'Insufficient funds') == 1
+
+
+def test_jumps_are_threaded():
+    optimized, _ = optimize(assemble(*PROGRAMS['jumps']))
+    instructions = decode(optimized)
+
+    assert not any(instruction.target is not None and instruction.target.opcode == JMP
+                   for instruction in instructions)
+    assert b'\x61' not in bytes(instruction.opcode for instruction in instructions)
+
+
+def test_constants_are_folded():
+    optimized, _ = optimize(assemble(*PROGRAMS['constants']))
+    names = [instruction.name for instruction in decode(optimized)]
+
+    assert 'MUL' not in names and 'NEGATE' not in names
+    # 3 DUP 4 ADD ADD has no two pushes before an ADD and is kept
+    assert names.count('ADD') == 2
+
+
+def test_push_before_a_landing_drop_is_kept():
+    script = assemble(*PROGRAMS['landing'])
+
+    assert optimize(script)[0] == script
+
+
+def test_jump_into_an_operand_does_not_verify():
+    script = assemble(('JMP', 'data'), b'\x01\x02', 'data:', 'RET')
+    # Jump one byte short, into the pushed bytes
+    script = script[:1] + (int.from_bytes(script[1:3], 'little') - 1).to_bytes(2, 'little') + script[3:]
+
+    with pytest.raises(OptimizerError):
+        verify(script)
+    with pytest.raises(OptimizerError):
+        optimize(script)
+
+
+def test_debug_map_follows_the_moved_instructions():
+    script = assemble(*PROGRAMS['loop'])
+    optimized, moved = optimize(script)
+    double = len(script) - 3
+    debug = {'map': [
+        {'start': 0, 'end': double - 1, 'method': 'Main'},
+        {'start': double, 'end': len(script) - 1, 'method': 'Double'},
+    ]}
+
+    remapped = remap_debug_map(debug, moved)
+
+    assert [entry['method'] for entry in remapped['map']] == ['Main', 'Double']
+    assert remapped['map'][1]['start'] == moved[double]
+    assert remapped['map'][1]['end'] == len(optimized) - 1
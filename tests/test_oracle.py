@@ -0,0 +1,134 @@
+import asyncio
+import json
+
+import pytest
+
+from emulator import Emulator
+from offchain.indexer import FileSource, Indexer, write_notifications
+from offchain.mock_rpc import MockNode, MockRpcServer
+from offchain.oracle import EmulatorSubmitter, FileProvider, Oracle, RpcSubmitter, WeatherProvider
+from offchain.rpc import RpcClient, SunnyClient
+
+from .conftest import OWNER, ORACLE, SECONDS_PER_DAY, after_event, event_time, make_agreement
+
+CONTRACT_HASH = '0x' + '5a' * 20
+
+
+class FailingProvider(WeatherProvider):
+    """
+    Observations of a FileProvider, except for locations that fail
+    """
+
+    def __init__(self, provider, failing):
+        self.provider = provider
+        self.failing = failing
+
+    async def sunshine(self, location, day):
+        if location in self.failing:
+            raise RuntimeError('Weather service unavailable')
+
+        return await self.provider.sunshine(location, day)
+
+
+@pytest.fixture
+def agreements(emu):
+    timestamp = event_time(emu)
+
+    for n, location in enumerate(['Amsterdam', 'Amsterdam', 'Amsterdam', 'Rotterdam']):
+        assert make_agreement(emu, b'k%d' % n, timestamp, location=location)
+
+    after_event(emu, timestamp)
+
+    return timestamp // SECONDS_PER_DAY
+
+
+@pytest.fixture
+def oracle(emu, agreements, tmp_path):
+    notifications = str(tmp_path / 'notifications.jsonl')
+    write_notifications(notifications, emu.interop.events)
+
+    weather = str(tmp_path / 'weather.json')
+    with open(weather, 'w') as f:
+        json.dump({'Amsterdam': {str(agreements): 10}, 'Rotterdam': {str(agreements): 90}}, f)
+
+    indexer = Indexer(str(tmp_path / 'sunny.db'))
+    yield Oracle(indexer, FileSource(notifications), FileProvider(weather), EmulatorSubmitter(emu, ORACLE),
+                 batch_size=2)
+    indexer.close()
+
+
+def test_notices_every_location_and_day(emu, oracle):
+    assert asyncio.run(oracle.run_once(emu.clock.time)) == 4
+    assert oracle.observations == {}
+
+
+def test_failing_location_does_not_hold_up_the_others(emu, agreements, oracle):
+    oracle.provider = FailingProvider(oracle.provider, {'Rotterdam'})
+
+    assert asyncio.run(oracle.run_once(emu.clock.time)) == 3
+    assert oracle.due(emu.clock.time) == [('Rotterdam', agreements)]
+
+
+def test_failing_invocation_is_retried(emu, agreements, oracle):
+    submitter = oracle.submitter
+
+    class FailingSubmitter(EmulatorSubmitter):
+        async def invoke(self, operation, args):
+            raise ConnectionError('Node unavailable')
+
+    oracle.submitter = FailingSubmitter(submitter.emulator, submitter.oracle)
+    assert asyncio.run(oracle.run_once(emu.clock.time)) == 0
+    assert oracle.submitted == {}
+
+    oracle.submitter = submitter
+    assert asyncio.run(oracle.run_once(emu.clock.time)) == 4
+
+
+@pytest.fixture
+def node():
+    emu = Emulator(overrides={'OWNER': OWNER})
+    server = MockRpcServer(MockNode(emu, CONTRACT_HASH))
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_rpc_submitter_reads_through_the_node(node):
+    emu = node.node.emulator
+    assert emu.invoke('deploy', ['dapp_name', ORACLE, 3600, SECONDS_PER_DAY, 2592000, 0], [OWNER])
+    timestamp = event_time(emu)
+    assert make_agreement(emu, b'k0', timestamp)
+
+    rpc = RpcClient([node.url])
+    submitter = RpcSubmitter(SunnyClient(rpc, CONTRACT_HASH))
+    size = asyncio.run(submitter.call('locationIndexSize', ['Amsterdam', timestamp // SECONDS_PER_DAY]))
+
+    assert size == 1
+    rpc.close()
+
+
+def test_rpc_submitter_signs_and_relays(node):
+    pytest.importorskip('cryptography')
+    from offchain.rpc import Wallet
+
+    wallet = Wallet(b'\x01' * 32)
+    emu = node.node.emulator
+    assert emu.invoke('deploy', ['dapp_name', wallet.script_hash, 3600, SECONDS_PER_DAY, 2592000, 0], [OWNER])
+
+    rpc = RpcClient([node.url])
+    client = SunnyClient(rpc, CONTRACT_HASH, wallet)
+    submitter = RpcSubmitter(client)
+
+    tx_hash = asyncio.run(submitter.invoke('resultNoticeByLocation', ['Amsterdam', 1, 10, 0, 0, 10]))
+
+    assert tx_hash in node.node.transactions
+    client.close()
+    rpc.close()
+
+
+def test_provider_must_implement_sunshine():
+    class IncompleteProvider(WeatherProvider):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteProvider()
@@ -0,0 +1,67 @@
+from emulator.contract import DEFAULT_CONTRACT
+from emulator.profiler import compare, main, percentile, profile
+
+OVERRIDES = {'OWNER': b'\x01' * 20}
+
+
+def summary(**p50s):
+    """
+    Summary with every metric 0, except the given p50 and p99 values
+    """
+
+    entry = dict((metric, {'p50': 0, 'p99': 0})
+                 for metric in ('get', 'put', 'delete', 'bytes_written', 'check_witness', 'events', 'logs', 'gas'))
+    for metric, value in p50s.items():
+        entry[metric] = {'p50': value, 'p99': value}
+
+    return {'claim': entry}
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) == 0
+
+
+def test_growth_beyond_the_tolerance_is_a_regression():
+    baseline = summary(gas=1.0, get=4, logs=0)
+
+    assert compare(baseline, summary(gas=1.04, get=4, logs=0)) == []
+    assert compare(baseline, summary(gas=1.06, get=4, logs=0)) == [('claim', 'gas', 'p50', 1.0, 1.06),
+                                                                    ('claim', 'gas', 'p99', 1.0, 1.06)]
+    assert compare(baseline, summary(gas=1.0, get=4, logs=1), tolerance=0.5) == [('claim', 'logs', 'p50', 0, 1),
+                                                                                ('claim', 'logs', 'p99', 0, 1)]
+    assert compare(baseline, summary(gas=0.5, get=2, logs=0)) == []
+
+
+def test_operations_of_one_side_only_are_not_compared():
+    assert compare(summary(gas=1.0), dict(summary(gas=1.0), transfer=summary(gas=9.0)['claim'])) == []
+
+
+def test_profile_counts_every_invocation():
+    result = profile(DEFAULT_CONTRACT, 4, OVERRIDES)
+
+    assert result['agreement']['count'] == 4
+    assert result['claim']['count'] == result['refundAll']['count'] == 2
+    assert result['deleteAgreement']['count'] == 4
+    assert all(entry['faults'] == 0 for entry in result.values())
+
+
+def test_baseline_comparison_exits_non_zero_on_a_regression(tmp_path, capsys):
+    with open(DEFAULT_CONTRACT) as f:
+        source = f.read()
+
+    # A baseline that does not log when an agreement is added
+    assert source.count('Log("Agreement added!")') == 1
+    baseline = tmp_path / 'old_dapp.py'
+    baseline.write_text(source.replace('Log("Agreement added!")', 'pass'))
+
+    assert main(['--count', '4', '--baseline', DEFAULT_CONTRACT]) == 0
+    assert 'No regressions against' in capsys.readouterr().out
+
+    assert main(['--count', '4', '--baseline', str(baseline)]) == 1
+    assert 'REGRESSION agreement logs p50: 0 -> 1' in capsys.readouterr().out
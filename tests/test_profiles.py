@@ -0,0 +1,99 @@
+import ast
+import os
+import sys
+
+from emulator import Emulator
+from emulator.contract import DEFAULT_CONTRACT
+from offchain.errors import ErrorTable, main
+
+from .conftest import ORACLE, OWNER, SECONDS_PER_DAY
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'neo-boa'))
+
+from profiles import release_source, write_error_table  # noqa: E402
+
+SOURCE = '''def Main(operation):
+    Log("Must be owner")
+    if operation == 'a':
+        Log("Unknown operation")
+        Notify('Must be owner')
+    runtime.Log("Not a message")
+    Log(operation)
+    Log("""Spans
+two lines""")
+    return "Must be owner"
+'''
+
+
+def test_release_replaces_messages_with_codes():
+    release, codes = release_source(SOURCE)
+
+    assert dict(codes) == {'Must be owner': 1, 'Unknown operation': 2, 'Spans\ntwo lines': 3}
+    assert release.splitlines() == [
+        'def Main(operation):',
+        '    Log("1")',
+        "    if operation == 'a':",
+        '        Log("2")',
+        '        Notify("1")',
+        '    runtime.Log("Not a message")',
+        '    Log(operation)',
+        '    Log("3")',
+        '',
+        '    return "Must be owner"',
+    ]
+
+
+def test_release_keeps_the_lines_of_the_contract():
+    with open(DEFAULT_CONTRACT) as f:
+        source = f.read()
+
+    release, codes = release_source(source)
+    functions = [(node.name, node.lineno) for node in ast.walk(ast.parse(source))
+                 if isinstance(node, ast.FunctionDef)]
+
+    assert len(codes) > 50
+    assert release.count('\n') == source.count('\n')
+    assert [(node.name, node.lineno) for node in ast.walk(ast.parse(release))
+            if isinstance(node, ast.FunctionDef)] == functions
+
+
+def test_release_logs_decode_to_the_debug_messages(tmp_path):
+    with open(DEFAULT_CONTRACT) as f:
+        release, codes = release_source(f.read())
+
+    path = tmp_path / 'sunny_dapp.py'
+    path.write_text(release)
+    table_path = str(tmp_path / 'sunny_dapp.errors.json')
+    write_error_table(table_path, 'sunny_dapp', codes)
+    table = ErrorTable.load(table_path)
+
+    logs = []
+    for contract in (DEFAULT_CONTRACT, str(path)):
+        emu = Emulator(contract, overrides={'OWNER': OWNER})
+        emu.invoke('deploy', ['dapp_name', ORACLE, 3600, 3600, 2592000, 0], [ORACLE])
+        emu.invoke('deploy', ['dapp_name', ORACLE, 3600, SECONDS_PER_DAY, 2592000, 0], [OWNER])
+        emu.invoke('claim', [b'missing'], [OWNER])
+        logs.append(emu.interop.logs)
+
+    debug, release_logs = logs
+    assert release_logs != debug
+    assert [table.decode(message) for message in release_logs] == debug
+
+
+def test_decode_passes_other_messages_through():
+    table = ErrorTable({1: 'Must be owner', '2': 'Unknown operation'}, 'sunny_dapp')
+
+    assert table.decode('1') == 'Must be owner'
+    assert table.decode(b'2') == 'Unknown operation'
+    assert table.decode('3') == '3'
+    assert table.decode('Agreement added!') == 'Agreement added!'
+    assert table.decode_line("log: '1' and \"2\", not 1 or '3'") == \
+        "log: 'Must be owner' and \"Unknown operation\", not 1 or '3'"
+
+
+def test_decode_command(tmp_path, capsys):
+    path = str(tmp_path / 'sunny_dapp.errors.json')
+    write_error_table(path, 'sunny_dapp', {'Must be owner': 1})
+
+    assert main([path, '1', '7']) == 0
+    assert capsys.readouterr().out == '1: Must be owner\n7: 7\n'
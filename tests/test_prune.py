@@ -0,0 +1,95 @@
+import pytest
+
+from .conftest import (CUSTOMER, INSURER, ORACLE, OWNER, OWNER_FUNDS, after_event, balance, event_time,
+                       make_agreement)
+
+STATUS_REFUNDED = 4
+
+
+def settled_agreements(emu, keys, refunded=()):
+    timestamp = event_time(emu)
+
+    for key in keys:
+        assert make_agreement(emu, key, timestamp, amount=1000, premium=100)
+
+    after_event(emu, timestamp)
+
+    for key in keys:
+        if key in refunded:
+            assert emu.invoke('refundAll', [key], [OWNER])
+        elif emu.invoke('resultNotice', [key, 10, 5], [ORACLE]):
+            emu.invoke('claim', [key], [CUSTOMER])
+
+
+def agreement_keys(emu):
+    """
+    Storage keys of agreement records, index and list entries and index
+    counters
+    """
+
+    return [key for key in emu.storage if key[:2] in (b'a/', b'i/', b'l/') and not key == b'l/']
+
+
+def stored(emu, key):
+    return bytes(emu.contract.AgreementKey(key)) in emu.storage
+
+
+def event_names(emu):
+    return [name for name, _ in emu.interop.events]
+
+
+def test_prunes_settled_agreements(emu):
+    keys = [b'k1', b'k2', b'k3']
+    settled_agreements(emu, keys, refunded=[b'k3'])
+
+    # Three records and list slots, and the index of the two claimed ones
+    assert len(agreement_keys(emu)) == 3 + 3 + 2 + 1
+
+    assert emu.invoke('pruneBatch', [keys], [OWNER]) == 3
+    assert event_names(emu).count('delete') == 3
+    assert agreement_keys(emu) == []
+
+
+def test_skips_unsettled_and_missing_agreements(emu):
+    timestamp = event_time(emu)
+    assert make_agreement(emu, b'open', timestamp)
+    settled_agreements(emu, [b'done'])
+
+    assert emu.invoke('pruneBatch', [[b'open', b'done', b'missing']], [OWNER]) == 1
+    assert stored(emu, b'open') and not stored(emu, b'done')
+
+
+def test_prune_needs_the_owner(emu):
+    settled_agreements(emu, [b'k1'])
+
+    assert not emu.invoke('pruneBatch', [[b'k1']], [CUSTOMER])
+    assert stored(emu, b'k1')
+
+
+def test_auto_prune_archives_settled_agreements(emu):
+    assert emu.invoke('updateAutoPrune', [True], [OWNER])
+
+    settled_agreements(emu, [b'k1', b'k2'], refunded=[b'k2'])
+
+    archived = [args[0] for name, args in emu.interop.events if name == 'archive']
+    assert sorted(archived) == [b'k1', b'k2']
+    assert agreement_keys(emu) == []
+
+
+@pytest.mark.parametrize('auto_prune', [False, True], ids=['kept', 'auto-prune'])
+def test_refund_of_an_unfunded_owner_changes_nothing(emu, auto_prune):
+    assert emu.invoke('updateAutoPrune', [auto_prune], [OWNER])
+    timestamp = event_time(emu)
+    assert make_agreement(emu, b'k1', timestamp, amount=1000, premium=100)
+    after_event(emu, timestamp)
+    emu.storage[emu.balance_key(OWNER)] = 500
+    record = emu.invoke('agreement', [b'k1'])
+
+    assert not emu.invoke('refundAll', [b'k1'], [OWNER])
+    assert emu.invoke('agreement', [b'k1']) == record
+    assert 'refund-all' not in event_names(emu) and 'archive' not in event_names(emu)
+    assert balance(emu, CUSTOMER) == 0 and balance(emu, INSURER) == 0
+
+    emu.storage[emu.balance_key(OWNER)] = OWNER_FUNDS
+    assert emu.invoke('refundAll', [b'k1'], [OWNER])
+    assert balance(emu, CUSTOMER) == 1000 and balance(emu, INSURER) == 100
@@ -0,0 +1,80 @@
+import pytest
+
+from emulator.vm import bytes_to_int
+
+from .conftest import CUSTOMER, INSURER, event_time, make_agreement
+
+
+@pytest.fixture
+def contract(emu):
+    emu.interop.begin(frozenset(), emu.interop.trigger)
+    return emu.contract
+
+
+@pytest.mark.parametrize('value, width', [
+    (0, 1), (1, 1), (-1, 1), (127, 1), (-128, 1), (255, 2), (86400, 4),
+    (2 ** 39 - 1, 5), (-2 ** 39, 5), (9223372036854775807, 8), (-2 ** 63, 8),
+])
+def test_pack_int_round_trip(contract, value, width):
+    packed = contract.PackInt(value, width)
+
+    assert len(packed) == width
+    assert bytes_to_int(contract.GetField(packed, 0, width)) == value
+
+
+def test_zero_is_packed_as_zero_bytes(contract):
+    assert bytes(contract.PackInt(0, 8)) == b'\x00' * 8
+
+
+def test_agreement_record_layout(emu, contract):
+    timestamp = event_time(emu)
+    assert make_agreement(emu, b'k1', timestamp, amount=123456789, premium=1000, fee=25, location='Den Haag')
+    record = emu.storage[b'a/k1']
+
+    def field(offset, width):
+        return contract.GetField(record, offset, width)
+
+    assert bytes_to_int(field(contract.STATUS_OFFSET, contract.STATUS_WIDTH)) == contract.STATUS_INITIALIZED
+    assert bytes_to_int(field(contract.SETTINGS_VERSION_OFFSET, contract.SETTINGS_VERSION_WIDTH)) == 1
+    assert bytes(field(contract.CUSTOMER_OFFSET, contract.ADDRESS_WIDTH)) == CUSTOMER
+    assert bytes(field(contract.INSURER_OFFSET, contract.ADDRESS_WIDTH)) == INSURER
+    assert bytes_to_int(field(contract.TIMESTAMP_OFFSET, contract.TIMESTAMP_WIDTH)) == timestamp
+    assert bytes_to_int(field(contract.AMOUNT_OFFSET, contract.VALUE_WIDTH)) == 123456789
+    assert bytes_to_int(field(contract.PREMIUM_OFFSET, contract.VALUE_WIDTH)) == 1000
+    assert bytes_to_int(field(contract.FEE_OFFSET, contract.VALUE_WIDTH)) == 25
+    assert bytes(record[contract.LOCATION_OFFSET:]) == b'Den Haag'
+
+
+# Fields of the agreement record and the constant that holds their width
+FIELDS = [
+    ('STATUS', 'STATUS'), ('SETTINGS_VERSION', 'SETTINGS_VERSION'), ('CUSTOMER', 'ADDRESS'),
+    ('INSURER', 'ADDRESS'), ('TIMESTAMP', 'TIMESTAMP'), ('UTC_OFFSET', 'UTC_OFFSET'), ('AMOUNT', 'VALUE'),
+    ('PREMIUM', 'VALUE'), ('FEE', 'VALUE'), ('WEATHER_PARAM', 'WEATHER_PARAM'), ('ORACLE_COST', 'VALUE'),
+    ('INDEX_SLOT', 'INDEX_SLOT'), ('LIST_SLOT', 'INDEX_SLOT'),
+]
+
+
+def test_fields_are_contiguous(contract):
+    offset = 0
+
+    for name, width in FIELDS:
+        assert getattr(contract, name + '_OFFSET') == offset, name
+        offset += getattr(contract, width + '_WIDTH')
+
+    assert contract.LOCATION_OFFSET == offset
+
+
+@pytest.mark.parametrize('name, width', [field for field in FIELDS if field[1] != 'ADDRESS'])
+def test_set_field_changes_only_its_field(emu, contract, name, width):
+    assert make_agreement(emu, b'k1', event_time(emu))
+    record = bytes(emu.storage[b'a/k1'])
+    offset = getattr(contract, name + '_OFFSET')
+    width = getattr(contract, width + '_WIDTH')
+    value = -(2 ** (8 * width - 1))
+
+    updated = contract.SetField(record, offset, width, value)
+
+    assert len(updated) == len(record)
+    assert bytes_to_int(contract.GetField(updated, offset, width)) == value
+    assert bytes(updated[:offset]) == record[:offset]
+    assert bytes(updated[offset + width:]) == record[offset + width:]
@@ -0,0 +1,37 @@
+import io
+
+import pytest
+
+from emulator import Emulator
+from emulator.benchmark import Workload
+from emulator.replay import OWNER, Recorder, Replay, read_history, synthesize
+
+
+@pytest.fixture(scope='module')
+def history(tmp_path_factory):
+    f = io.StringIO()
+    synthesize(Workload(60, 10, 3, 5, seed=1), Recorder(Emulator(overrides={'OWNER': OWNER}), f))
+
+    path = tmp_path_factory.mktemp('replay') / 'history.jsonl'
+    path.write_text(f.getvalue())
+
+    return read_history(str(path))
+
+
+@pytest.mark.parametrize('chunk_size', [50, 100000], ids=['chunks', 'single-chunk'])
+def test_parallel_replay_matches_serial_replay(history, chunk_size):
+    serial = Replay().run(history)
+    parallel = Replay(workers=2, chunk_size=chunk_size).run(history)
+
+    assert parallel['state_hash'] == serial['state_hash']
+    assert parallel['events_hash'] == serial['events_hash']
+
+
+def test_agreements_made_in_a_chunk_are_speculated_on(history):
+    summary = Replay(workers=2, chunk_size=100000).run(history)
+
+    # Only the invocations that empty a location index, or allocate a slot
+    # in an index another shard emptied, depend on the other shards
+    assert summary['executed'] < summary['invocations'] // 10
+    assert summary['speculated'] + summary['executed'] == summary['invocations']
+
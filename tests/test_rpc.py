@@ -0,0 +1,96 @@
+import pytest
+
+from emulator import Emulator
+from offchain.mock_rpc import MockNode, MockRpcServer
+from offchain.rpc import GAS_ASSET, RpcClient, RpcError, SunnyClient, UnspentPool
+
+from .conftest import OWNER
+
+
+class SingleResponseClient(RpcClient):
+    """
+    Client of a node that answers every request with the same response
+    """
+
+    def __init__(self, response):
+        super(SingleResponseClient, self).__init__(['http://localhost:1'])
+        self.response = response
+
+    def post(self, payload):
+        return self.response
+
+
+def test_batch_of_a_node():
+    server = MockRpcServer(MockNode(Emulator(overrides={'OWNER': OWNER}), '0x' + '5a' * 20))
+    server.start()
+    rpc = RpcClient([server.url])
+
+    count, missing = rpc.batch([('getblockcount', []), ('getnothing', [])])
+
+    assert count == 1
+    assert isinstance(missing, RpcError) and missing.code == -32601
+    rpc.close()
+    server.stop()
+
+
+def test_batch_rejected_as_a_whole():
+    rpc = SingleResponseClient({'jsonrpc': '2.0', 'id': None, 'error': {'code': -32600, 'message': 'Invalid'}})
+
+    results = rpc.batch([('getblockcount', []), ('getblockcount', [])])
+
+    assert len(results) == 2
+    assert all(isinstance(result, RpcError) and result.code == -32600 for result in results)
+    rpc.close()
+
+
+def test_change_returns_to_the_unspent_outputs():
+    pool = UnspentPool(None, 'address')
+    pool.unspent = [(b'\x01' * 32, 0, 500)]
+
+    spent = pool.reserve(200)
+    pool.spend('tx', spent, [(b'\x02' * 32, 0, 300)])
+
+    assert pool.unspent == [(b'\x02' * 32, 0, 300)]
+    assert pool.reserve(300) == [(b'\x02' * 32, 0, 300)]
+
+    with pytest.raises(RpcError):
+        pool.reserve(1)
+
+
+class UnspentsClient(object):
+    """
+    Answers getunspents with the GAS outputs in unspent
+    """
+
+    def __init__(self):
+        self.unspent = []
+
+    def call(self, method, *params):
+        assert method == 'getunspents'
+        outputs = [{'txid': '0x' + tx_hash[::-1].hex(), 'n': index, 'value': str(value / 10 ** 8)}
+                   for tx_hash, index, value in self.unspent]
+        return {'balance': [{'asset_hash': '0x' + GAS_ASSET, 'unspent': outputs}]}
+
+
+def test_refresh_skips_outputs_spent_in_flight():
+    node = UnspentsClient()
+    node.unspent = [(b'\x01' * 32, 0, 500), (b'\x01' * 32, 1, 700)]
+    pool = UnspentPool(node, 'address')
+    pool.refresh()
+
+    change = (b'\x02' * 32, 0, 300)
+    pool.spend('tx', pool.reserve(200), [change])
+
+    # The node does not know of the transaction yet
+    pool.refresh()
+    assert sorted(pool.unspent) == [(b'\x01' * 32, 1, 700), change]
+
+    # The transaction is confirmed
+    node.unspent = [(b'\x01' * 32, 1, 700), change]
+    pool.refresh()
+    assert sorted(pool.unspent) == [(b'\x01' * 32, 1, 700), change]
+    assert pool.in_flight == {}
+
+
+def test_nonces_are_random():
+    assert len(set(SunnyClient.nonce() for _ in range(100))) == 100
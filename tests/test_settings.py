@@ -0,0 +1,67 @@
+import pytest
+
+from emulator import Emulator
+
+from .conftest import ORACLE, OWNER, SECONDS_PER_DAY, event_time, make_agreement
+
+NEW_ORACLE = b'\x0d' * 20
+
+
+def settings(emu):
+    name, oracle, time_margin, min_time, max_time, version, auto_prune = emu.invoke('settings')
+    return [bytes(name), bytes(oracle), int(time_margin), int(min_time), int(max_time), int(version), int(auto_prune)]
+
+
+def versions(emu):
+    return dict((key, value) for key, value in emu.storage.items() if key.startswith(b's/'))
+
+
+def test_deploy_stores_the_first_version(emu):
+    assert settings(emu) == [b'dapp_name', ORACLE, 3600, SECONDS_PER_DAY, 2592000, 1, 0]
+    assert versions(emu) == {b's/': emu.storage[b's/'], b's/v\x01\x00': emu.storage[b's/']}
+
+
+def test_invalid_deploy_writes_nothing():
+    emu = Emulator(overrides={'OWNER': OWNER})
+
+    assert not emu.invoke('deploy', ['dapp_name', ORACLE, 3600, 3600, 2592000, 0], [OWNER])
+    assert emu.interop.logs[0] == 'min_time must be greater than 3600 + time_margin'
+    assert emu.storage == {}
+
+
+@pytest.mark.parametrize('operation, args, field, value', [
+    ('updateOracle', [NEW_ORACLE], 1, NEW_ORACLE),
+    ('updateTimeLimits', ['time_margin', 1800], 2, 1800),
+    ('updateTimeLimits', ['min_time', 2 * SECONDS_PER_DAY], 3, 2 * SECONDS_PER_DAY),
+    ('updateTimeLimits', ['max_time', 2000000], 4, 2000000),
+    ('updateName', ['new_name'], 0, b'new_name'),
+    ('updateAutoPrune', [1], 6, 1),
+])
+def test_updates_store_a_new_version(emu, operation, args, field, value):
+    first = emu.storage[b's/v\x01\x00']
+    expected = settings(emu)
+    expected[field] = value
+    expected[5] = 2
+
+    assert emu.invoke(operation, args, [OWNER])
+
+    assert settings(emu) == expected
+    assert emu.storage[b's/v\x01\x00'] == first
+    assert emu.storage[b's/v\x02\x00'] == emu.storage[b's/']
+
+
+def test_agreements_refer_to_the_version_they_were_made_under(emu):
+    timestamp = event_time(emu)
+    assert make_agreement(emu, b'k1', timestamp)
+    assert emu.invoke('updateOracle', [NEW_ORACLE], [OWNER])
+    assert make_agreement(emu, b'k2', timestamp)
+
+    assert emu.storage[b'a/k1'][1:3] == b'\x01\x00'
+    assert emu.storage[b'a/k2'][1:3] == b'\x02\x00'
+
+
+def test_updates_need_the_owner(emu):
+    before = versions(emu)
+
+    assert not emu.invoke('updateOracle', [NEW_ORACLE], [ORACLE])
+    assert versions(emu) == before
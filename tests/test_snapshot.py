@@ -0,0 +1,106 @@
+import pytest
+
+from emulator.benchmark import Workload
+from emulator.interop import Clock
+from emulator.replay import OWNER, Replay, state_hash
+from emulator.snapshot import MappedStorage, SnapshotError, build, restore, save
+from emulator.vm import ByteArray
+
+VALUES = {
+    b'bytes': b'\x00\x01\x02',
+    b'byte-array': ByteArray(b'\xff\x00'),
+    b'integer': -123456789,
+    b'string': 'Amsterdam',
+    b'boolean': True,
+    b'array': [1, b'\x02', ['nested', False]],
+}
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = str(tmp_path / 'values.snapshot')
+    save(path, VALUES, Clock(1600000000, 15, 42))
+
+    storage = MappedStorage(path)
+    yield storage
+    storage.close()
+
+
+def test_values_keep_their_type(snapshot):
+    for key, value in VALUES.items():
+        assert type(snapshot[key]) is type(value)
+        assert snapshot[key] == value
+
+
+def test_clock_is_restored(snapshot):
+    clock = snapshot.clock()
+
+    assert (clock.genesis_time, clock.block_time, clock.height) == (1600000000, 15, 42)
+
+
+def test_changes_go_to_the_overlay(snapshot):
+    snapshot[b'integer'] = 1
+    snapshot[b'new'] = b'value'
+    del snapshot[b'string']
+    del snapshot[b'new']
+    snapshot[b'added'] = 2
+
+    assert snapshot[b'integer'] == 1
+    assert b'string' not in snapshot and b'new' not in snapshot
+    assert len(snapshot) == len(VALUES)
+    assert sorted(snapshot) == sorted(set(VALUES) - {b'string'} | {b'added'})
+
+    saved = MappedStorage(snapshot.path)
+    assert saved[b'integer'] == VALUES[b'integer']
+    saved.close()
+
+    with pytest.raises(KeyError):
+        del snapshot[b'string']
+
+
+def test_empty_snapshot(tmp_path):
+    path = str(tmp_path / 'empty.snapshot')
+    save(path, {})
+    storage = MappedStorage(path)
+
+    assert len(storage) == 0
+    assert list(storage) == []
+    assert storage.get(b'missing') is None
+
+
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / 'other.snapshot'
+    path.write_bytes(b'\x00' * 64)
+
+    with pytest.raises(SnapshotError):
+        MappedStorage(str(path))
+
+
+def test_restored_contract_continues_where_it_was_saved(tmp_path):
+    path = str(tmp_path / 'agreements.snapshot')
+    emu = build(Workload(20, 5, 2, 3, seed=2), owner=OWNER)
+    save(path, emu.storage, emu.clock)
+
+    restored = restore(path, overrides={'OWNER': OWNER})
+
+    assert state_hash(restored.storage) == state_hash(emu.storage)
+    assert restored.clock.time == emu.clock.time
+    assert restored.invoke('balance', [OWNER]) == emu.invoke('balance', [OWNER])
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_replay_from_a_snapshot(tmp_path, workers):
+    path = str(tmp_path / 'agreements.snapshot')
+    emu = build(Workload(20, 5, 2, 3, seed=2), owner=OWNER)
+    save(path, emu.storage, emu.clock)
+
+    customer = b'\x0c' * 20
+    history = [{'type': 'invoke', 'block': emu.clock.height + 1, 'time': emu.clock.time + 15,
+                'operation': 'transfer', 'args': [OWNER, customer, 100], 'witnesses': [OWNER]}]
+    emu.clock.advance(15)
+    emu.invoke('transfer', [OWNER, customer, 100], [OWNER])
+
+    summary = Replay(workers=workers, snapshot=path).run(history)
+
+    assert summary['executed'] + summary['speculated'] == 1
+    assert summary['state_hash'] == state_hash(emu.storage)
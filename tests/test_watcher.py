@@ -0,0 +1,72 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'neo-boa'))
+
+import watcher  # noqa: E402
+
+
+class ScriptedWatcher(object):
+    """
+    Returns the given sets of changed files from read, one per call, and
+    interrupts the watch when they run out
+    """
+
+    def __init__(self, reads):
+        self.reads = list(reads)
+        self.timeouts = []
+        self.closed = False
+
+    def read(self, timeout=None):
+        if not self.reads:
+            raise KeyboardInterrupt
+        self.timeouts.append(timeout)
+        return self.reads.pop(0)
+
+    def close(self):
+        self.closed = True
+
+
+def run_watch(monkeypatch, directory, reads):
+    scripted = ScriptedWatcher(reads)
+    monkeypatch.setattr(watcher, 'create_watcher', lambda *args: scripted)
+    calls = []
+
+    watcher.watch(directory, calls.append, debounce=0.5)
+
+    return calls, scripted
+
+
+def test_burst_is_debounced_into_one_change(monkeypatch, tmp_path):
+    for file in ('a.py', 'b.py', 'c.py'):
+        (tmp_path / file).write_text('')
+
+    calls, scripted = run_watch(monkeypatch, str(tmp_path), [{'a.py'}, {'b.py'}, {'a.py', 'c.py'}, set(), {'b.py'}, set()])
+
+    assert calls == [{'a.py', 'b.py', 'c.py'}, {'b.py'}]
+    assert scripted.timeouts == [None, 0.5, 0.5, 0.5, None, 0.5]
+    assert scripted.closed
+
+
+def test_removed_files_are_not_reported(monkeypatch, tmp_path):
+    (tmp_path / 'a.py').write_text('')
+
+    calls, _ = run_watch(monkeypatch, str(tmp_path), [{'a.py', 'gone.py'}, set(), {'gone.py'}, set()])
+
+    assert calls == [{'a.py'}]
+
+
+def test_polling_watcher_reports_modified_files(tmp_path):
+    (tmp_path / 'a.py').write_text('')
+    (tmp_path / 'b.py').write_text('')
+    polling = watcher.PollingWatcher(str(tmp_path), interval=0.01)
+
+    assert polling.read(timeout=0.05) == set()
+
+    (tmp_path / 'b.py').write_text('changed')
+    os.utime(str(tmp_path / 'b.py'), ns=(0, 10 ** 9))
+    (tmp_path / 'c.py').write_text('')
+    (tmp_path / 'notes.txt').write_text('')
+
+    assert polling.read(timeout=1) == {'b.py', 'c.py'}
+    assert polling.read(timeout=0.05) == set()